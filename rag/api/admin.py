@@ -0,0 +1,85 @@
+"""
+Endpoints de administración (requieren RAG_ADMIN_TOKEN en la cabecera X-Admin-Token)
+"""
+
+import asyncio
+import hmac
+import logging
+import os
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+
+from core.index_store import (
+    CHROMA_PATH,
+    get_index_manager,
+    list_versions,
+    live_index_path,
+    publish_version,
+)
+from core.ingest_jobs import IngestInProgress, ingest_lock
+
+logger = logging.getLogger(__name__)
+
+
+def is_enabled() -> bool:
+    return bool(os.getenv("RAG_ADMIN_TOKEN"))
+
+
+def require_admin_token(x_admin_token: Optional[str] = Header(None)):
+    expected = os.getenv("RAG_ADMIN_TOKEN", "")
+    if not expected or not x_admin_token or not hmac.compare_digest(
+        x_admin_token, expected
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Token de administrador inválido"
+        )
+
+
+router = APIRouter(
+    prefix="/admin", tags=["admin"], dependencies=[Depends(require_admin_token)]
+)
+
+
+@router.get("/index")
+async def index_status():
+    """Versión publicada, versiones en disco y estado de este worker"""
+    return {
+        "published": live_index_path(),
+        "versions": list_versions(),
+        "worker": {"pid": os.getpid(), **get_index_manager().status()},
+    }
+
+
+def _publish_locked(path: str):
+    with ingest_lock(wait=False):
+        publish_version(path)
+
+
+@router.post("/index/activate")
+async def activate_index(version: Optional[str] = None):
+    """
+    Publica `version` (nombre del directorio, ej. chroma_20250101T120000) y
+    cambia a ella. Sin `version`, solo vuelve a leer el puntero publicado.
+    Los demás workers detectan el puntero nuevo en su siguiente petición.
+    Responde 409 si hay una ingesta en curso: al terminar publicaría su
+    versión encima de esta
+    """
+    if version is not None:
+        path = os.path.join(os.path.dirname(CHROMA_PATH), os.path.basename(version))
+        if path not in list_versions():
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Versión del índice no encontrada: {version}",
+            )
+        try:
+            await asyncio.to_thread(_publish_locked, path)
+        except IngestInProgress as e:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+        logger.info(f"🚀 Versión del índice publicada: {path}")
+
+    try:
+        live = await asyncio.to_thread(get_index_manager().reload)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    return {"live": live, "worker": {"pid": os.getpid(), **get_index_manager().status()}}
@@ -0,0 +1,125 @@
+"""
+Ingesta de PDFs por la API (requiere RAG_ADMIN_TOKEN, ver admin.py).
+
+El cuerpo de POST /ingest es el PDF tal cual (`Content-Type: application/pdf`);
+se guarda en disco a medida que llega y un proceso aparte lo indexa y publica
+una versión nueva del índice (ver core/ingest_jobs.py)
+"""
+
+import asyncio
+import os
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+
+from core.ingest_jobs import (
+    create_job,
+    discard_job,
+    list_jobs,
+    read_status,
+    start_job,
+    upload_path,
+    validate_filename,
+)
+
+from .admin import require_admin_token
+from .models import IngestJobResponse, IngestJobsResponse
+
+PDF_MAGIC = b"%PDF-"
+WRITE_BUFFER_BYTES = 1024 * 1024
+
+router = APIRouter(
+    prefix="/ingest", tags=["ingest"], dependencies=[Depends(require_admin_token)]
+)
+
+
+def _check_pdf_magic(data: bytes):
+    if not data.startswith(PDF_MAGIC):
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="El cuerpo de la petición no es un PDF",
+        )
+
+
+def max_upload_bytes() -> int:
+    return int(float(os.getenv("RAG_INGEST_MAX_MB", "100")) * 1024 * 1024)
+
+
+@router.post(
+    "", response_model=IngestJobResponse, status_code=status.HTTP_202_ACCEPTED
+)
+async def ingest_pdf(
+    request: Request,
+    filename: str = Query(..., description="Nombre del archivo en data/"),
+    author: Optional[str] = Query(None, description="Autor para el catálogo"),
+    work: Optional[str] = Query(None, description="Obra para el catálogo"),
+    partition: Optional[str] = Query(None, description="Partición del índice"),
+):
+    """
+    Sube un PDF y encola su ingesta. Responde enseguida con el trabajo; su
+    progreso se consulta en GET /ingest/{job_id}
+    """
+    # validate_filename lee el estado de todos los trabajos: fuera del bucle
+    try:
+        name = await asyncio.to_thread(validate_filename, filename)
+    except FileExistsError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    job = await asyncio.to_thread(
+        create_job, name, author=author, work=work, partition=partition
+    )
+    limit = max_upload_bytes()
+    size = 0
+    checked = False
+    # Se escribe en disco desde un hilo, por bloques de WRITE_BUFFER_BYTES
+    pending = bytearray()
+    try:
+        with open(upload_path(job["job_id"]), "wb") as f:
+            async for chunk in request.stream():
+                size += len(chunk)
+                if size > limit:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail=f"El PDF supera {limit // (1024 * 1024)} MB",
+                    )
+                pending += chunk
+                # La cabecera puede llegar repartida en varios fragmentos
+                if not checked and len(pending) >= len(PDF_MAGIC):
+                    _check_pdf_magic(pending)
+                    checked = True
+                if checked and len(pending) >= WRITE_BUFFER_BYTES:
+                    await asyncio.to_thread(f.write, pending)
+                    pending = bytearray()
+            if size == 0:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST, detail="El PDF está vacío"
+                )
+            if not checked:
+                _check_pdf_magic(pending)
+            if pending:
+                await asyncio.to_thread(f.write, pending)
+    except BaseException:
+        discard_job(job["job_id"])
+        raise
+
+    return await asyncio.to_thread(start_job, job["job_id"])
+
+
+@router.get("", response_model=IngestJobsResponse)
+async def ingest_jobs():
+    """Trabajos de ingesta, del más reciente al más antiguo"""
+    return {"jobs": await asyncio.to_thread(list_jobs)}
+
+
+@router.get("/{job_id}", response_model=IngestJobResponse)
+async def ingest_job(job_id: str):
+    """Estado y progreso de un trabajo (páginas leídas, chunks embebidos)"""
+    job = read_status(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Trabajo de ingesta no encontrado: {job_id}",
+        )
+    return job
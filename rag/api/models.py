@@ -3,7 +3,23 @@ Modelos Pydantic para la API del generador de dilemas RAG
 """
 
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Dict, Optional, List
+
+
+class SearchFilters(BaseModel):
+    """Filtros de la búsqueda de contexto (ver GET /sources)"""
+
+    authors: Optional[List[str]] = Field(
+        None, description="Autores o particiones", example=["Emmanuel Levinas"]
+    )
+    works: Optional[List[str]] = Field(
+        None, description="Obras", example=["La huella del otro"]
+    )
+    sources: Optional[List[str]] = Field(
+        None,
+        description="Archivos PDF",
+        example=["Levinas_Emmanuel_La_huella_del_otro_2001.pdf"],
+    )
 
 
 class DilemmaRequest(BaseModel):
@@ -23,6 +39,17 @@ class DilemmaRequest(BaseModel):
         description="Contexto opcional del usuario",
         example="Usuario empático con 3 respuestas previas",
     )
+    filters: Optional[SearchFilters] = Field(
+        None,
+        description="Filtros de búsqueda; sin filtros se usan las particiones del tópico",
+    )
+    session_id: Optional[str] = Field(
+        None,
+        description="Sesión creada con POST /sessions cuyo historial personaliza el dilema",
+        min_length=1,
+        max_length=64,
+        example="3f2b9c1e8a7d4b6f9e0c1a2b3c4d5e6f",
+    )
 
 
 class DilemmaResponse(BaseModel):
@@ -41,6 +68,15 @@ class DilemmaResponse(BaseModel):
     generation_time_ms: Optional[float] = Field(
         None, description="Tiempo de generación en milisegundos"
     )
+    session_id: Optional[str] = Field(None, description="Sesión usada")
+    dilemma_id: Optional[str] = Field(
+        None, description="Id del dilema en la sesión, para registrar la respuesta"
+    )
+    fallback: bool = Field(
+        False,
+        description="Dilema reciente de respaldo servido porque la generación "
+        "agotó el presupuesto de tiempo de la petición",
+    )
 
 
 class HealthResponse(BaseModel):
@@ -64,3 +100,86 @@ class TopicsResponse(BaseModel):
 
     topics: List[str] = Field(..., description="Lista de tópicos éticos disponibles")
     intensities: List[str] = Field(..., description="Lista de intensidades disponibles")
+
+
+class SourceInfo(BaseModel):
+    """Fuente del catálogo con su partición del índice"""
+
+    source: str = Field(..., description="Archivo PDF")
+    author: str = Field(..., description="Autor")
+    work: str = Field(..., description="Obra")
+    partition: str = Field(..., description="Partición del índice")
+
+
+class SourcesResponse(BaseModel):
+    """Modelo para la respuesta del catálogo de fuentes"""
+
+    sources: List[SourceInfo] = Field(..., description="Fuentes del catálogo")
+    topic_partitions: Dict[str, List[str]] = Field(
+        ..., description="Particiones por defecto de cada tópico"
+    )
+
+
+class AnswerRequest(BaseModel):
+    """Respuesta del usuario a un dilema de su sesión"""
+
+    answer: str = Field(
+        ...,
+        description="Respuesta del usuario",
+        max_length=2000,
+        example="Asumiría la responsabilidad aunque me cueste tiempo",
+    )
+    dilemma_id: Optional[str] = Field(
+        None, description="Dilema respondido (por defecto el último de la sesión)"
+    )
+
+
+class SessionEntryModel(BaseModel):
+    """Dilema de la sesión y su respuesta, recortados"""
+
+    dilemma_id: str
+    topic: str
+    intensity: str
+    dilemma_text: str
+    hidden_variable: str
+    answer: Optional[str] = None
+
+
+class SessionResponse(BaseModel):
+    """Historial compacto de una sesión"""
+
+    session_id: str = Field(..., description="Id de la sesión")
+    total_dilemmas: int = Field(..., description="Dilemas generados en la sesión")
+    total_answers: int = Field(..., description="Dilemas respondidos")
+    topic_counts: Dict[str, int] = Field(..., description="Dilemas por tópico")
+    entries: List[SessionEntryModel] = Field(
+        ..., description="Últimos dilemas (como máximo RAG_SESSION_MAX_ENTRIES)"
+    )
+    ttl_seconds: float = Field(..., description="Expira tras este tiempo sin uso")
+
+
+class IngestJobResponse(BaseModel):
+    """Estado de un trabajo de ingesta (ver POST /ingest)"""
+
+    job_id: str = Field(..., description="Id del trabajo")
+    status: str = Field(..., description="queued, running, done o failed")
+    stage: str = Field(..., description="Etapa actual", example="embedding")
+    filename: str = Field(..., description="Archivo PDF en data/")
+    author: Optional[str] = Field(None, description="Autor para el catálogo")
+    work: Optional[str] = Field(None, description="Obra para el catálogo")
+    partition: Optional[str] = Field(None, description="Partición del índice")
+    pages_total: int = Field(..., description="Páginas del PDF")
+    pages_parsed: int = Field(..., description="Páginas leídas")
+    chunks_total: int = Field(..., description="Chunks a embeber")
+    chunks_embedded: int = Field(..., description="Chunks embebidos")
+    version: Optional[str] = Field(None, description="Versión del índice publicada")
+    error: Optional[str] = Field(None, description="Error si falló")
+    pid: Optional[int] = Field(None, description="Proceso de ingesta")
+    created_at: float = Field(..., description="Creación (epoch)")
+    updated_at: float = Field(..., description="Última actualización (epoch)")
+
+
+class IngestJobsResponse(BaseModel):
+    """Trabajos de ingesta, del más reciente al más antiguo"""
+
+    jobs: List[IngestJobResponse] = Field(..., description="Trabajos de ingesta")
@@ -0,0 +1,226 @@
+"""
+Perfilador por muestreo bajo demanda para el servidor en producción.
+
+Desactivado por defecto: solo se registra si RAG_ENABLE_PROFILER=1 y
+RAG_ADMIN_TOKEN está definido. Si está desactivado no se añade ni la ruta
+ni el middleware, así que no tiene ningún coste en las peticiones.
+
+El resultado es un archivo de pilas colapsadas ("marco;marco;marco N"),
+compatible con flamegraph.pl y speedscope. La raíz de cada pila indica
+en qué componente se gastó el tiempo: pypdf, embedding, chroma, openai u otro.
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import PlainTextResponse
+
+from .admin import require_admin_token
+
+logger = logging.getLogger(__name__)
+
+MAX_PROFILE_SECONDS = 300
+
+# Prefijos de módulo -> componente, de mayor a menor prioridad. Una pila se
+# atribuye al prefijo de mayor prioridad que aparezca en cualquiera de sus
+# marcos: las llamadas de embedding pasan por el cliente de OpenAI (y sus
+# marcos más internos son de openai) y deben contarse como embedding
+COMPONENT_PREFIXES = (
+    ("pypdf", "pypdf"),
+    ("langchain_openai.embeddings", "embedding"),
+    ("openai.resources.embeddings", "embedding"),
+    ("core.get_embedding_function", "embedding"),
+    ("chromadb", "chroma"),
+    ("langchain_community.vectorstores.chroma", "chroma"),
+    ("openai", "openai"),
+    ("langchain_openai", "openai"),
+)
+
+# Hojas de pila que corresponden a hilos esperando trabajo
+IDLE_LEAVES = {
+    ("threading", "wait"),
+    ("queue", "get"),
+    ("selectors", "select"),
+    ("asyncio.runners", "run"),  # bucle uvloop esperando en C
+    ("concurrent.futures.thread", "_worker"),
+}
+
+
+def is_enabled() -> bool:
+    return os.getenv("RAG_ENABLE_PROFILER") == "1" and bool(
+        os.getenv("RAG_ADMIN_TOKEN")
+    )
+
+
+class SamplingProfiler:
+    """
+    Muestrea las pilas de todos los hilos del proceso cada `interval` segundos
+    desde un hilo aparte (sys._current_frames), sin instrumentar el código
+    """
+
+    def __init__(self, interval: float = 0.005, include_idle: bool = False):
+        self.interval = interval
+        self.include_idle = include_idle
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._run, name="rag-profiler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> str:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.collapsed()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = self._collapse(frame)
+                if stack is not None:
+                    self.stacks[stack] += 1
+            self.samples += 1
+
+    def _collapse(self, frame) -> Optional[str]:
+        names = []
+        modules = []
+        leaf = None
+        while frame is not None:
+            module = frame.f_globals.get("__name__", "?")
+            function = frame.f_code.co_name
+            if leaf is None:
+                leaf = (module, function)
+            names.append(f"{module}:{function}")
+            modules.append(module)
+            frame = frame.f_back
+        if not self.include_idle and leaf in IDLE_LEAVES:
+            return None
+        names.append(f"[{component_for_stack(modules)}]")
+        names.reverse()
+        return ";".join(names)
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.items())
+
+
+def _priority(module: str) -> int:
+    """Posición del primer prefijo de COMPONENT_PREFIXES que cubre `module`"""
+    for priority, (prefix, _component) in enumerate(COMPONENT_PREFIXES):
+        if module == prefix or module.startswith(prefix + "."):
+            return priority
+    return len(COMPONENT_PREFIXES)
+
+
+def component_for_stack(modules) -> str:
+    """Componente de una pila (módulos de sus marcos, en cualquier orden)"""
+    priority = min((_priority(module) for module in modules), default=None)
+    if priority is None or priority == len(COMPONENT_PREFIXES):
+        return "other"
+    return COMPONENT_PREFIXES[priority][1]
+
+
+class _ProfileSession:
+    """Sesión de perfilado activa en este worker (como máximo una)"""
+
+    def __init__(self, target_requests: Optional[int]):
+        self.target_requests = target_requests
+        self.completed_requests = 0
+        self.done = asyncio.Event()
+
+    def request_finished(self):
+        self.completed_requests += 1
+        if self.target_requests and self.completed_requests >= self.target_requests:
+            self.done.set()
+
+
+_active_session: Optional[_ProfileSession] = None
+
+router = APIRouter(
+    prefix="/admin", tags=["admin"], dependencies=[Depends(require_admin_token)]
+)
+
+
+@router.post("/profile", response_class=PlainTextResponse)
+async def profile(
+    seconds: Optional[float] = Query(
+        None, gt=0, le=MAX_PROFILE_SECONDS, description="Duración del perfilado"
+    ),
+    requests: Optional[int] = Query(
+        None, gt=0, description="Perfilar hasta completar N peticiones"
+    ),
+    interval_ms: float = Query(5.0, ge=1.0, le=100.0, description="Intervalo de muestreo"),
+    include_idle: bool = Query(False, description="Incluir hilos en espera"),
+):
+    """
+    Perfila este worker durante `seconds` segundos o hasta completar las
+    siguientes `requests` peticiones (con un máximo de 300 s).
+    Devuelve pilas colapsadas listas para flamegraph.pl o speedscope
+    """
+    global _active_session
+
+    if seconds is None and requests is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Indica 'seconds' o 'requests'",
+        )
+    if _active_session is not None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Ya hay un perfilado en curso en este worker",
+        )
+
+    session = _ProfileSession(target_requests=requests)
+    profiler = SamplingProfiler(interval=interval_ms / 1000, include_idle=include_idle)
+    _active_session = session
+    start_time = time.time()
+    logger.info(f"🔬 Perfilado iniciado (seconds={seconds}, requests={requests})")
+    profiler.start()
+    try:
+        try:
+            await asyncio.wait_for(
+                session.done.wait(), timeout=seconds or MAX_PROFILE_SECONDS
+            )
+        except asyncio.TimeoutError:
+            pass
+    finally:
+        collapsed = await asyncio.to_thread(profiler.stop)
+        _active_session = None
+
+    elapsed = time.time() - start_time
+    logger.info(
+        f"🔬 Perfilado terminado: {profiler.samples} muestras en {elapsed:.1f}s, "
+        f"{session.completed_requests} peticiones"
+    )
+    return PlainTextResponse(
+        collapsed,
+        headers={
+            "X-Profile-Samples": str(profiler.samples),
+            "X-Profile-Requests": str(session.completed_requests),
+            "X-Profile-Worker-Pid": str(os.getpid()),
+            "Content-Disposition": f'attachment; filename="profile-{os.getpid()}.collapsed"',
+        },
+    )
+
+
+async def count_requests_middleware(request: Request, call_next):
+    """Cuenta peticiones completadas mientras hay un perfilado activo"""
+    response = await call_next(request)
+    session = _active_session
+    if session is not None and not request.url.path.startswith("/admin"):
+        session.request_finished()
+    return response
@@ -6,7 +6,9 @@ import asyncio
 import logging
 import os
 import time
-from fastapi import APIRouter, HTTPException, status
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException, Request, Response, status
+from fastapi.responses import PlainTextResponse
 
 # Importar modelos locales
 from .models import (
@@ -14,6 +16,8 @@ from .models import (
     DilemmaResponse,
     HealthResponse,
     ErrorResponse,
+    SourceInfo,
+    SourcesResponse,
     TopicsResponse,
 )
 
@@ -22,13 +26,67 @@ import sys
 from pathlib import Path
 
 sys.path.append(str(Path(__file__).parent.parent))
-from core.generate_dilemma_rag import generate_dilemma_with_rag
+from core.deadline import Deadline, DeadlineExceeded, RequestCancelled
+from core.generate_dilemma_rag import fallback_dilemma, generate_dilemma_with_rag
+from core.index_store import index_exists
+from core.llm_providers import openai_key_required
+from core.log_config import log_payload
+from core.metrics import (
+    CLIENT_DISCONNECTS,
+    DEADLINE_EXCEEDED,
+    DEADLINE_FALLBACKS,
+    REQUEST_LATENCY,
+    format_server_timing,
+    render_prometheus,
+)
+from core.session_store import SessionNotFound
+from core.shards import ShardsUnavailable
+from core.source_catalog import (
+    FiltersNotIndexed,
+    describe_source,
+    load_catalog,
+    resolve_search_filters,
+)
+from core.topics import INTENSITIES, TOPIC_PARTITIONS, TOPICS
 
 logger = logging.getLogger(__name__)
 
 # Crear router
 router = APIRouter()
 
+# Cada cuánto se revisa si el cliente sigue conectado durante una generación
+DISCONNECT_POLL_SECONDS = 0.25
+# Código no estándar (nginx) para peticiones cuyo cliente se fue
+CLIENT_CLOSED_REQUEST = 499
+
+
+def request_deadline(deadline_ms: Optional[str]) -> Deadline:
+    """
+    Presupuesto de la petición: la cabecera `X-Deadline-Ms` o RAG_DEADLINE_MS
+    (30000), con RAG_DEADLINE_MAX_MS (120000) como tope
+    """
+    budget_ms = float(os.getenv("RAG_DEADLINE_MS", "30000"))
+    if deadline_ms is not None:
+        try:
+            budget_ms = float(deadline_ms)
+        except ValueError:
+            budget_ms = 0
+        if budget_ms <= 0:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="X-Deadline-Ms debe ser un número de milisegundos mayor que 0",
+            )
+    return Deadline(min(budget_ms, float(os.getenv("RAG_DEADLINE_MAX_MS", "120000"))))
+
+
+async def watch_disconnect(http_request: Request, deadline: Deadline):
+    """Cancela el trabajo pendiente de la petición si el cliente se desconecta"""
+    while not deadline.cancelled:
+        if await http_request.is_disconnected():
+            deadline.cancel()
+            return
+        await asyncio.sleep(DISCONNECT_POLL_SECONDS)
+
 
 @router.get("/", response_model=HealthResponse)
 async def root():
@@ -36,19 +94,22 @@ async def root():
     return HealthResponse(
         status="healthy",
         message="RAG Dilemma API is running",
-        database_status="connected" if os.path.exists("chroma") else "not_found",
+        database_status="connected" if index_exists() else "not_found",
     )
 
 
 @router.get("/health", response_model=HealthResponse)
 async def health_check():
     """Health check detallado"""
-    database_status = "connected" if os.path.exists("chroma") else "not_found"
-    openai_status = "configured" if os.getenv("OPENAI_API_KEY") else "missing"
+    database_status = "connected" if index_exists() else "not_found"
+    if os.getenv("OPENAI_API_KEY"):
+        openai_status = "configured"
+    else:
+        openai_status = "missing" if openai_key_required() else "not_required"
 
     return HealthResponse(
         status="healthy"
-        if database_status == "connected" and openai_status == "configured"
+        if database_status == "connected" and openai_status != "missing"
         else "degraded",
         message=f"Database: {database_status}, OpenAI: {openai_status}",
         database_status=database_status,
@@ -60,49 +121,122 @@ async def health_check():
     response_model=DilemmaResponse,
     responses={
         400: {"model": ErrorResponse, "description": "Bad Request"},
+        404: {
+            "model": ErrorResponse,
+            "description": "Sesión desconocida o filtros sin fuentes indexadas",
+        },
         500: {"model": ErrorResponse, "description": "Internal Server Error"},
+        504: {"model": ErrorResponse, "description": "Presupuesto agotado sin respaldo"},
     },
 )
-async def generate_dilemma(request: DilemmaRequest):
+async def generate_dilemma(
+    request: DilemmaRequest,
+    response: Response,
+    http_request: Request,
+    x_deadline_ms: Optional[str] = Header(
+        None, description="Presupuesto de tiempo de la petición en milisegundos"
+    ),
+):
     """
     Generar un dilema ético usando RAG con fundamentación filosófica
 
     - **topic**: Tópico ético (ej: "Temporalidad Moral", "Alteridad Radical", "Imperativo de Universalización", "Ontología de la Ignorancia", "Economía Moral del Deseo", "Microética Cotidiana")
     - **intensity**: Intensidad del dilema ("Suave", "Medio", "Extremo")
     - **user_context**: Contexto opcional sobre el usuario para personalización
+    - **filters**: Autores, obras o archivos donde buscar el contexto (ver `/sources`)
+    - **session_id**: Sesión cuyo historial personaliza el dilema (creada con `POST /sessions`; `404` si no existe)
+
+    La cabecera `Server-Timing` de la respuesta incluye la duración de cada etapa.
+
+    La petición tiene un presupuesto de tiempo (`X-Deadline-Ms` o RAG_DEADLINE_MS)
+    que se reparte entre embedding, búsqueda y LLM. Si se agota, se responde un
+    dilema reciente del mismo tópico e intensidad con `fallback: true` (o 504 si
+    no hay ninguno); si el cliente se desconecta, se cancela el trabajo pendiente
     """
     start_time = time.time()
+    response_status = "500"
 
-    logger.info(f"🎯 Generando dilema: {request.topic} | {request.intensity}")
+    logger.info("🎯 Generando dilema: %s | %s", request.topic, request.intensity)
     if request.user_context:
-        logger.info(f"👤 Contexto de usuario: {request.user_context}")
+        log_payload(logger, "👤 Contexto de usuario: %s", request.user_context)
 
     try:
+        deadline = request_deadline(x_deadline_ms)
+
         # Verificaciones previas
-        if not os.path.exists("chroma"):
+        if not index_exists():
             raise HTTPException(
                 status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
                 detail="Base de datos ChromaDB no encontrada. Ejecuta 'python core/create_database.py' primero.",
             )
 
-        if not os.getenv("OPENAI_API_KEY"):
+        if openai_key_required() and not os.getenv("OPENAI_API_KEY"):
             raise HTTPException(
                 status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
                 detail="OpenAI API Key no configurada. Verifica tu archivo .env",
             )
 
+        filters = request.filters.model_dump(exclude_none=True) if request.filters else None
+        try:
+            resolve_search_filters(request.topic, **(filters or {}))
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
         # Ejecutar generación RAG en background para no bloquear
-        result = await asyncio.to_thread(
-            generate_dilemma_with_rag,
-            topic=request.topic,
-            intensity=request.intensity,
-            user_context=request.user_context,
-        )
+        watcher = asyncio.create_task(watch_disconnect(http_request, deadline))
+        try:
+            result = await asyncio.to_thread(
+                generate_dilemma_with_rag,
+                topic=request.topic,
+                intensity=request.intensity,
+                user_context=request.user_context,
+                filters=filters,
+                session_id=request.session_id,
+                deadline=deadline,
+            )
+        except DeadlineExceeded as e:
+            DEADLINE_EXCEEDED.inc(stage=e.stage)
+            result = await asyncio.to_thread(
+                fallback_dilemma, request.topic, request.intensity, request.session_id
+            )
+            if result is None:
+                DEADLINE_FALLBACKS.inc(result="missing")
+                raise HTTPException(
+                    status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                    detail=f"{e} y no hay un dilema de respaldo para "
+                    f"{request.topic} | {request.intensity}",
+                )
+            DEADLINE_FALLBACKS.inc(result="served")
+            logger.warning(f"⏳ {e}: se responde un dilema de respaldo")
+        except ShardsUnavailable as e:
+            # Sin shards suficientes no hay contexto: mismo respaldo que por plazo
+            result = await asyncio.to_thread(
+                fallback_dilemma, request.topic, request.intensity, request.session_id
+            )
+            if result is None:
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e)
+                )
+            logger.warning(f"🧩 {e}: se responde un dilema de respaldo")
+        except RequestCancelled as e:
+            CLIENT_DISCONNECTS.inc(stage=e.stage)
+            logger.info(f"🔌 Cliente desconectado: {e}")
+            raise HTTPException(status_code=CLIENT_CLOSED_REQUEST, detail=str(e))
+        finally:
+            watcher.cancel()
 
         end_time = time.time()
         generation_time = (end_time - start_time) * 1000  # en milisegundos
 
-        logger.info(f"✅ Dilema generado exitosamente en {generation_time:.2f}ms")
+        if result.get("fallback"):
+            logger.info("🛟 Dilema de respaldo servido en %.2fms", generation_time)
+        else:
+            logger.info("✅ Dilema generado exitosamente en %.2fms", generation_time)
+
+        timings_ms = dict(result.pop("timings_ms", {}))
+        timings_ms["total"] = generation_time
+        response.headers["Server-Timing"] = format_server_timing(timings_ms)
+        result.pop("token_usage", None)
 
         # Validar que el resultado tenga los campos necesarios
         required_fields = [
@@ -116,6 +250,7 @@ async def generate_dilemma(request: DilemmaRequest):
                 logger.warning(f"⚠️  Campo faltante en resultado: {field}")
                 result[field] = f"Campo {field} no disponible"
 
+        response_status = "200"
         return DilemmaResponse(
             success=True,
             dilemma_text=result["dilemma_text"],
@@ -126,30 +261,63 @@ async def generate_dilemma(request: DilemmaRequest):
             intensity=result.get("intensity", request.intensity),
             sources_metadata=result.get("sources_metadata", []),
             generation_time_ms=generation_time,
+            session_id=result.get("session_id"),
+            dilemma_id=result.get("dilemma_id"),
+            fallback=result.get("fallback", False),
         )
 
-    except HTTPException:
+    except HTTPException as e:
         # Re-raise HTTP exceptions
+        response_status = str(e.status_code)
         raise
+    except SessionNotFound as e:
+        # La sesión no existe en este worker (ver core/session_store.py)
+        response_status = "404"
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except FiltersNotIndexed as e:
+        # Sin contexto del corpus no se genera: el dilema no tendría fundamento
+        response_status = "404"
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
     except Exception as e:
         logger.error(f"❌ Error generando dilema: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error interno del servidor: {str(e)}",
         )
+    finally:
+        REQUEST_LATENCY.observe(
+            time.time() - start_time,
+            endpoint="/generate-dilemma",
+            status=response_status,
+        )
 
 
 @router.get("/topics", response_model=TopicsResponse)
 async def get_available_topics():
     """Obtener los tópicos éticos disponibles"""
-    return TopicsResponse(
-        topics=[
-            "Temporalidad Moral",
-            "Alteridad Radical",
-            "Imperativo de Universalización",
-            "Ontología de la Ignorancia",
-            "Economía Moral del Deseo",
-            "Microética Cotidiana",
+    return TopicsResponse(topics=TOPICS, intensities=INTENSITIES)
+
+
+@router.get("/sources", response_model=SourcesResponse)
+async def get_sources():
+    """Catálogo de fuentes (autor, obra y partición) para filtrar las búsquedas"""
+    return SourcesResponse(
+        sources=[
+            SourceInfo(
+                source=name,
+                author=info["author"],
+                work=info["work"],
+                partition=info["partition"],
+            )
+            for name, info in ((n, describe_source(n)) for n in load_catalog())
         ],
-        intensities=["Suave", "Medio", "Extremo"],
+        topic_partitions=TOPIC_PARTITIONS,
+    )
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Métricas del proceso en formato de texto de Prometheus"""
+    return PlainTextResponse(
+        render_prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8"
     )
@@ -4,16 +4,31 @@ FastAPI Server principal para el generador de dilemas RAG
 Ejecutar con: uvicorn api.server:app --reload --host 0.0.0.0 --port 8000
 """
 
+import asyncio
 import logging
 import os
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse
 
+from . import admin, ingest, profiling, sessions
 from .routes import router
 
-# Configurar logging
-logging.basicConfig(level=logging.INFO)
+from core.config import load_environment
+from core.generate_dilemma_rag import preload_dependencies
+from core.index_store import index_exists, live_index_path
+from core.llm_providers import LLM_PROVIDERS, llm_provider, openai_key_required
+from core.log_config import configure_logging, start_request
+from core.openai_clients import close_http_client
+
+# Cargar .env al importar: de él dependen el logging y qué routers se montan
+# (RAG_ADMIN_TOKEN, RAG_ENABLE_PROFILER); solo lee el archivo
+load_environment()
+
+# Configurar logging (en cola, con id de petición; ver core/log_config.py)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 
@@ -23,24 +38,101 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info("🚀 Iniciando RAG Dilemma API Server...")
 
-    # Verificar base de datos ChromaDB
-    if not os.path.exists("chroma"):
-        logger.warning("⚠️  No se encontró la base de datos ChromaDB")
-    else:
-        logger.info("✅ Base de datos ChromaDB encontrada")
-
-    # Verificar variables de entorno
-    if not os.getenv("OPENAI_API_KEY"):
-        logger.warning("⚠️  OPENAI_API_KEY no encontrada")
-    else:
-        logger.info("✅ OpenAI API Key configurada")
+    # Importar LangChain/Chroma/OpenAI en segundo plano: el servidor acepta
+    # peticiones de inmediato y la primera generación no paga el import
+    warmup = asyncio.create_task(asyncio.to_thread(preload_dependencies))
+
+    # En modo producción el proceso padre (scripts/start_server.py --prod)
+    # ya hizo las verificaciones una sola vez antes de crear los workers
+    if os.getenv("RAG_PREFLIGHT_DONE") != "1":
+        # Verificar base de datos ChromaDB
+        if not index_exists():
+            logger.warning("⚠️  No se encontró la base de datos ChromaDB")
+        else:
+            logger.info(f"✅ Base de datos ChromaDB encontrada: {live_index_path()}")
+
+        # Verificar variables de entorno (los embeddings de OpenAI también la usan)
+        provider = llm_provider()
+        logger.info(f"🤖 Proveedor de LLM: {provider}")
+        if provider not in LLM_PROVIDERS:
+            logger.warning(f"⚠️  Proveedor de LLM desconocido: {provider}")
+        if os.getenv("OPENAI_API_KEY"):
+            logger.info("✅ OpenAI API Key configurada")
+        elif openai_key_required():
+            logger.warning("⚠️  OPENAI_API_KEY no encontrada")
+        else:
+            logger.info("✅ OpenAI API Key no requerida (chat y embeddings sin OpenAI)")
 
     logger.info("🎯 Servidor listo!")
 
     yield
 
+    warmup.cancel()
     # Shutdown
     logger.info("🛑 Cerrando RAG Dilemma API Server...")
+    close_http_client()
+
+
+class RequestIdMiddleware:
+    """
+    Id de cada petición (cabecera X-Request-ID o uno nuevo) para los logs,
+    devuelto en la respuesta en la misma cabecera
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        received = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                received = value.decode("latin-1")
+                break
+        request_id = start_request(received).encode("latin-1")
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-request-id", request_id))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        await self.app(scope, receive, send_with_request_id)
+
+
+def default_response_class():
+    """ORJSONResponse si orjson está instalado (serializa más rápido que json)"""
+    try:
+        import orjson  # noqa: F401
+        from fastapi.responses import ORJSONResponse
+    except ImportError:
+        return JSONResponse
+    return ORJSONResponse
+
+
+def add_compression(app: FastAPI):
+    """
+    Compresión de respuestas grandes según RAG_COMPRESSION: "gzip" (por
+    defecto), "brotli" (requiere brotli-asgi; usa gzip con clientes sin br)
+    u "off". Solo se comprimen respuestas de al menos RAG_COMPRESSION_MIN_SIZE bytes
+    """
+    mode = os.getenv("RAG_COMPRESSION", "gzip").lower()
+    minimum_size = int(os.getenv("RAG_COMPRESSION_MIN_SIZE", "1000"))
+    if mode == "off":
+        return
+    if mode == "brotli":
+        try:
+            from brotli_asgi import BrotliMiddleware
+
+            app.add_middleware(
+                BrotliMiddleware, minimum_size=minimum_size, gzip_fallback=True
+            )
+            return
+        except ImportError:
+            logger.warning("⚠️  brotli-asgi no está instalado; usando gzip")
+    app.add_middleware(GZipMiddleware, minimum_size=minimum_size)
 
 
 # Crear app FastAPI
@@ -51,6 +143,7 @@ app = FastAPI(
     docs_url="/docs",
     redoc_url="/redoc",
     lifespan=lifespan,
+    default_response_class=default_response_class(),
 )
 
 # Configurar CORS para Next.js
@@ -63,12 +156,27 @@ app.add_middleware(
         "http://127.0.0.1:9002",
     ],
     allow_credentials=True,
-    allow_methods=["GET", "POST", "OPTIONS"],
+    allow_methods=["GET", "POST", "DELETE", "OPTIONS"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID"],
 )
+add_compression(app)
+app.add_middleware(RequestIdMiddleware)
 
 # Incluir rutas
 app.include_router(router)
+app.include_router(sessions.router)
+
+# Administración del índice e ingesta de PDFs (solo si hay RAG_ADMIN_TOKEN)
+if admin.is_enabled():
+    app.include_router(admin.router)
+    app.include_router(ingest.router)
+
+# Perfilador bajo demanda (solo si está habilitado; sin coste si no lo está)
+if profiling.is_enabled():
+    app.include_router(profiling.router)
+    app.middleware("http")(profiling.count_requests_middleware)
+    logger.warning("🔬 Perfilador de administración habilitado en /admin/profile")
 
 # Para desarrollo local
 if __name__ == "__main__":
@@ -0,0 +1,58 @@
+"""
+Endpoints de sesiones: historial compacto en el servidor en lugar de reenviar
+`user_context` en cada petición (ver core/session_store.py)
+"""
+
+from fastapi import APIRouter, HTTPException, Response, status
+
+from core.session_store import SessionNotFound, get_session_store
+
+from .models import AnswerRequest, SessionResponse
+
+router = APIRouter(prefix="/sessions", tags=["sessions"])
+
+
+def _session_response(session) -> SessionResponse:
+    return SessionResponse(**session.to_dict(), ttl_seconds=get_session_store().ttl)
+
+
+def _get_session(session_id: str):
+    try:
+        return get_session_store().require(session_id)
+    except SessionNotFound as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+
+
+@router.post("", response_model=SessionResponse, status_code=status.HTTP_201_CREATED)
+async def create_session():
+    """Crea una sesión vacía con un id generado por el servidor"""
+    return _session_response(get_session_store().create())
+
+
+@router.get("/{session_id}", response_model=SessionResponse)
+async def get_session(session_id: str):
+    """Historial compacto de la sesión"""
+    return _session_response(_get_session(session_id))
+
+
+@router.post("/{session_id}/answers", response_model=SessionResponse)
+async def add_answer(session_id: str, request: AnswerRequest):
+    """Registra la respuesta del usuario a un dilema de la sesión"""
+    session = _get_session(session_id)
+    if not session.add_answer(request.answer, request.dilemma_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Dilema no encontrado en la sesión",
+        )
+    return _session_response(session)
+
+
+@router.delete("/{session_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_session(session_id: str):
+    """Elimina la sesión y su historial"""
+    if not get_session_store().delete(session_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Sesión no encontrada o expirada: {session_id}",
+        )
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -1,8 +1,23 @@
 """
 Core module for RAG Dilemma Generator
-"""
 
-from .generate_dilemma_rag import generate_dilemma_with_rag
-from .get_embedding_function import get_embedding_function
+Los submódulos se importan bajo demanda: importar `core` no carga
+LangChain, Chroma ni el cliente de OpenAI
+"""
 
 __all__ = ["generate_dilemma_with_rag", "get_embedding_function"]
+
+_LAZY_ATTRIBUTES = {
+    "generate_dilemma_with_rag": ".generate_dilemma_rag",
+    "get_embedding_function": ".get_embedding_function",
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        from importlib import import_module
+
+        value = getattr(import_module(_LAZY_ATTRIBUTES[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,315 @@
+"""
+Generación masiva de dilemas sobre la grilla tópico × intensidad, reanudable.
+
+Cada dilema generado se añade como una línea JSON a `--output`; al relanzar
+con el mismo archivo se saltan los que ya terminaron (los que fallaron se
+reintentan). Las generaciones corren en paralelo hasta `--concurrency`, con
+límites opcionales de peticiones y tokens por minuto.
+
+Uso (desde rag/):
+    python -m core.bulk_generate --count 50 --output dilemas.jsonl
+    python -m core.bulk_generate --topics "Alteridad Radical" --intensities Suave,Medio \\
+        --count 200 --concurrency 8 --rpm 300 --tpm 150000 --output dilemas.jsonl
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Iterator, List, Optional, Set
+
+from .generate_dilemma_rag import generate_dilemma_with_rag
+from .log_config import configure_logging
+from .topics import INTENSITIES, TOPICS
+
+# Estados que cuentan como terminados al reanudar
+DONE_STATUSES = ("ok", "parse_error")
+
+
+def log(message: str):
+    print(message, file=sys.stderr, flush=True)
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def item_id(topic: str, intensity: str, index: int) -> str:
+    return f"{topic}|{intensity}|{index}"
+
+
+def grid_items(topics: List[str], intensities: List[str], count: int) -> Iterator[Dict]:
+    """Celdas tópico × intensidad, `count` dilemas por celda, intercaladas"""
+    for index in range(count):
+        for topic in topics:
+            for intensity in intensities:
+                yield {
+                    "id": item_id(topic, intensity, index),
+                    "topic": topic,
+                    "intensity": intensity,
+                    "index": index,
+                }
+
+
+def load_checkpoint(path: str) -> Set[str]:
+    """Ids ya terminados en `path`; ignora una última línea a medio escribir"""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get("status") in DONE_STATUSES:
+                done.add(record["id"])
+    return done
+
+
+class RateLimiter:
+    """
+    Ventana deslizante de 60 s con máximo de peticiones (`rpm`) y de tokens
+    (`tpm`). Los tokens de cada llamada se descuentan cuando termina
+    """
+
+    def __init__(self, rpm: Optional[int] = None, tpm: Optional[int] = None):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = deque()
+        self._tokens = deque()
+        self._lock = threading.Lock()
+
+    def _trim(self, now: float):
+        while self._requests and now - self._requests[0] >= 60:
+            self._requests.popleft()
+        while self._tokens and now - self._tokens[0][0] >= 60:
+            self._tokens.popleft()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._trim(now)
+                waits = []
+                if self.rpm and len(self._requests) >= self.rpm:
+                    waits.append(60 - (now - self._requests[0]))
+                if self.tpm and sum(t for _, t in self._tokens) >= self.tpm:
+                    waits.append(60 - (now - self._tokens[0][0]))
+                if not waits:
+                    self._requests.append(now)
+                    return
+            time.sleep(max(0.01, min(waits)))
+
+    def record_tokens(self, tokens: int):
+        if self.tpm and tokens:
+            with self._lock:
+                self._tokens.append((time.monotonic(), tokens))
+
+
+class BulkStats:
+    """Contadores de la ejecución para el reporte de throughput"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.counts = {"ok": 0, "parse_error": 0, "failed": 0}
+        self.tokens = 0
+        self.prompt_tokens = 0
+        self.cached_prompt_tokens = 0
+        self.latencies_ms = []
+        self.interrupted = False
+        self._lock = threading.Lock()
+
+    def add(self, record: Dict):
+        with self._lock:
+            self.counts[record["status"]] += 1
+            usage = record.get("token_usage") or {}
+            self.tokens += usage.get("prompt_tokens", 0) + usage.get(
+                "completion_tokens", 0
+            )
+            self.prompt_tokens += usage.get("prompt_tokens", 0)
+            self.cached_prompt_tokens += usage.get("cached_prompt_tokens", 0)
+            self.latencies_ms.append(record["elapsed_ms"])
+
+    @property
+    def completed(self) -> int:
+        return sum(self.counts.values())
+
+    def summary(self) -> str:
+        elapsed = time.perf_counter() - self.start
+        completed = self.completed
+        generated = completed - self.counts["failed"]
+        parse_rate = self.counts["parse_error"] / generated if generated else 0.0
+        cache_rate = (
+            self.cached_prompt_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+        )
+        return (
+            f"{completed} terminados en {elapsed:.1f}s "
+            f"({completed / elapsed if elapsed else 0:.2f}/s, "
+            f"{self.tokens / elapsed * 60 if elapsed else 0:.0f} tokens/min, "
+            f"{cache_rate:.0%} del prompt en caché) | "
+            f"ok {self.counts['ok']}, JSON inválido {self.counts['parse_error']} "
+            f"({parse_rate:.1%}), fallidos {self.counts['failed']} | "
+            f"p50 {percentile(self.latencies_ms, 0.5):.0f}ms, "
+            f"p95 {percentile(self.latencies_ms, 0.95):.0f}ms"
+        )
+
+
+def generate_item(item: Dict, limiter: RateLimiter) -> Dict:
+    """Genera un dilema y lo convierte en un registro del checkpoint"""
+    limiter.acquire()
+    start = time.perf_counter()
+    record = dict(item)
+    try:
+        result = generate_dilemma_with_rag(item["topic"], item["intensity"])
+        record["timings_ms"] = result.pop("timings_ms", {})
+        record["token_usage"] = result.pop("token_usage", {})
+        record["status"] = "parse_error" if "error" in result else "ok"
+        record["dilemma"] = result
+        usage = record["token_usage"]
+        limiter.record_tokens(
+            usage.get("prompt_tokens", 0) + usage.get("completion_tokens", 0)
+        )
+    except Exception as e:
+        record["status"] = "failed"
+        record["error"] = str(e)
+    record["elapsed_ms"] = (time.perf_counter() - start) * 1000
+    return record
+
+
+def run_bulk(
+    items: List[Dict],
+    output_path: str,
+    concurrency: int,
+    limiter: RateLimiter,
+    progress_every: int = 10,
+) -> BulkStats:
+    """
+    Genera los `items` en paralelo y añade cada registro a `output_path` en
+    cuanto termina. Ctrl+C deja de lanzar nuevos y espera a los que están en curso
+    """
+    stats = BulkStats()
+    pending_items = iter(items)
+    with open(output_path, "a", encoding="utf-8") as output, ThreadPoolExecutor(
+        max_workers=concurrency
+    ) as executor:
+        running = set()
+        stopping = False
+
+        def submit_next():
+            item = next(pending_items, None)
+            if item is not None:
+                running.add(executor.submit(generate_item, item, limiter))
+
+        for _ in range(concurrency):
+            submit_next()
+
+        while running:
+            try:
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            except KeyboardInterrupt:
+                if stopping:
+                    raise
+                log("🛑 Interrumpido: esperando las generaciones en curso...")
+                stopping = stats.interrupted = True
+                continue
+            for future in finished:
+                running.discard(future)
+                record = future.result()
+                output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                output.flush()
+                stats.add(record)
+                if record["status"] == "failed":
+                    log(f"❌ {record['id']}: {record['error']}")
+                if stats.completed % progress_every == 0:
+                    log(f"📈 {stats.summary()}")
+                if not stopping:
+                    submit_next()
+    return stats
+
+
+def csv_list(value: str) -> List[str]:
+    return [v.strip() for v in value.split(",") if v.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generación masiva y reanudable de dilemas"
+    )
+    parser.add_argument(
+        "--topics",
+        type=csv_list,
+        default=TOPICS,
+        help="Tópicos separados por coma (por defecto los de /topics)",
+    )
+    parser.add_argument(
+        "--intensities",
+        type=csv_list,
+        default=INTENSITIES,
+        help="Intensidades separadas por coma (por defecto todas)",
+    )
+    parser.add_argument("--count", type=int, default=10, help="Dilemas por celda")
+    parser.add_argument("--output", type=str, required=True, help="JSONL de salida")
+    parser.add_argument(
+        "--concurrency", type=int, default=4, help="Generaciones en paralelo"
+    )
+    parser.add_argument("--rpm", type=int, help="Máximo de llamadas por minuto")
+    parser.add_argument("--tpm", type=int, help="Máximo de tokens por minuto")
+    parser.add_argument(
+        "--progress-every", type=int, default=10, help="Reporte cada N dilemas"
+    )
+    parser.add_argument(
+        "--verbose",
+        action="store_true",
+        help="Mostrar los logs de cada generación (nivel INFO)",
+    )
+    args = parser.parse_args()
+    # Los logs de cada generación van por stderr junto al progreso: por
+    # defecto solo advertencias y errores (RAG_LOG_LEVEL lo cambia)
+    configure_logging(
+        level="INFO" if args.verbose else os.getenv("RAG_LOG_LEVEL", "WARNING")
+    )
+
+    unknown = [t for t in args.topics if t not in TOPICS]
+    unknown += [i for i in args.intensities if i not in INTENSITIES]
+    if unknown:
+        parser.error(f"Valores desconocidos: {', '.join(unknown)}")
+
+    done = load_checkpoint(args.output)
+    items = [
+        item
+        for item in grid_items(args.topics, args.intensities, args.count)
+        if item["id"] not in done
+    ]
+    total = len(args.topics) * len(args.intensities) * args.count
+    log(
+        f"🎯 {total} dilemas en {len(args.topics)} tópicos × "
+        f"{len(args.intensities)} intensidades × {args.count}"
+    )
+    if done:
+        log(f"♻️  Reanudando: {total - len(items)} ya estaban en {args.output}")
+    if not items:
+        log("✅ Nada pendiente")
+        return
+
+    limiter = RateLimiter(args.rpm, args.tpm)
+    stats = run_bulk(items, args.output, args.concurrency, limiter, args.progress_every)
+
+    log(f"✅ {stats.summary()}")
+    if stats.interrupted:
+        log("♻️  Vuelve a ejecutar el mismo comando para continuar")
+        sys.exit(130)
+    if stats.counts["failed"]:
+        log("♻️  Vuelve a ejecutar el mismo comando para reintentar los fallidos")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
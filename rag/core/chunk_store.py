@@ -0,0 +1,227 @@
+"""
+Textos y metadatos de los chunks en memoria compacta para servir peticiones.
+
+En lugar de crear en cada búsqueda un `Document` de LangChain por resultado
+(con una copia del texto y del dict completo de metadatos), cada versión del
+índice carga sus chunks una sola vez en:
+
+- un único buffer UTF-8 con todos los textos y una tabla de offsets
+- un registro con `__slots__` por chunk con los campos que usa el servicio,
+  con las cadenas internadas (cada fuente, autor y obra existe una sola vez)
+
+La búsqueda devuelve solo ids y distancias (`search_chunks`) y el texto se
+corta del buffer con `memoryview`, sin copias intermedias, al armar el prompt:
+el contexto completo se construye con un único `join` y un único `decode`.
+
+Las versiones publicadas del índice no cambian (ver index_store), así que el
+almacén de una versión se construye una vez y vive mientras la versión esté
+abierta. Las versiones importadas de un snapshot ya traen el buffer y los
+offsets en este mismo formato y se mapean sin construir nada.
+"""
+
+import logging
+import sys
+import threading
+import time
+import weakref
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+CONTEXT_SEPARATOR = "\n\n---\n\n"
+UNKNOWN_SOURCE = "Desconocida"
+
+# Almacén de cada versión abierta del índice
+_chunk_stores = weakref.WeakKeyDictionary()
+_chunk_stores_lock = threading.Lock()
+
+
+def _intern(value) -> Optional[str]:
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class ChunkRecord:
+    """Metadatos de un chunk que usa el servicio"""
+
+    __slots__ = ("source", "source_name", "author", "work", "partition", "page")
+
+    def __init__(self, metadata: Dict):
+        self.source = _intern(metadata.get("source"))
+        self.source_name = _intern(metadata.get("source_name"))
+        self.author = _intern(metadata.get("author"))
+        self.work = _intern(metadata.get("work"))
+        self.partition = _intern(metadata.get("partition"))
+        self.page = metadata.get("page")
+
+    def metadata(self) -> Dict:
+        """Los campos con valor, como dict de metadatos"""
+        return {
+            field: getattr(self, field)
+            for field in self.__slots__
+            if getattr(self, field) is not None
+        }
+
+
+class ChunkStore:
+    """Textos de todos los chunks de una versión en un buffer UTF-8 contiguo"""
+
+    def __init__(self):
+        self.records: List[ChunkRecord] = []
+        self._positions: Dict[str, int] = {}
+        self._offsets = array("Q", [0])
+        self._parts: Optional[List[bytes]] = []
+        self._buffer = b""
+        self._view = memoryview(self._buffer)
+        # "Fuente: <source>\n" codificado una vez por fuente
+        self._headers: Dict[Optional[str], bytes] = {}
+        self._separator = CONTEXT_SEPARATOR.encode("utf-8")
+
+    def add(self, chunk_id: str, text: Optional[str], metadata: Optional[Dict]):
+        data = (text or "").encode("utf-8")
+        self._parts.append(data)
+        self._offsets.append(self._offsets[-1] + len(data))
+        self._positions[chunk_id] = len(self.records)
+        self.records.append(ChunkRecord(metadata or {}))
+
+    @classmethod
+    def from_buffer(
+        cls, chunk_ids: List[str], buffer, offsets, metadatas: List[Optional[Dict]]
+    ) -> "ChunkStore":
+        """
+        Almacén sobre un buffer y una tabla de offsets ya armados, por ejemplo
+        mapeados desde un snapshot (ver snapshot.py), sin copiar los textos
+        """
+        chunks = cls()
+        chunks.records = [ChunkRecord(metadata or {}) for metadata in metadatas]
+        chunks._positions = {chunk_id: i for i, chunk_id in enumerate(chunk_ids)}
+        chunks._offsets = offsets
+        chunks._parts = None
+        chunks._buffer = buffer
+        chunks._view = memoryview(buffer)
+        return chunks
+
+    def freeze(self) -> "ChunkStore":
+        """Une los textos en el buffer final; no se pueden añadir más chunks"""
+        self._buffer = b"".join(self._parts)
+        self._view = memoryview(self._buffer)
+        self._parts = None
+        return self
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes del buffer de textos más la tabla de offsets"""
+        return len(self._buffer) + self._offsets.itemsize * len(self._offsets)
+
+    def position(self, chunk_id: str) -> Optional[int]:
+        return self._positions.get(chunk_id)
+
+    def raw(self, position: int) -> memoryview:
+        """Texto del chunk como vista del buffer (sin copiar)"""
+        return self._view[self._offsets[position] : self._offsets[position + 1]]
+
+    def text(self, position: int) -> str:
+        return str(self.raw(position), "utf-8")
+
+    def sources(self, positions: Iterable[int]) -> List[str]:
+        return [self.records[p].source or UNKNOWN_SOURCE for p in positions]
+
+    def context(self, positions: Iterable[int], with_source: bool = False) -> str:
+        """
+        Textos de los chunks separados por CONTEXT_SEPARATOR, opcionalmente
+        precedidos por "Fuente: <source>", en una sola copia
+        """
+        pieces = []
+        for position in positions:
+            if pieces:
+                pieces.append(self._separator)
+            if with_source:
+                pieces.append(self._header(self.records[position].source))
+            pieces.append(self.raw(position))
+        return b"".join(pieces).decode("utf-8")
+
+    def _header(self, source: Optional[str]) -> bytes:
+        header = self._headers.get(source)
+        if header is None:
+            header = self._headers[source] = (
+                f"Fuente: {source or UNKNOWN_SOURCE}\n".encode("utf-8")
+            )
+        return header
+
+
+def build_chunk_store(collection, batch_size: int = BATCH_SIZE) -> ChunkStore:
+    """Lee por lotes todos los chunks de una colección Chroma"""
+    chunks = ChunkStore()
+    offset = 0
+    while True:
+        batch = collection.get(
+            limit=batch_size, offset=offset, include=["documents", "metadatas"]
+        )
+        for chunk_id, text, metadata in zip(
+            batch["ids"], batch["documents"], batch["metadatas"]
+        ):
+            chunks.add(chunk_id, text, metadata)
+        if len(batch["ids"]) < batch_size:
+            break
+        offset += batch_size
+    return chunks.freeze()
+
+
+def register_chunk_store(store, chunks: ChunkStore):
+    """Asocia a una versión abierta un almacén ya construido (ver snapshot.py)"""
+    with _chunk_stores_lock:
+        _chunk_stores[store] = chunks
+
+
+def get_chunk_store(store) -> ChunkStore:
+    """ChunkStore de una versión abierta del índice (se construye en el primer uso)"""
+    chunks = _chunk_stores.get(store)
+    if chunks is None:
+        with _chunk_stores_lock:
+            chunks = _chunk_stores.get(store)
+            if chunks is None:
+                start = time.perf_counter()
+                chunks = _chunk_stores[store] = build_chunk_store(store._collection)
+                logger.info(
+                    f"🧱 {len(chunks)} chunks en memoria compacta "
+                    f"({chunks.nbytes / 1024 / 1024:.1f} MiB, "
+                    f"{(time.perf_counter() - start) * 1000:.0f}ms)"
+                )
+    return chunks
+
+
+def search_chunks(
+    store,
+    query_embeddings: List[List[float]],
+    k: int,
+    search_filters: Optional[Dict[str, Optional[List[str]]]] = None,
+) -> Tuple[ChunkStore, List[List[Tuple[int, float]]]]:
+    """
+    Como partitions.search_by_vectors, pero cada resultado es
+    (posición en el ChunkStore, distancia) en lugar de un Document
+    """
+    from .partitions import search_by_vectors
+
+    search = getattr(store, "search_chunks", None)
+    if search is not None:
+        # Versión repartida en shards: los textos llegan con los resultados
+        # (ver shards.ShardedStore)
+        return search(query_embeddings, k, search_filters)
+    chunks = get_chunk_store(store)
+    hits = []
+    for results in search_by_vectors(
+        store, query_embeddings, k, search_filters, ids_only=True
+    ):
+        query_hits = []
+        for chunk_id, distance in results:
+            position = chunks.position(chunk_id)
+            if position is None:
+                logger.warning(f"⚠️  Chunk fuera del almacén compacto: {chunk_id}")
+                continue
+            query_hits.append((position, distance))
+        hits.append(query_hits)
+    return chunks, hits
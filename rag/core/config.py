@@ -0,0 +1,20 @@
+"""
+Configuración del entorno resuelta en tiempo de ejecución, no al importar
+"""
+
+import threading
+
+_env_loaded = False
+_env_lock = threading.Lock()
+
+
+def load_environment():
+    """Carga el archivo .env una sola vez, la primera vez que se necesita"""
+    global _env_loaded
+    if not _env_loaded:
+        with _env_lock:
+            if not _env_loaded:
+                from dotenv import load_dotenv
+
+                load_dotenv()
+                _env_loaded = True
@@ -1,12 +1,31 @@
 import os
 import shutil
 import argparse
-from langchain.document_loaders import PyPDFDirectoryLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain.schema.document import Document
-from langchain.vectorstores.chroma import Chroma
+from typing import TYPE_CHECKING
 
 from .get_embedding_function import get_embedding_function
+from .index_store import (
+    collect_garbage,
+    copy_version,
+    live_index_path,
+    new_version_path,
+    publish_version,
+    validate_index,
+)
+from .ingest_jobs import ingest_lock
+from .partitions import sync_partitions
+from .shards import (
+    reshard_version,
+    shard_count,
+    split_by_store,
+    version_stores,
+    write_manifest,
+)
+from .source_catalog import tag_chunks
+
+# Los loaders, el splitter y Chroma se importan dentro de cada función
+if TYPE_CHECKING:
+    from langchain.schema.document import Document
 
 
 # ruta de la carpeta data
@@ -15,53 +34,143 @@ DATA_PATH = "data"
 
 
 def main():
-    # Check if the database should be cleared (using the --clear flag).
+    # Cada ejecución construye una versión nueva del índice junto a la activa,
+    # la valida y la publica; el servidor cambia a ella sin cortar el servicio
     parser = argparse.ArgumentParser()
-    parser.add_argument("--reset", action="store_true", help="Reset the database.")
+    parser.add_argument(
+        "--reset",
+        action="store_true",
+        help="Construir la versión nueva desde cero en lugar de copiar la activa",
+    )
+    parser.add_argument(
+        "--no-publish",
+        action="store_true",
+        help="Construir y validar la versión nueva sin publicarla",
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        help="Repartir la versión nueva en N shards (0 = sin shards; por "
+        "defecto los de la versión activa). Ver core/shards.py",
+    )
     args = parser.parse_args()
-    if args.reset:
-        print("✨ Clearing Database")
-        clear_database()
+
+    # Misma exclusión que los trabajos de POST /ingest: dos procesos copiando
+    # y publicando a la vez perderían los chunks del que publique primero
+    with ingest_lock(
+        on_wait=lambda: print("⏳ Hay otra ingesta en curso; esperando su turno")
+    ):
+        build_version(args)
+
+
+def build_version(args: argparse.Namespace):
+    """Copia (o reparte) la versión activa, añade los chunks nuevos y la publica"""
+    live_path = live_index_path(CHROMA_PATH)
+    version_path = new_version_path(CHROMA_PATH)
+    live_exists = os.path.isdir(live_path)
+    live_shards = shard_count(live_path) if live_exists else 0
+    shards = live_shards if args.shards is None else args.shards
+    resharded = False
+    if args.reset or not live_exists:
+        print(f"✨ Construyendo versión nueva desde cero: {version_path}")
+        if shards:
+            write_manifest(version_path, shards)
+    elif shards != live_shards:
+        # Se reparten los vectores ya calculados, sin volver a calcular embeddings
+        print(
+            f"🧩 Repartiendo la versión activa {live_path} de {live_shards} "
+            f"a {shards} shards -> {version_path}"
+        )
+        copied = reshard_version(live_path, version_path, shards)
+        print(f"🧩 {copied} chunks repartidos")
+        resharded = True
+    else:
+        print(f"📋 Copiando la versión activa {live_path} -> {version_path}")
+        copy_version(live_path, version_path)
 
     # Cargar los documentos de la carpeta data
     documents = load_documents()
-    chunks = split_documents(documents)
-    add_to_chroma(chunks)
-
-
-def load_documents():
+    chunks = tag_chunks(calculate_chunk_ids(split_documents(documents)))
+    added = 0
+    synced = 0
+    for store_path, store_chunks in split_by_store(chunks, version_path).items():
+        added += add_to_chroma(store_chunks, store_path, tagged=True)
+    # Colecciones por autor/obra según data/catalog.json (en cada shard)
+    for store_path in version_stores(version_path):
+        synced += sync_partitions(store_path)
+    if synced:
+        print(f"🗂️  Particiones actualizadas: {synced} cambios")
+
+    if not added and not synced and not resharded and not args.reset:
+        shutil.rmtree(version_path, ignore_errors=True)
+        print("La versión activa ya está al día")
+        return
+
+    try:
+        count = validate_index(version_path)
+    except ValueError as e:
+        print(f"❌ La versión nueva no es válida: {e}")
+        shutil.rmtree(version_path, ignore_errors=True)
+        raise SystemExit(1)
+    print(f"✅ Versión validada: {count} documentos")
+
+    if args.no_publish:
+        print(f"📦 Versión lista sin publicar: {version_path}")
+        return
+
+    publish_version(version_path, CHROMA_PATH)
+    print(f"🚀 Versión publicada: {version_path}")
+    for path in collect_garbage(CHROMA_PATH):
+        print(f"🗑️  Versión antigua eliminada: {path}")
+
+
+def load_documents(data_path: str = DATA_PATH):
     """
     Cargar los documentos de la carpeta data
     retorna un diccionario con el contenido de texto en cada pagina del PDF
     """
-    document_loader = PyPDFDirectoryLoader(DATA_PATH)
+    from langchain.document_loaders import PyPDFDirectoryLoader
+
+    document_loader = PyPDFDirectoryLoader(data_path)
     return document_loader.load()
 
 
-def split_documents(documents: list[Document]):
+def split_documents(
+    documents: "list[Document]", chunk_size: int = 800, chunk_overlap: int = 100
+):
     """
-    Divide el texto en fragmentos más pequeños y manejables. Cada fragmento tiene 1000 letras y comparte 500 letras con el fragmento anterior para no perder el hilo del texto
+    Divide el texto en fragmentos más pequeños y manejables. Cada fragmento tiene 800 letras y comparte 100 letras con el fragmento anterior para no perder el hilo del texto
     """
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
     text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=800,
-        chunk_overlap=100,
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
         length_function=len,
         is_separator_regex=False,
     )
     return text_splitter.split_documents(documents)
 
 
-def add_to_chroma(chunks: list[Document]):
+def add_to_chroma(
+    chunks: "list[Document]", persist_directory: str = CHROMA_PATH, tagged: bool = False
+):
     """
     Funcion para guardar los chunks en la base de datos vectorial
+    retorna el numero de chunks nuevos añadidos
+
+    Con `tagged` los chunks ya traen id y etiquetas (por ejemplo, los de un
+    shard: los ids se calculan sobre todos los chunks, ver calculate_chunk_ids)
     """
+    from langchain.vectorstores.chroma import Chroma
+
     db = Chroma(
-        persist_directory=CHROMA_PATH,
+        persist_directory=persist_directory,
         embedding_function=get_embedding_function(),
     )
 
-    # Calculamos los ids de las paginas
-    chunks_with_ids = calculate_chunk_ids(chunks)
+    # Calculamos los ids de las paginas y los etiquetamos con autor y obra
+    chunks_with_ids = chunks if tagged else tag_chunks(calculate_chunk_ids(chunks))
 
     # añadir o actualizar documentos
     existing_items = db.get(include=[])
@@ -81,6 +190,7 @@ def add_to_chroma(chunks: list[Document]):
         db.persist()
     else:
         print("No hay documentos nuevos para añadir")
+    return len(new_chunks)
 
 
 def calculate_chunk_ids(chunks):
@@ -121,10 +231,5 @@ def calculate_chunk_ids(chunks):
     return chunks
 
 
-def clear_database():
-    if os.path.exists(CHROMA_PATH):
-        shutil.rmtree(CHROMA_PATH)
-
-
 if __name__ == "__main__":
     main()
@@ -0,0 +1,158 @@
+"""
+Presupuesto de tiempo de una petición de punta a punta.
+
+El API crea un Deadline por petición (cabecera `X-Deadline-Ms` o
+RAG_DEADLINE_MS) y lo pasa a generate_dilemma_with_rag. Cada etapa revisa el
+presupuesto antes de empezar y las llamadas remotas se acotan a lo que queda:
+el embedding se abandona al vencer el plazo y el LLM se genera en streaming
+con timeout, revisando el plazo en cada fragmento y cerrando la conexión con
+el proveedor (que deja de generar) si se acaba o si el cliente se desconecta.
+
+Las llamadas abandonadas siguen en su hilo hasta que terminan (no se pueden
+interrumpir). Hay como mucho RAG_DEADLINE_MAX_CALLS (32) llamadas en curso por
+proceso, contando las abandonadas: si están todas ocupadas, la siguiente espera
+un lugar dentro de su propio plazo en lugar de encolarse sin límite detrás de
+llamadas colgadas. rag_deadline_abandoned_calls cuenta las que siguen en curso.
+"""
+
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from contextlib import contextmanager
+from typing import Optional
+
+from .metrics import DEADLINE_ABANDONED_CALLS
+
+# Cada cuánto se revisa la cancelación mientras se espera una llamada remota
+POLL_SECONDS = 0.05
+
+_executor: Optional[ThreadPoolExecutor] = None
+# Lugares para llamadas en curso (uno por hilo del executor)
+_call_slots: Optional[threading.BoundedSemaphore] = None
+_executor_lock = threading.Lock()
+
+
+class DeadlineExceeded(Exception):
+    """El presupuesto de la petición se agotó en `stage`"""
+
+    def __init__(self, stage: str):
+        super().__init__(f"Presupuesto de tiempo agotado en la etapa {stage}")
+        self.stage = stage
+
+
+class RequestCancelled(Exception):
+    """La petición se canceló (el cliente se desconectó) durante `stage`"""
+
+    def __init__(self, stage: str):
+        super().__init__(f"Petición cancelada en la etapa {stage}")
+        self.stage = stage
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor, _call_slots
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                max_calls = int(os.getenv("RAG_DEADLINE_MAX_CALLS", "32"))
+                _call_slots = threading.BoundedSemaphore(max_calls)
+                _executor = ThreadPoolExecutor(
+                    max_workers=max_calls, thread_name_prefix="rag-deadline"
+                )
+    return _executor
+
+
+def _release_slot(future: Future):
+    _call_slots.release()
+
+
+def _forget_abandoned(future: Future):
+    DEADLINE_ABANDONED_CALLS.dec()
+
+
+class Deadline:
+    """Instante límite de una petición, cancelable desde otro hilo"""
+
+    def __init__(self, budget_ms: float):
+        self.budget_ms = budget_ms
+        self.expires_at = time.monotonic() + budget_ms / 1000
+        self._cancelled = threading.Event()
+
+    def remaining(self) -> float:
+        """Segundos que quedan (0 si ya venció)"""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def check(self, stage: str):
+        if self._cancelled.is_set():
+            raise RequestCancelled(stage)
+        if self.expired:
+            raise DeadlineExceeded(stage)
+
+    @contextmanager
+    def guard(self, stage: str):
+        """
+        Revisa el presupuesto al entrar y convierte en DeadlineExceeded los
+        errores de la etapa ocurridos con el plazo vencido (ej. timeouts del cliente)
+        """
+        self.check(stage)
+        try:
+            yield
+        except (DeadlineExceeded, RequestCancelled):
+            raise
+        except Exception as e:
+            if self._cancelled.is_set():
+                raise RequestCancelled(stage) from e
+            if self.expired:
+                raise DeadlineExceeded(stage) from e
+            raise
+
+    def run(self, stage: str, fn, *args, **kwargs):
+        """
+        Ejecuta `fn` en otro hilo y espera como mucho hasta el plazo. Si vence
+        o se cancela la petición, la llamada se abandona y su resultado se descarta
+        """
+        self.check(stage)
+        executor = _get_executor()
+        # Un lugar libre antes de enviar: con todos ocupados por llamadas
+        # colgadas la petición agota su plazo aquí y no en la cola del executor
+        while not _call_slots.acquire(timeout=min(self.remaining(), POLL_SECONDS)):
+            self.check(stage)
+        try:
+            # Con el contexto de la petición (id de petición en los logs)
+            future = executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+        except BaseException:
+            _call_slots.release()
+            raise
+        future.add_done_callback(_release_slot)
+        return self.wait(stage, future)
+
+    def wait(self, stage: str, future: Future):
+        """
+        Espera el resultado de `future` como mucho hasta el plazo. Si vence o
+        se cancela la petición, el future se cancela (si aún no empezó) y se abandona
+        """
+        while True:
+            try:
+                return future.result(timeout=min(self.remaining(), POLL_SECONDS))
+            except FutureTimeout:
+                try:
+                    self.check(stage)
+                except (DeadlineExceeded, RequestCancelled):
+                    if not future.cancel() and not future.done():
+                        # Ya corre: ocupa su hilo hasta terminar
+                        DEADLINE_ABANDONED_CALLS.inc()
+                        future.add_done_callback(_forget_abandoned)
+                    raise
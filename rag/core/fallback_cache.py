@@ -0,0 +1,90 @@
+"""
+Dilemas recientes por tópico e intensidad, para responder cuando el LLM no
+alcanza a terminar dentro del presupuesto de la petición (ver deadline.py).
+
+Cada dilema generado con éxito se guarda aquí (los últimos
+RAG_FALLBACK_CACHE_SIZE por tópico e intensidad). Para que un worker recién
+arrancado también tenga respaldo, RAG_FALLBACK_FILE puede apuntar a un JSONL
+de core/bulk_generate.py: sus dilemas con status "ok" se cargan al primer uso.
+"""
+
+import json
+import logging
+import os
+import random
+import threading
+from collections import deque
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Campos del dilema que se guardan (sin datos de sesión, tiempos ni tokens)
+DILEMMA_FIELDS = (
+    "dilemma_text",
+    "philosophical_foundation",
+    "used_sources",
+    "hidden_variable",
+    "topic",
+    "intensity",
+    "sources_metadata",
+)
+
+
+class FallbackCache:
+    """Últimos `size` dilemas de cada (tópico, intensidad)"""
+
+    def __init__(self, size: int = 5):
+        self.size = size
+        self._dilemmas: Dict[Tuple[str, str], deque] = {}
+        self._lock = threading.Lock()
+
+    def remember(self, topic: str, intensity: str, dilemma: Dict):
+        entry = {field: dilemma[field] for field in DILEMMA_FIELDS if field in dilemma}
+        with self._lock:
+            self._dilemmas.setdefault(
+                (topic, intensity), deque(maxlen=self.size)
+            ).append(entry)
+
+    def get(self, topic: str, intensity: str) -> Optional[Dict]:
+        """Uno de los dilemas recientes al azar (para no repetir siempre el mismo)"""
+        with self._lock:
+            dilemmas = self._dilemmas.get((topic, intensity))
+            if not dilemmas:
+                return None
+            return dict(random.choice(dilemmas))
+
+    def load_bulk_file(self, path: str) -> int:
+        """Carga los dilemas "ok" de un JSONL de bulk_generate. Retorna cuántos"""
+        loaded = 0
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if record.get("status") == "ok" and record.get("dilemma"):
+                    self.remember(record["topic"], record["intensity"], record["dilemma"])
+                    loaded += 1
+        return loaded
+
+
+_fallback_cache: Optional[FallbackCache] = None
+_fallback_cache_lock = threading.Lock()
+
+
+def get_fallback_cache() -> FallbackCache:
+    """FallbackCache del proceso (uno por worker)"""
+    global _fallback_cache
+    if _fallback_cache is None:
+        with _fallback_cache_lock:
+            if _fallback_cache is None:
+                cache = FallbackCache(size=int(os.getenv("RAG_FALLBACK_CACHE_SIZE", "5")))
+                path = os.getenv("RAG_FALLBACK_FILE")
+                if path:
+                    try:
+                        loaded = cache.load_bulk_file(path)
+                        logger.info(f"🛟 {loaded} dilemas de respaldo cargados de {path}")
+                    except OSError as e:
+                        logger.warning(f"⚠️  No se pudo leer RAG_FALLBACK_FILE: {e}")
+                _fallback_cache = cache
+    return _fallback_cache
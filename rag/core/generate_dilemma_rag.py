@@ -1,34 +1,42 @@
 import argparse
 import json
-from langchain_community.vectorstores import Chroma
-from langchain.prompts import ChatPromptTemplate
-from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
-from typing import Dict, Optional
-
-from .get_embedding_function import get_embedding_function
-
-# Cargar las variables de entorno
-load_dotenv()
-
-CHROMA_PATH = "chroma"
-
-# Plantilla del prompt especializada para generar dilemas éticos
+import logging
+from typing import Dict, List, Optional
+
+from .chunk_store import search_chunks
+from .config import load_environment
+from .deadline import Deadline
+from .fallback_cache import get_fallback_cache
+from .index_store import get_index_manager
+from .llm_providers import get_chat_model, stream_response
+from .log_config import configure_logging, log_payload
+from .metrics import JSON_PARSE_FALLBACKS, StageTimer, record_token_usage
+from .query_batcher import batching_enabled, get_query_batcher
+from .session_store import get_session_store
+from .source_catalog import require_indexed, resolve_search_filters
+
+logger = logging.getLogger(__name__)
+
+# LangChain, Chroma y el cliente de OpenAI se importan en el primer uso
+# (ver preload_dependencies) para que importar este módulo sea inmediato
+
+# Plantilla del prompt especializada para generar dilemas éticos. Las
+# instrucciones fijas van primero y lo que cambia en cada petición (contexto,
+# historial, tópico e intensidad) al final, para que el proveedor pueda
+# reutilizar el prefijo común de su caché de prompts
 DILEMMA_GENERATION_TEMPLATE = """
 Eres un experto en filosofía ética con profundo conocimiento en las obras de Kant, Levinas, Bauman, Jonas y Butler.
 
-Basándote en el siguiente contexto filosófico:
-{context}
-
-Genera UN DILEMA ÉTICO original que:
+Genera UN DILEMA ÉTICO original a partir del contexto filosófico, el historial del usuario y la solicitud que aparecen al final.
 
 REQUISITOS:
-1. **Tópico**: {topic}
-2. **Intensidad**: {intensity} (Suave = situaciones cotidianas, Medio = decisiones con consecuencias significativas, Extremo = dilemas de vida o muerte)
+1. **Tópico**: El indicado en la solicitud
+2. **Intensidad**: La indicada en la solicitud (Suave = situaciones cotidianas, Medio = decisiones con consecuencias significativas, Extremo = dilemas de vida o muerte)
 3. **Fundamentación**: Debe conectar con las ideas filosóficas del contexto proporcionado
 4. **Estilo**: Pregunta directa que provoque reflexión personal (usar "tú" o "usted")
 5. **Longitud**: Entre 30-80 palabras
 6. **Aplicabilidad**: Situación en la que una persona real podría encontrarse
+7. **Historial**: Usa el historial para personalizar el dilema y no repitas situaciones ya planteadas
 
 EJEMPLOS DE ESTILO:
 - Suave: "¿Apoyaría políticas públicas que invierten en infraestructura o 
@@ -54,12 +62,48 @@ FORMATO DE RESPUESTA (JSON):
     "hidden_variable": "El aspecto ético profundo que explora este dilema"
 }}
 
+CONTEXTO FILOSÓFICO:
+{context}
+
+HISTORIAL DEL USUARIO (resumen de sus dilemas y respuestas anteriores):
+{history}
+
+SOLICITUD:
+- Tópico: {topic}
+- Intensidad: {intensity}
+
 Genera el dilema ahora:
 """
 
 
-def generate_dilemma_with_rag(
+def preload_dependencies():
+    """
+    Importa por adelantado las dependencias pesadas de la generación.
+    El servidor lo llama al arrancar (en segundo plano, o antes del fork en
+    producción) para que la primera petición no pague el coste de importarlas
+    """
+    import langchain.prompts  # noqa: F401
+    import langchain_community.vectorstores  # noqa: F401
+    import langchain_openai  # noqa: F401
+
+
+def build_search_query(
     topic: str, intensity: str, user_context: Optional[str] = None
+) -> str:
+    """Consulta para buscar el contexto filosófico de un tópico e intensidad"""
+    search_query = f"{topic} ética filosofía moral responsabilidad {intensity.lower()}"
+    if user_context:
+        search_query += f" {user_context}"
+    return search_query
+
+
+def generate_dilemma_with_rag(
+    topic: str,
+    intensity: str,
+    user_context: Optional[str] = None,
+    filters: Optional[Dict[str, List[str]]] = None,
+    session_id: Optional[str] = None,
+    deadline: Optional[Deadline] = None,
 ) -> Dict:
     """
     Genera un dilema ético usando RAG para fundamentación filosófica
@@ -68,98 +112,216 @@ def generate_dilemma_with_rag(
         topic: El tópico ético (ej: "Temporalidad Moral", "Alteridad Radical", "Imperativo de Universalización", "Ontología de la Ignorancia", "Economía Moral del Deseo", "Microética Cotidiana")
         intensity: La intensidad ("Suave", "Medio", "Extremo")
         user_context: Contexto opcional sobre respuestas previas del usuario
+        filters: Filtros opcionales de búsqueda {"authors", "works", "sources"};
+            sin filtros se usan las particiones por defecto del tópico
+        session_id: Sesión cuyo historial (ver core/session_store.py) se usa en
+            la búsqueda y en el prompt; el dilema generado se añade a ella.
+            Debe existir en este proceso (ver SessionStore.create)
+        deadline: Presupuesto de tiempo de la petición (ver core/deadline.py);
+            cada etapa se corta al agotarse
 
     Returns:
-        Dict con el dilema generado y su fundamentación
+        Dict con el dilema generado y su fundamentación, más `timings_ms`
+        (duración por etapa) y `token_usage` (tokens de prompt y respuesta)
+
+    Raises:
+        SessionNotFound: si `session_id` no es una sesión de este proceso
+        ValueError: si un filtro no está en el catálogo
+        FiltersNotIndexed: si ningún chunk indexado cumple los filtros
+        DeadlineExceeded: si se agota el presupuesto (ver fallback_dilemma)
+        RequestCancelled: si se cancela la petición (cliente desconectado)
     """
 
-    # Cargamos la base de datos
-    embedding_function = get_embedding_function()
-    db = Chroma(
-        embedding_function=embedding_function,
-        persist_directory=CHROMA_PATH,
-    )
-    print("📚 Base de datos cargada correctamente")
+    from langchain.prompts import ChatPromptTemplate
 
-    # Construir query para buscar contexto filosófico relevante
-    search_query = f"{topic} ética filosofía moral responsabilidad {intensity.lower()}"
-    if user_context:
-        search_query += f" {user_context}"
-
-    # Buscar documentos relevantes
-    results = db.similarity_search_with_score(search_query, k=6)
-    print(f"🔍 Encontrados {len(results)} documentos relevantes")
+    load_environment()
+    timer = StageTimer()
 
-    # Preparar contexto filosófico
-    context_text = "\n\n---\n\n".join(
-        [
-            f"Fuente: {doc.metadata.get('source', 'Desconocida')}\n{doc.page_content}"
-            for doc, _score in results
-        ]
-    )
+    session = get_session_store().require(session_id) if session_id else None
 
-    # Generar el prompt
-    prompt_template = ChatPromptTemplate.from_template(DILEMMA_GENERATION_TEMPLATE)
-    prompt = prompt_template.format(
-        context=context_text,
-        topic=topic,
-        intensity=intensity,
-    )
+    # Construir query para buscar contexto filosófico relevante
+    query_context = user_context
+    if session:
+        query_context = " ".join(
+            filter(None, [user_context, session.retrieval_context()])
+        )
+    search_query = build_search_query(topic, intensity, query_context)
+    search_filters = resolve_search_filters(topic, **(filters or {}))
+
+    # Usamos la versión activa del índice; si se publica otra durante la
+    # búsqueda, esta petición termina con la que tenía
+    with get_index_manager().acquire() as db:
+        logger.debug("📚 Base de datos cargada correctamente")
+
+        # El embedding de la sesión se reutiliza mientras su historial no cambie
+        query_embedding = None
+        if session:
+            query_embedding = session.cached_embedding(search_query)
+
+        if batching_enabled():
+            # Embedding y búsqueda en un lote con las consultas concurrentes
+            # (ver core/query_batcher.py); las etapas se miden dentro del lote
+            future = get_query_batcher().submit(
+                db, search_query, 6, search_filters, embedding=query_embedding
+            )
+            if deadline is None:
+                result = future.result()
+            else:
+                result = deadline.wait("query_batch", future)
+            for stage, seconds in result.timings.items():
+                timer.record(stage, seconds)
+            if session and result.embedded:
+                session.cache_embedding(search_query, result.embedding)
+            chunks, query_hits = result.chunks, result.hits
+        else:
+            # Embedding de la consulta y búsqueda por separado para medir cada etapa
+            with timer.stage("embed_query"):
+                if query_embedding is None:
+                    if deadline is None:
+                        query_embedding = db.embeddings.embed_query(search_query)
+                    else:
+                        query_embedding = deadline.run(
+                            "embed_query", db.embeddings.embed_query, search_query
+                        )
+                    if session:
+                        session.cache_embedding(search_query, query_embedding)
+
+            if deadline is not None:
+                deadline.check("vector_search")
+            with timer.stage("vector_search"):
+                # Solo ids: los textos se leen del almacén compacto de la versión
+                chunks, hits = search_chunks(
+                    db, [query_embedding], k=6, search_filters=search_filters
+                )
+            query_hits = hits[0]
+    if any((filters or {}).values()):
+        # Los filtros por defecto del tópico no fallan: son una preferencia
+        require_indexed(search_filters, [query_hits])
+    # Orden del índice y no por distancia: el mismo conjunto de chunks da
+    # siempre el mismo contexto (y el mismo prefijo del prompt)
+    positions = sorted(position for position, _distance in query_hits)
+    logger.debug("🔍 Encontrados %d documentos relevantes", len(positions))
+
+    with timer.stage("prompt_build"):
+        # Preparar contexto filosófico
+        context_text = chunks.context(positions, with_source=True)
+
+        # Generar el prompt
+        prompt_template = ChatPromptTemplate.from_template(DILEMMA_GENERATION_TEMPLATE)
+        prompt = prompt_template.format(
+            context=context_text,
+            topic=topic,
+            intensity=intensity,
+            history=session.prompt_context() if session else "Sin historial previo",
+        )
 
     # Generar respuesta con OpenAI
-    model = ChatOpenAI(model="gpt-4o-mini", temperature=0.8)
-    response_text = model.predict(prompt)
+    with timer.stage("llm"):
+        if deadline is None:
+            model = get_chat_model(model="gpt-4o-mini", temperature=0.8)
+            response = model.invoke(prompt)
+        else:
+            # Con presupuesto no se reintenta (un reintento no cabría) y se
+            # genera en streaming para cortar en cuanto se agote
+            model = get_chat_model(model="gpt-4o-mini", temperature=0.8, max_retries=0)
+            with deadline.guard("llm"):
+                response = stream_response(
+                    model,
+                    prompt,
+                    lambda _text: deadline.check("llm"),
+                    timeout=deadline.remaining(),
+                )
+    response_text = response.content
 
-    print("🤖 Respuesta generada:")
-    print(response_text)
+    token_usage = record_token_usage(response.usage_metadata)
 
-    # Parsear respuesta JSON
-    try:
-        # Extraer JSON del response si viene con texto adicional
-        start_idx = response_text.find("{")
-        end_idx = response_text.rfind("}") + 1
-        if start_idx != -1 and end_idx != 0:
-            json_str = response_text[start_idx:end_idx]
-            dilemma_data = json.loads(json_str)
-        else:
-            raise ValueError("No se encontró JSON válido en la respuesta")
+    log_payload(logger, "🤖 Respuesta generada:\n%s", response_text)
+
+    sources_metadata = chunks.sources(positions)
 
-        # Agregar metadatos adicionales
-        dilemma_data.update(
-            {
+    # Parsear respuesta JSON
+    with timer.stage("json_parse"):
+        try:
+            # Extraer JSON del response si viene con texto adicional
+            start_idx = response_text.find("{")
+            end_idx = response_text.rfind("}") + 1
+            if start_idx != -1 and end_idx != 0:
+                json_str = response_text[start_idx:end_idx]
+                dilemma_data = json.loads(json_str)
+            else:
+                raise ValueError("No se encontró JSON válido en la respuesta")
+
+            # Agregar metadatos adicionales
+            dilemma_data.update(
+                {
+                    "topic": topic,
+                    "intensity": intensity,
+                    "sources_metadata": sources_metadata,
+                }
+            )
+            # Respaldo para peticiones que agoten su presupuesto
+            get_fallback_cache().remember(topic, intensity, dilemma_data)
+
+        except (json.JSONDecodeError, ValueError) as e:
+            logger.warning(
+                "❌ Error parseando JSON: %s | respuesta cruda: %.500s", e, response_text
+            )
+            JSON_PARSE_FALLBACKS.inc()
+
+            # Fallback: crear estructura básica
+            dilemma_data = {
+                "dilemma_text": response_text.strip(),
+                "philosophical_foundation": "Generado con base en conocimiento filosófico general",
+                "used_sources": sources_metadata,
+                "hidden_variable": f"Aspectos éticos de {topic}",
                 "topic": topic,
                 "intensity": intensity,
-                "sources_metadata": [
-                    doc.metadata.get("source", "Desconocida") for doc, _ in results
-                ],
+                "sources_metadata": sources_metadata,
+                "error": "Formato de respuesta no estándar",
             }
+
+    if session:
+        dilemma_data["session_id"] = session.id
+        dilemma_data["dilemma_id"] = session.add_dilemma(
+            topic,
+            intensity,
+            dilemma_data.get("dilemma_text", ""),
+            dilemma_data.get("hidden_variable", ""),
         )
 
-        return dilemma_data
-
-    except (json.JSONDecodeError, ValueError) as e:
-        print(f"❌ Error parseando JSON: {e}")
-        print(f"Respuesta cruda: {response_text}")
-
-        # Fallback: crear estructura básica
-        return {
-            "dilemma_text": response_text.strip(),
-            "philosophical_foundation": "Generado con base en conocimiento filosófico general",
-            "used_sources": [
-                doc.metadata.get("source", "Desconocida") for doc, _ in results
-            ],
-            "variable_oculta": f"Aspectos éticos de {topic}",
-            "topic": topic,
-            "intensity": intensity,
-            "sources_metadata": [
-                doc.metadata.get("source", "Desconocida") for doc, _ in results
-            ],
-            "error": "Formato de respuesta no estándar",
-        }
+    dilemma_data["timings_ms"] = timer.timings_ms
+    dilemma_data["token_usage"] = token_usage
+    return dilemma_data
+
+
+def fallback_dilemma(
+    topic: str, intensity: str, session_id: Optional[str] = None
+) -> Optional[Dict]:
+    """
+    Un dilema reciente del mismo tópico e intensidad (ver core/fallback_cache.py),
+    marcado con `fallback`, para cuando la generación agota su presupuesto.
+    Se añade a la sesión como cualquier otro dilema (SessionNotFound si no
+    existe). None si no hay ninguno
+    """
+    session = get_session_store().require(session_id) if session_id else None
+    dilemma_data = get_fallback_cache().get(topic, intensity)
+    if dilemma_data is None:
+        return None
+    dilemma_data["fallback"] = True
+    if session:
+        dilemma_data["session_id"] = session.id
+        dilemma_data["dilemma_id"] = session.add_dilemma(
+            topic,
+            intensity,
+            dilemma_data.get("dilemma_text", ""),
+            dilemma_data.get("hidden_variable", ""),
+        )
+    return dilemma_data
 
 
 def main():
     """CLI para probar la generación de dilemas"""
+    configure_logging()
     parser = argparse.ArgumentParser(description="Generar dilemas éticos con RAG")
     parser.add_argument("topic", type=str, help="Tópico ético del dilema")
     parser.add_argument(
@@ -169,6 +331,13 @@ def main():
         help="Intensidad del dilema",
     )
     parser.add_argument("--context", type=str, help="Contexto opcional del usuario")
+    parser.add_argument(
+        "--author", action="append", dest="authors", help="Filtrar por autor"
+    )
+    parser.add_argument("--work", action="append", dest="works", help="Filtrar por obra")
+    parser.add_argument(
+        "--source", action="append", dest="sources", help="Filtrar por archivo PDF"
+    )
 
     args = parser.parse_args()
 
@@ -176,12 +345,15 @@ def main():
     if args.context:
         print(f"📝 Contexto del usuario: {args.context}")
 
-    result = generate_dilemma_with_rag(args.topic, args.intensity, args.context)
+    filters = {"authors": args.authors, "works": args.works, "sources": args.sources}
+    result = generate_dilemma_with_rag(
+        args.topic, args.intensity, args.context, filters=filters
+    )
 
     print("\n" + "=" * 50)
     print("📋 DILEMA GENERADO:")
     print("=" * 50)
-    print(f"Texto: {result['dilema_text']}")
+    print(f"Texto: {result['dilemma_text']}")
     print(f"\n🧠 Fundamentación: {result['philosophical_foundation']}")
     print(f"\n📚 Fuentes: {', '.join(result['used_sources'])}")
     print(f"\n🔍 Variable oculta: {result['hidden_variable']}")
@@ -1,20 +1,46 @@
 # from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_openai import OpenAIEmbeddings
-from dotenv import load_dotenv
 import os
-import openai
+from typing import Optional
 
-load_dotenv()
+from .config import load_environment
 
-openai.api_key = os.environ["OPENAI_API_KEY"]
 
+def embedding_backend() -> str:
+    """Backend de embedding configurado (RAG_EMBEDDING_BACKEND, openai por defecto)"""
+    load_environment()
+    return os.getenv("RAG_EMBEDDING_BACKEND", "openai")
 
-def get_embedding_function():
+
+def get_embedding_function(backend: Optional[str] = None):
     """
-    Funcion para obtener el embedding de HuggingFace
+    Funcion para obtener la funcion de embedding
+
+    backend: "openai" (por defecto) o "hash" (local y determinista, para
+    benchmarks sin red). Si no se indica se usa RAG_EMBEDDING_BACKEND
     """
+    backend = backend or embedding_backend()
+    if backend == "hash":
+        from .local_embeddings import DEFAULT_DIMENSIONS, HashingEmbeddings
+
+        dimensions = int(os.getenv("RAG_EMBEDDING_DIMENSIONS", DEFAULT_DIMENSIONS))
+        return HashingEmbeddings(dimensions)
+    if backend != "openai":
+        raise ValueError(f"Backend de embedding desconocido: {backend}")
+
+    # Import diferido: langchain_openai tarda en cargarse y la clave de
+    # OpenAI se lee del entorno al crear el cliente, no al importar
+    from langchain_openai import OpenAIEmbeddings
+
+    from .openai_clients import get_http_client, http_timeout
+
     embedding = OpenAIEmbeddings(
         model="text-embedding-3-large",
+        # Pool de conexiones compartido con el chat (ver core/openai_clients.py)
+        http_client=get_http_client(),
+        timeout=http_timeout(),
+        # Tokenizar en el cliente requiere descargar el vocabulario de tiktoken;
+        # los servidores mock (scripts/mock_openai.py) se usan sin red
+        check_embedding_ctx_length=os.getenv("RAG_EMBEDDING_TOKENIZE", "1") != "0",
         # model_name = "hkunlp/instructor-xl"
         # model_kwargs = {"device": "cpu"}
         # encode_kwargs = {"normalize_embeddings": True}
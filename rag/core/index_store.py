@@ -0,0 +1,456 @@
+"""
+Versiones del índice vectorial y cambio en caliente sin cortar el servicio.
+
+Cada ingesta construye una versión nueva (`chroma_<timestamp>/`) junto a la
+actual, la valida y la publica escribiendo de forma atómica el archivo
+puntero `chroma.current`. Sin puntero se usa el directorio `chroma/` de siempre.
+
+Cada proceso del servidor usa un IndexManager: detecta el cambio de puntero,
+abre la versión nueva en segundo plano, la usa para las peticiones nuevas y
+deja que las que están en curso terminen con la anterior. Cuando una versión retirada queda sin
+peticiones se cierra, se libera su lease y se eliminan del disco las versiones
+que ningún proceso esté usando.
+
+Una versión también puede ser un snapshot importado (`chroma_<timestamp>/`
+con un único `index.ragsnap`, ver snapshot.py): se abre mapeado en memoria en
+lugar de con Chroma y el resto del ciclo de vida es el mismo. Una versión con
+shards (`shards.json` y un directorio Chroma por shard, ver shards.py) se abre
+como cliente de los procesos que sirven cada shard.
+"""
+
+import logging
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+CHROMA_PATH = "chroma"
+POINTER_SUFFIX = ".current"
+LEASES_SUFFIX = ".leases"
+SNAPSHOT_NAME = "index.ragsnap"
+SHARDS_MANIFEST = "shards.json"
+
+
+def _pointer_path(root: str) -> str:
+    return root + POINTER_SUFFIX
+
+
+def _leases_dir(root: str) -> str:
+    return root + LEASES_SUFFIX
+
+
+def live_index_path(root: str = CHROMA_PATH) -> str:
+    """Directorio de la versión publicada (o `root` si nunca se publicó una)"""
+    try:
+        with open(_pointer_path(root), encoding="utf-8") as f:
+            name = f.read().strip()
+    except FileNotFoundError:
+        return root
+    return os.path.join(os.path.dirname(root), name) if name else root
+
+
+def index_exists(root: str = CHROMA_PATH) -> bool:
+    return os.path.isdir(live_index_path(root))
+
+
+def list_versions(root: str = CHROMA_PATH) -> List[str]:
+    """Directorios de versiones existentes (incluido `root` si existe)"""
+    parent = os.path.dirname(root) or "."
+    prefix = os.path.basename(root) + "_"
+    versions = [
+        os.path.join(os.path.dirname(root), name)
+        for name in sorted(os.listdir(parent))
+        if name.startswith(prefix) and os.path.isdir(os.path.join(parent, name))
+    ]
+    if os.path.isdir(root):
+        versions.insert(0, root)
+    return versions
+
+
+def new_version_path(root: str = CHROMA_PATH) -> str:
+    """Ruta para una versión nueva, junto a la actual"""
+    stamp = time.strftime("%Y%m%dT%H%M%S")
+    path = f"{root}_{stamp}"
+    suffix = 1
+    while os.path.exists(path):
+        suffix += 1
+        path = f"{root}_{stamp}_{suffix}"
+    return path
+
+
+def publish_version(path: str, root: str = CHROMA_PATH):
+    """Apunta `root` a la versión `path` reemplazando el puntero de forma atómica"""
+    if not os.path.isdir(path):
+        raise FileNotFoundError(f"No existe la versión del índice: {path}")
+    pointer = _pointer_path(root)
+    tmp_pointer = f"{pointer}.tmp.{os.getpid()}"
+    with open(tmp_pointer, "w", encoding="utf-8") as f:
+        f.write(os.path.basename(path))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_pointer, pointer)
+
+
+def snapshot_file(path: str) -> Optional[str]:
+    """Archivo de snapshot de una versión importada (None si es una versión Chroma)"""
+    snapshot = os.path.join(path, SNAPSHOT_NAME)
+    return snapshot if os.path.isfile(snapshot) else None
+
+
+def copy_version(path: str, new_path: str):
+    """
+    Copia una versión como punto de partida de otra que se va a modificar.
+    Las versiones snapshot se materializan en Chroma con sus vectores
+    """
+    snapshot = snapshot_file(path)
+    if snapshot is None:
+        shutil.copytree(path, new_path)
+        return
+    from .snapshot import restore_snapshot
+
+    restore_snapshot(snapshot, new_path)
+
+
+def open_store(path: str, embedding_function=None):
+    """
+    Abre una versión del índice como vector store de LangChain, como
+    snapshot.SnapshotStore si es un snapshot importado o como
+    shards.ShardedStore si está repartida en shards
+    """
+    from .get_embedding_function import get_embedding_function
+
+    if os.path.isfile(os.path.join(path, SHARDS_MANIFEST)):
+        from .shards import open_sharded
+
+        return open_sharded(path, embedding_function or get_embedding_function())
+
+    snapshot = snapshot_file(path)
+    if snapshot is not None:
+        from .snapshot import open_snapshot
+
+        return open_snapshot(snapshot, embedding_function or get_embedding_function())
+
+    from langchain_community.vectorstores import Chroma
+
+    return Chroma(
+        persist_directory=path,
+        embedding_function=embedding_function or get_embedding_function(),
+    )
+
+
+# Versión de chromadb (la de uv.lock) con la que se comprobó _forget_chroma_client
+CHROMA_CLOSE_CHECKED_VERSION = "1.0"
+_chroma_close_warned = False
+
+
+def _forget_chroma_client(client):
+    """
+    Saca un cliente Chroma ya detenido de la caché de SharedSystemClient.
+
+    chromadb no tiene API para cerrar un PersistentClient: guarda un System
+    por ruta en el atributo privado `_identifier_to_system` (comprobado con
+    chromadb 1.0.x) y lo reutiliza al abrir la misma ruta, aunque esté
+    detenido. Con otra versión se intenta igual; si el atributo no existe, el
+    System queda en la caché hasta que termine el proceso y se avisa una vez
+    """
+    global _chroma_close_warned
+    import chromadb
+    from chromadb.api.shared_system_client import SharedSystemClient
+
+    systems = getattr(SharedSystemClient, "_identifier_to_system", None)
+    checked = chromadb.__version__.startswith(CHROMA_CLOSE_CHECKED_VERSION + ".")
+    if isinstance(systems, dict):
+        systems.pop(client._identifier, None)
+        if checked or _chroma_close_warned:
+            return
+        message = "se libera con un atributo privado no comprobado en esta versión"
+    else:
+        message = "no se puede sacar de la caché; queda en memoria hasta que termine el proceso"
+    if not _chroma_close_warned:
+        _chroma_close_warned = True
+        logger.warning(
+            f"⚠️  chromadb {chromadb.__version__} (comprobado con "
+            f"{CHROMA_CLOSE_CHECKED_VERSION}.x): el cliente de una versión cerrada {message}"
+        )
+
+
+def close_store(store):
+    """
+    Libera el cliente Chroma (o el mapa del snapshot, o las conexiones a los
+    shards) de una versión que ya no se usa
+    """
+    if hasattr(store, "snapshot") or hasattr(store, "shards"):
+        store.close()
+        return
+    try:
+        client = store._client
+        client._system.stop()
+        _forget_chroma_client(client)
+    except Exception as e:
+        logger.warning(f"⚠️  No se pudo cerrar el índice: {e}")
+
+
+def validate_index(path: str, embedding_function=None) -> int:
+    """
+    Comprueba que una versión tenga documentos y responda a una búsqueda.
+    Retorna el número de documentos o lanza ValueError. En una versión con
+    shards se valida cada shard
+    """
+    if os.path.isfile(os.path.join(path, SHARDS_MANIFEST)):
+        from .shards import version_stores
+
+        return sum(
+            validate_index(shard, embedding_function) for shard in version_stores(path)
+        )
+
+    store = open_store(path, embedding_function)
+    try:
+        count = len(store) if hasattr(store, "snapshot") else store._collection.count()
+        if count == 0:
+            raise ValueError(f"El índice {path} está vacío")
+        if not store.similarity_search("ética responsabilidad", k=1):
+            raise ValueError(f"El índice {path} no devolvió resultados")
+        return count
+    finally:
+        close_store(store)
+
+
+def _lease_file(root: str, path: str, pid: int) -> str:
+    return os.path.join(_leases_dir(root), f"{os.path.basename(path)}.{pid}")
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _leased_versions(root: str) -> set:
+    """Versiones con al menos un proceso vivo usándolas"""
+    leased = set()
+    leases_dir = _leases_dir(root)
+    if not os.path.isdir(leases_dir):
+        return leased
+    for name in os.listdir(leases_dir):
+        version, _, pid = name.rpartition(".")
+        if pid.isdigit() and _pid_alive(int(pid)):
+            leased.add(version)
+        else:
+            # Lease de un proceso que terminó sin liberarlo
+            try:
+                os.remove(os.path.join(leases_dir, name))
+            except OSError:
+                pass
+    return leased
+
+
+def collect_garbage(root: str = CHROMA_PATH) -> List[str]:
+    """
+    Elimina las versiones anteriores a la publicada que ningún proceso está
+    usando. Las versiones más nuevas (construidas y aún sin publicar) se conservan
+    """
+    live = os.path.basename(live_index_path(root))
+    leased = _leased_versions(root)
+    removed = []
+    for path in list_versions(root):
+        name = os.path.basename(path)
+        if name == live:
+            break
+        if name in leased:
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        removed.append(path)
+        logger.info(f"🗑️  Versión del índice eliminada: {path}")
+    return removed
+
+
+class _LoadedVersion:
+    def __init__(self, path: str, store):
+        self.path = path
+        self.store = store
+        self.in_flight = 0
+        self.retired = False
+
+
+class IndexManager:
+    """
+    Versión activa del índice en este proceso, con cambio en caliente.
+    El puntero se revisa como mucho cada `check_interval` segundos
+    """
+
+    def __init__(
+        self,
+        root: str = CHROMA_PATH,
+        check_interval: float = 1.0,
+        shard: Optional[int] = None,
+    ):
+        self.root = root
+        self.check_interval = check_interval
+        # En un proceso de shard (ver shard_server.py) solo se abre ese shard
+        # de cada versión publicada
+        self.shard = shard
+        self._current: Optional[_LoadedVersion] = None
+        self._retired: List[_LoadedVersion] = []
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._last_check = 0.0
+
+    @contextmanager
+    def acquire(self):
+        """
+        Vector store de la versión activa durante el bloque `with`.
+        Si se publica otra versión mientras tanto, esta petición termina con
+        la que tenía y la versión vieja se libera al quedar sin peticiones
+        """
+        with self.acquire_version() as (_path, store):
+            yield store
+
+    @contextmanager
+    def acquire_version(self):
+        """Como acquire, pero da (ruta de la versión, vector store)"""
+        self._maybe_reload()
+        with self._lock:
+            version = self._current
+            version.in_flight += 1
+        try:
+            yield version.path, version.store
+        finally:
+            with self._lock:
+                version.in_flight -= 1
+                drained = version.retired and version.in_flight == 0
+            if drained:
+                self._release(version)
+
+    def reload(self) -> str:
+        """Revisa el puntero ahora mismo y cambia de versión si hace falta"""
+        self._maybe_reload(force=True)
+        return self._current.path
+
+    def status(self) -> dict:
+        with self._lock:
+            current = self._current
+            return {
+                "live": current.path if current else None,
+                "in_flight": current.in_flight if current else 0,
+                "draining": [
+                    {"path": v.path, "in_flight": v.in_flight} for v in self._retired
+                ],
+            }
+
+    def _maybe_reload(self, force: bool = False):
+        now = time.monotonic()
+        if (
+            not force
+            and self._current is not None
+            and now - self._last_check < self.check_interval
+        ):
+            return
+        if force or self._current is None:
+            # Sin versión cargada (o pedido desde /admin): esperar al cambio
+            self._reload_lock.acquire()
+            self._reload(now)
+            return
+
+        # Con una versión activa, la nueva se abre en segundo plano y las
+        # peticiones siguen con la actual hasta que esté lista. Si otro hilo
+        # ya está cambiando de versión, no hay nada que hacer
+        self._last_check = now
+        if live_index_path(self.root) == self._current.path:
+            return
+        if not self._reload_lock.acquire(blocking=False):
+            return
+        threading.Thread(
+            target=self._reload_in_background,
+            args=(now,),
+            name="rag-index-reload",
+            daemon=True,
+        ).start()
+
+    def _reload_in_background(self, now: float):
+        try:
+            self._reload(now)
+        except Exception as e:
+            logger.error(f"❌ No se pudo abrir la versión publicada: {e}")
+
+    def _reload(self, now: float):
+        """Cambia a la versión publicada. Se llama con _reload_lock tomado y lo libera"""
+        try:
+            self._last_check = now
+            path = live_index_path(self.root)
+            if self._current is not None and self._current.path == path:
+                return
+            if not os.path.isdir(path):
+                raise FileNotFoundError(f"Base de datos no encontrada: {path}")
+
+            # Abrir fuera de self._lock: las peticiones siguen con la versión actual
+            from .chunk_store import get_chunk_store
+
+            store_path = path
+            if self.shard is not None:
+                from .shards import shard_count, shard_path
+
+                if self.shard >= shard_count(path):
+                    raise FileNotFoundError(f"La versión {path} no tiene el shard {self.shard}")
+                store_path = shard_path(path, self.shard)
+            version = _LoadedVersion(path, open_store(store_path))
+            # Cargar los textos antes de publicarla para que la primera
+            # petición no lo pague
+            get_chunk_store(version.store)
+            self._write_lease(path)
+            with self._lock:
+                old = self._current
+                self._current = version
+                if old is not None:
+                    old.retired = True
+                    self._retired.append(old)
+                    drained = old.in_flight == 0
+            logger.info(f"🔄 Índice activo: {path}")
+            if old is not None and drained:
+                self._release(old)
+        finally:
+            self._reload_lock.release()
+
+    def _release(self, version: _LoadedVersion):
+        with self._lock:
+            if version not in self._retired:
+                return
+            self._retired.remove(version)
+        close_store(version.store)
+        try:
+            os.remove(_lease_file(self.root, version.path, os.getpid()))
+        except OSError:
+            pass
+        logger.info(f"✅ Versión drenada: {version.path}")
+        # Borrar del disco fuera del camino de la petición
+        threading.Thread(
+            target=collect_garbage, args=(self.root,), name="rag-index-gc", daemon=True
+        ).start()
+
+    def _write_lease(self, path: str):
+        os.makedirs(_leases_dir(self.root), exist_ok=True)
+        with open(_lease_file(self.root, path, os.getpid()), "w"):
+            pass
+
+
+_index_manager: Optional[IndexManager] = None
+_index_manager_lock = threading.Lock()
+
+
+def get_index_manager() -> IndexManager:
+    """IndexManager del proceso (uno por worker)"""
+    global _index_manager
+    if _index_manager is None:
+        with _index_manager_lock:
+            if _index_manager is None:
+                _index_manager = IndexManager(
+                    check_interval=float(os.getenv("RAG_INDEX_CHECK_INTERVAL", "1.0"))
+                )
+    return _index_manager
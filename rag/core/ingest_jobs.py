@@ -0,0 +1,413 @@
+"""
+Trabajos de ingesta en segundo plano: PDFs subidos por la API (POST /ingest).
+
+Cada trabajo vive en `ingest_jobs/<id>/` con el PDF subido, su `status.json`
+y el log del proceso. La API crea el trabajo y lanza un proceso aparte
+(`python -m core.ingest_jobs <id>`) con prioridad baja y, opcionalmente,
+limitado a ciertos núcleos, para no competir por CPU con el servicio.
+
+El proceso espera su turno (un solo trabajo a la vez por índice, también
+frente a core/create_database.py, ver ingest_lock), copia el
+PDF a `data/`, registra su autor y obra en el catálogo, extrae las páginas y
+embebe los chunks sobre una versión nueva del índice copiada de la activa,
+actualiza las particiones, la valida y la publica (ver index_store). El
+progreso (páginas leídas, chunks embebidos) queda en `status.json`, que
+cualquier worker de la API puede leer.
+
+Variables de entorno:
+    RAG_INGEST_DIR     directorio de los trabajos (ingest_jobs)
+    RAG_INGEST_NICE    incremento de nice del proceso de ingesta (10)
+    RAG_INGEST_CPUS    núcleos permitidos, ej. "0" o "0-1,3" (por defecto todos)
+    RAG_INGEST_BATCH   chunks por llamada de embeddings (64)
+"""
+
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+import traceback
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+from .index_store import (
+    CHROMA_PATH,
+    close_store,
+    collect_garbage,
+    copy_version,
+    live_index_path,
+    new_version_path,
+    open_store,
+    publish_version,
+    validate_index,
+)
+from .shards import split_by_store, version_stores
+from .source_catalog import CATALOG_PATH, DATA_PATH
+
+logger = logging.getLogger(__name__)
+
+RAG_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+UPLOAD_NAME = "upload.pdf"
+STATUS_NAME = "status.json"
+LOG_NAME = "worker.log"
+PID_NAME = "worker.pid"
+LOCK_PATH = f"{CHROMA_PATH}.ingest.lock"
+ACTIVE_STATUSES = ("queued", "running")
+JOB_ID_CHARS = 12
+
+
+def jobs_dir() -> str:
+    return os.getenv("RAG_INGEST_DIR", "ingest_jobs")
+
+
+def _job_path(job_id: str, name: str = "") -> str:
+    if not job_id.isalnum() or len(job_id) != JOB_ID_CHARS:
+        raise KeyError(job_id)
+    return os.path.join(jobs_dir(), job_id, name)
+
+
+def validate_filename(filename: str) -> str:
+    """Nombre de archivo seguro para `data/`; lanza ValueError si no lo es"""
+    name = os.path.basename(filename or "").strip()
+    if not name.lower().endswith(".pdf") or name != filename.strip():
+        raise ValueError("El nombre del archivo debe terminar en .pdf y no incluir rutas")
+    if name.startswith("."):
+        raise ValueError("Nombre de archivo inválido")
+    if os.path.exists(os.path.join(DATA_PATH, name)):
+        raise FileExistsError(f"Ya existe una fuente llamada {name}")
+    for job in list_jobs():
+        if job["filename"] == name and job["status"] in ACTIVE_STATUSES:
+            raise FileExistsError(f"{name} ya se está ingiriendo (trabajo {job['job_id']})")
+    return name
+
+
+def write_status(job_id: str, **fields) -> Dict:
+    """Actualiza status.json de forma atómica y retorna el estado completo"""
+    path = _job_path(job_id, STATUS_NAME)
+    try:
+        with open(path, encoding="utf-8") as f:
+            job = json.load(f)
+    except FileNotFoundError:
+        job = {}
+    job.update(fields, job_id=job_id, updated_at=time.time())
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(job, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    return job
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def read_status(job_id: str) -> Optional[Dict]:
+    """Estado de un trabajo, o None si no existe"""
+    try:
+        with open(_job_path(job_id, STATUS_NAME), encoding="utf-8") as f:
+            job = json.load(f)
+    except (KeyError, FileNotFoundError, json.JSONDecodeError):
+        return None
+    try:
+        with open(_job_path(job_id, PID_NAME), encoding="utf-8") as f:
+            pid = int(f.read())
+    except (FileNotFoundError, ValueError):
+        pid = None
+    job["pid"] = pid
+    if job["status"] in ACTIVE_STATUSES and pid and not _pid_alive(pid):
+        job["status"] = "failed"
+        job["error"] = job.get("error") or "El proceso de ingesta terminó inesperadamente"
+    return job
+
+
+def list_jobs() -> List[Dict]:
+    """Trabajos conocidos, del más reciente al más antiguo"""
+    if not os.path.isdir(jobs_dir()):
+        return []
+    jobs = [read_status(job_id) for job_id in os.listdir(jobs_dir())]
+    return sorted(
+        (job for job in jobs if job), key=lambda job: job["created_at"], reverse=True
+    )
+
+
+def create_job(
+    filename: str,
+    author: Optional[str] = None,
+    work: Optional[str] = None,
+    partition: Optional[str] = None,
+) -> Dict:
+    """
+    Crea el directorio del trabajo; el PDF se escribe en `upload_path(job_id)`
+    antes de `start_job`
+    """
+    job_id = uuid.uuid4().hex[:JOB_ID_CHARS]
+    os.makedirs(_job_path(job_id))
+    return write_status(
+        job_id,
+        status="queued",
+        stage="uploading",
+        filename=filename,
+        author=author,
+        work=work,
+        partition=partition,
+        pages_total=0,
+        pages_parsed=0,
+        chunks_total=0,
+        chunks_embedded=0,
+        version=None,
+        error=None,
+        created_at=time.time(),
+    )
+
+
+def upload_path(job_id: str) -> str:
+    return _job_path(job_id, UPLOAD_NAME)
+
+
+def discard_job(job_id: str):
+    """Elimina un trabajo que no llegó a lanzarse (ej. subida inválida)"""
+    shutil.rmtree(_job_path(job_id), ignore_errors=True)
+
+
+def start_job(job_id: str) -> Dict:
+    """Lanza el proceso de ingesta del trabajo y retorna su estado"""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [RAG_DIR, env.get("PYTHONPATH")]))
+    with open(_job_path(job_id, LOG_NAME), "ab") as log_file:
+        process = subprocess.Popen(
+            [sys.executable, "-m", "core.ingest_jobs", job_id],
+            env=env,
+            stdin=subprocess.DEVNULL,
+            stdout=log_file,
+            stderr=subprocess.STDOUT,
+            start_new_session=True,
+        )
+    # status.json solo lo escribe el proceso de ingesta; el pid va aparte
+    with open(_job_path(job_id, PID_NAME), "w", encoding="utf-8") as f:
+        f.write(str(process.pid))
+    # Recoger el proceso al terminar (sin dejar zombis en el worker)
+    threading.Thread(target=process.wait, name="rag-ingest-wait", daemon=True).start()
+    logger.info(f"📥 Trabajo de ingesta {job_id} lanzado (pid {process.pid})")
+    return read_status(job_id)
+
+
+def _parse_cpus(value: str) -> set:
+    cpus = set()
+    for part in value.split(","):
+        if "-" in part:
+            first, last = part.split("-")
+            cpus.update(range(int(first), int(last) + 1))
+        elif part.strip():
+            cpus.add(int(part))
+    return cpus
+
+
+def limit_cpu():
+    """Baja la prioridad del proceso y lo fija a RAG_INGEST_CPUS si se indicó"""
+    os.nice(int(os.getenv("RAG_INGEST_NICE", "10")))
+    cpus = os.getenv("RAG_INGEST_CPUS")
+    if cpus and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, _parse_cpus(cpus))
+
+
+class IngestInProgress(RuntimeError):
+    """Otro proceso está construyendo o publicando una versión del índice"""
+
+
+@contextmanager
+def ingest_lock(on_wait: Optional[Callable[[], None]] = None, wait: bool = True):
+    """
+    Un solo proceso a la vez construye y publica versiones del índice
+    (trabajos de ingesta, core/create_database.py, la importación de
+    snapshots y /admin/index/activate). `on_wait` se llama si hay que
+    esperar; con `wait=False` se lanza IngestInProgress en lugar de esperar
+    """
+    import fcntl
+
+    with open(LOCK_PATH, "w") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            if not wait:
+                raise IngestInProgress("Hay una ingesta o publicación del índice en curso")
+            if on_wait is not None:
+                on_wait()
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _update_catalog(name: str, entry: Dict[str, str]) -> Optional[Dict]:
+    """Añade la fuente al catálogo; retorna la entrada anterior para deshacerlo"""
+    try:
+        with open(CATALOG_PATH, encoding="utf-8") as f:
+            catalog = json.load(f)
+    except FileNotFoundError:
+        catalog = {"sources": {}}
+    previous = catalog["sources"].get(name)
+    if entry:
+        catalog["sources"][name] = entry
+    elif previous is None:
+        return None
+    else:
+        del catalog["sources"][name]
+    tmp_path = f"{CATALOG_PATH}.tmp.{os.getpid()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(catalog, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+    os.replace(tmp_path, CATALOG_PATH)
+    return previous
+
+
+def load_pages(job_id: str, pdf_path: str):
+    """Páginas del PDF, informando el progreso página a página"""
+    from langchain_community.document_loaders import PyPDFLoader
+    from pypdf import PdfReader
+
+    write_status(job_id, stage="parsing", pages_total=len(PdfReader(pdf_path).pages))
+    pages = []
+    for page in PyPDFLoader(pdf_path).lazy_load():
+        pages.append(page)
+        write_status(job_id, pages_parsed=len(pages))
+    return pages
+
+
+def embed_chunks(job_id: str, chunks, version_path: str, batch_size: int):
+    """
+    Añade los chunks a la versión nueva por lotes, informando el progreso.
+    En una versión con shards cada chunk va a su shard (ver shards.py)
+    """
+    embedded = 0
+    write_status(job_id, stage="embedding", chunks_embedded=embedded)
+    for store_path, store_chunks in split_by_store(chunks, version_path).items():
+        if not store_chunks:
+            continue
+        store = open_store(store_path)
+        try:
+            ids = [chunk.metadata["id"] for chunk in store_chunks]
+            existing = set(store.get(ids=ids, include=[])["ids"])
+            pending = [c for c in store_chunks if c.metadata["id"] not in existing]
+            embedded += len(store_chunks) - len(pending)
+            write_status(job_id, chunks_embedded=embedded)
+            for start in range(0, len(pending), batch_size):
+                batch = pending[start : start + batch_size]
+                store.add_documents(batch, ids=[chunk.metadata["id"] for chunk in batch])
+                embedded += len(batch)
+                write_status(job_id, chunks_embedded=embedded)
+        finally:
+            # Cerrar antes de que sync_partitions abra la misma ruta
+            close_store(store)
+
+
+def run_job(job_id: str):
+    """Ejecuta un trabajo de ingesta completo (en el proceso de ingesta)"""
+    from .create_database import calculate_chunk_ids, split_documents
+    from .partitions import sync_partitions
+    from .source_catalog import tag_chunks
+
+    job = write_status(job_id, stage="waiting")
+    limit_cpu()
+    name = job["filename"]
+    data_path = os.path.join(DATA_PATH, name)
+    entry = {
+        field: job[field]
+        for field in ("author", "work", "partition")
+        if job.get(field)
+    }
+    version_path = None
+    copied = cataloged = False
+    previous_entry = None
+
+    with ingest_lock():
+        write_status(job_id, status="running", stage="starting")
+        try:
+            if os.path.exists(data_path):
+                raise FileExistsError(f"Ya existe una fuente llamada {name}")
+            shutil.copyfile(upload_path(job_id), data_path)
+            copied = True
+
+            pages = load_pages(job_id, data_path)
+            chunks = split_documents(pages)
+            if not chunks:
+                raise ValueError("El PDF no tiene texto extraíble")
+            write_status(job_id, chunks_total=len(chunks))
+
+            # Catalogar antes de etiquetar los chunks
+            if entry:
+                previous_entry = _update_catalog(name, entry)
+                cataloged = True
+            chunks = tag_chunks(calculate_chunk_ids(chunks))
+
+            live_path = live_index_path(CHROMA_PATH)
+            version_path = new_version_path(CHROMA_PATH)
+            write_status(job_id, stage="copying")
+            if os.path.isdir(live_path):
+                copy_version(live_path, version_path)
+            embed_chunks(
+                job_id,
+                chunks,
+                version_path,
+                int(os.getenv("RAG_INGEST_BATCH", "64")),
+            )
+
+            write_status(job_id, stage="partitions")
+            for store_path in version_stores(version_path):
+                sync_partitions(store_path)
+            write_status(job_id, stage="validating")
+            validate_index(version_path)
+
+            publish_version(version_path, CHROMA_PATH)
+            write_status(
+                job_id,
+                status="done",
+                stage="published",
+                version=os.path.basename(version_path),
+            )
+            print(f"🚀 Versión publicada: {version_path}")
+        except Exception as e:
+            print(f"❌ Ingesta fallida: {e}")
+            write_status(job_id, status="failed", error=str(e))
+            if version_path:
+                shutil.rmtree(version_path, ignore_errors=True)
+            if cataloged:
+                _update_catalog(name, previous_entry)
+            if copied:
+                os.remove(data_path)
+            raise
+        finally:
+            try:
+                os.remove(upload_path(job_id))
+            except OSError:
+                pass
+
+    for path in collect_garbage(CHROMA_PATH):
+        print(f"🗑️  Versión antigua eliminada: {path}")
+
+
+def main():
+    if len(sys.argv) != 2:
+        raise SystemExit("Uso: python -m core.ingest_jobs <job_id>")
+    from .config import load_environment
+
+    load_environment()
+    try:
+        run_job(sys.argv[1])
+    except Exception:
+        traceback.print_exc()
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Proveedores de LLM intercambiables por configuración (RAG_LLM_PROVIDER).
+
+- openai: API de OpenAI (por defecto), sobre el pool HTTP compartido
+- local: servidor local compatible con la API de OpenAI, como el de llama.cpp
+  con un modelo cuantizado en CPU (`llama-server -m modelo-q4_k_m.gguf
+  --port 8080`), para servir cerca de los usuarios o durante una caída de OpenAI
+- mock: modelo simulado y determinista con latencia configurable, para
+  pruebas y benchmarks sin red (ver core/mock_llm.py)
+
+Todos son modelos de chat de LangChain: admiten `invoke` y `stream` y
+reportan el uso de tokens en `usage_metadata` con el mismo formato (ver
+metrics.record_token_usage), también al hacer streaming.
+
+Variables de entorno:
+    RAG_LLM_PROVIDER        openai, local o mock (openai)
+    RAG_LOCAL_LLM_URL       URL base del servidor local (http://127.0.0.1:8080/v1)
+    RAG_LOCAL_LLM_MODEL     modelo del servidor local (local)
+    RAG_LOCAL_LLM_API_KEY   clave del servidor local, si la pide (local)
+    RAG_MOCK_LLM_LATENCY    latencia del mock en ms, ej. fixed:200 o lognormal:800:0.4
+                            (fixed:0)
+    RAG_MOCK_LLM_SEED       semilla de la latencia del mock (0)
+"""
+
+import os
+import threading
+from contextlib import closing
+from typing import Callable, Optional
+
+from .get_embedding_function import embedding_backend
+from .openai_clients import get_openai_chat_model
+
+LLM_PROVIDERS = ("openai", "local", "mock")
+
+_mock_models = {}
+_mock_models_lock = threading.Lock()
+
+
+def llm_provider() -> str:
+    return os.getenv("RAG_LLM_PROVIDER", "openai")
+
+
+def openai_key_required() -> bool:
+    """
+    Si la configuración usa la API de OpenAI (chat o embeddings) y por tanto
+    necesita OPENAI_API_KEY; con local/mock y embeddings hash no hace falta
+    """
+    return llm_provider() == "openai" or embedding_backend() == "openai"
+
+
+def get_chat_model(
+    model: Optional[str] = None,
+    temperature: Optional[float] = None,
+    provider: Optional[str] = None,
+    max_retries: Optional[int] = None,
+):
+    """
+    Modelo de chat del proveedor configurado. `model` es el modelo de OpenAI;
+    los demás proveedores usan el suyo
+    """
+    provider = provider or llm_provider()
+    if provider == "openai":
+        return get_openai_chat_model(model, temperature, max_retries=max_retries)
+    if provider == "local":
+        return get_openai_chat_model(
+            os.getenv("RAG_LOCAL_LLM_MODEL", "local"),
+            temperature,
+            base_url=os.getenv("RAG_LOCAL_LLM_URL", "http://127.0.0.1:8080/v1"),
+            api_key=os.getenv("RAG_LOCAL_LLM_API_KEY", "local"),
+            max_retries=max_retries,
+        )
+    if provider == "mock":
+        key = (
+            os.getenv("RAG_MOCK_LLM_LATENCY", "fixed:0"),
+            int(os.getenv("RAG_MOCK_LLM_SEED", "0")),
+        )
+        with _mock_models_lock:
+            if key not in _mock_models:
+                from .mock_llm import MockChatModel
+
+                _mock_models[key] = MockChatModel(latency=key[0], seed=key[1])
+            return _mock_models[key]
+    raise ValueError(
+        f"Proveedor de LLM desconocido: {provider} (usa {', '.join(LLM_PROVIDERS)})"
+    )
+
+
+def stream_response(model, prompt, on_token: Callable[[str], None], **kwargs):
+    """
+    Genera con streaming llamando a `on_token` con cada fragmento de texto.
+    Retorna el mensaje completo, con `usage_metadata` como `invoke`.
+
+    Si `on_token` lanza una excepción, el stream se cierra y con él la
+    conexión con el proveedor, que deja de generar. `kwargs` se pasan a
+    `stream` (ej. `timeout` por llamada)
+    """
+    response = None
+    with closing(model.stream(prompt, **kwargs)) as stream:
+        for chunk in stream:
+            if chunk.content:
+                on_token(chunk.content)
+            response = chunk if response is None else response + chunk
+    return response
@@ -0,0 +1,66 @@
+"""
+Embeddings locales deterministas (feature hashing) para pruebas y benchmarks.
+
+No requieren red ni modelo: cada palabra y cada par de palabras consecutivas
+se proyecta a una dimensión del vector mediante un hash. Textos que comparten
+vocabulario quedan cerca, lo que basta para medir latencia y para comparar
+configuraciones de recuperación de forma reproducible.
+"""
+
+import hashlib
+import re
+from typing import List, Sequence, Union
+
+import numpy as np
+
+DEFAULT_DIMENSIONS = 384
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _features(tokens: Sequence[str]) -> List[str]:
+    features = list(tokens)
+    features.extend(f"{a} {b}" for a, b in zip(tokens, tokens[1:]))
+    return features
+
+
+def hash_embedding(
+    text: Union[str, Sequence[int]], dimensions: int = DEFAULT_DIMENSIONS
+) -> np.ndarray:
+    """
+    Vector float32 normalizado (L2) de `dimensions` componentes.
+    Acepta texto o una lista de ids de token (como los envía OpenAIEmbeddings)
+    """
+    if isinstance(text, str):
+        tokens = _TOKEN_RE.findall(text.lower())
+    else:
+        tokens = [str(token) for token in text]
+
+    vector = np.zeros(dimensions, dtype=np.float32)
+    for feature in _features(tokens):
+        digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+        value = int.from_bytes(digest, "little")
+        sign = 1.0 if value & 1 else -1.0
+        vector[(value >> 1) % dimensions] += sign
+
+    norm = np.linalg.norm(vector)
+    if norm > 0:
+        vector /= norm
+    return vector
+
+
+class HashingEmbeddings:
+    """
+    Función de embedding compatible con la interfaz de LangChain
+    (embed_documents / embed_query) basada en hash_embedding
+    """
+
+    def __init__(self, dimensions: int = DEFAULT_DIMENSIONS):
+        self.dimensions = dimensions
+        self.model = f"local-hash-{dimensions}"
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [hash_embedding(text, self.dimensions).tolist() for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return hash_embedding(text, self.dimensions).tolist()
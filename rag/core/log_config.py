@@ -0,0 +1,243 @@
+"""
+Logging estructurado que no bloquea el camino de las peticiones.
+
+- Los registros se encolan en una cola acotada y un hilo aparte los formatea
+  y escribe; si la cola se llena se descartan y se cuentan
+  (rag_log_records_dropped_total) en lugar de frenar la petición
+- Cada registro lleva el id de la petición (`request_id`), que el API toma de
+  la cabecera X-Request-ID o genera (ver api/server.py)
+- Los contenidos voluminosos (respuesta del LLM, contexto del usuario) se
+  registran en DEBUG y solo para una fracción de las peticiones (log_payload)
+- Nivel global y por módulo configurables
+- El trabajo agrupado de varias peticiones (ver query_batcher.py) se registra
+  con los ids de las peticiones del lote (use_request_id)
+
+Variables de entorno:
+    RAG_LOG_LEVEL         nivel por defecto (el de `--log-level` de uvicorn o
+                          gunicorn si el servidor ya lo configuró; si no, INFO)
+    RAG_LOG_LEVELS        niveles por módulo, ej.
+                          "core.generate_dilemma_rag=DEBUG,core.index_store=WARNING"
+    RAG_LOG_FORMAT        text o json (text)
+    RAG_LOG_SAMPLE_RATE   fracción de peticiones con contenidos registrados (0.01)
+    RAG_LOG_QUEUE_SIZE    registros en cola antes de descartar (10000)
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+from .metrics import LOG_RECORDS_DROPPED
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"
+REQUEST_ID_CHARS = 64
+_REQUEST_ID_RE = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+_request_id = contextvars.ContextVar("rag_request_id", default="-")
+_payload_sampled = contextvars.ContextVar("rag_payload_sampled", default=None)
+
+# Atributos propios de LogRecord; los demás vienen de `extra` y van al JSON
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {
+    "message",
+    "asctime",
+    "request_id",
+}
+
+_handler: Optional["NonBlockingQueueHandler"] = None
+_listener: Optional[QueueListener] = None
+_output: Optional[logging.Handler] = None
+_queue_size = 10000
+_sample_rate = 0.01
+_lock = threading.Lock()
+
+
+class RequestIdFilter(logging.Filter):
+    """Añade el id de la petición en curso (se evalúa en el hilo que registra)"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = _request_id.get()
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler que descarta (y cuenta) en lugar de esperar si la cola está llena"""
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+
+class JsonFormatter(logging.Formatter):
+    """Un objeto JSON por línea, con los campos de `extra` incluidos"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created))
+            + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class DrainingQueueListener(QueueListener):
+    """QueueListener que al detenerse espera a que haya lugar en la cola llena"""
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+
+def parse_levels(spec: Optional[str]) -> Dict[str, str]:
+    """"modulo=NIVEL,otro=NIVEL" -> {"modulo": "NIVEL", ...}"""
+    levels = {}
+    for item in (spec or "").split(","):
+        name, _, level = item.strip().partition("=")
+        if name and level:
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def _server_level() -> Optional[int]:
+    """
+    Nivel que fijó el servidor antes de importar la app: uvicorn configura
+    "uvicorn.error" (--log-level, INFO por defecto) y gunicorn "gunicorn.error"
+    """
+    for name in ("uvicorn.error", "gunicorn.error"):
+        level = logging.getLogger(name).level
+        if level != logging.NOTSET:
+            return level
+    return None
+
+
+def _start_listener():
+    global _listener
+    _handler.queue = queue.Queue(maxsize=_queue_size)
+    _listener = DrainingQueueListener(_handler.queue, _output)
+    _listener.start()
+
+
+def configure_logging(
+    level: Optional[str] = None,
+    levels: Optional[Dict[str, str]] = None,
+    fmt: Optional[str] = None,
+    stream=None,
+    queue_size: Optional[int] = None,
+    sample_rate: Optional[float] = None,
+):
+    """
+    Configura el logger raíz con la cola y el hilo escritor. Los argumentos
+    tienen prioridad sobre las variables de entorno, y estas sobre el nivel
+    que ya fijó el servidor (ver _server_level); se puede llamar de nuevo
+    para cambiar la configuración
+    """
+    global _handler, _output, _queue_size, _sample_rate
+    with _lock:
+        shutdown_logging()
+        _queue_size = queue_size or int(os.getenv("RAG_LOG_QUEUE_SIZE", "10000"))
+        _sample_rate = (
+            sample_rate
+            if sample_rate is not None
+            else float(os.getenv("RAG_LOG_SAMPLE_RATE", "0.01"))
+        )
+
+        _output = logging.StreamHandler(stream or sys.stderr)
+        if (fmt or os.getenv("RAG_LOG_FORMAT", "text")) == "json":
+            _output.setFormatter(JsonFormatter())
+        else:
+            _output.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+        root = logging.getLogger()
+        if _handler is not None:
+            root.removeHandler(_handler)
+        _handler = NonBlockingQueueHandler(queue.Queue(maxsize=_queue_size))
+        _handler.addFilter(RequestIdFilter())
+        root.addHandler(_handler)
+        level = level or os.getenv("RAG_LOG_LEVEL")
+        root.setLevel(level.upper() if level else _server_level() or logging.INFO)
+        for name, module_level in {
+            **parse_levels(os.getenv("RAG_LOG_LEVELS")),
+            **(levels or {}),
+        }.items():
+            logging.getLogger(name).setLevel(module_level)
+        _start_listener()
+
+
+def shutdown_logging():
+    """Escribe lo que queda en la cola y detiene el hilo escritor"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def _restart_after_fork():
+    # El hilo escritor no sobrevive al fork (workers de gunicorn con preload_app)
+    global _listener
+    if _listener is not None:
+        _listener = None
+        _start_listener()
+
+
+atexit.register(shutdown_logging)
+os.register_at_fork(after_in_child=_restart_after_fork)
+
+
+def start_request(request_id: Optional[str] = None) -> str:
+    """
+    Asocia al contexto actual (y a los hilos que lo copian, como
+    asyncio.to_thread) un id de petición y la decisión de muestreo de contenidos.
+    Un id recibido que no sea [A-Za-z0-9._-]{1,64} se reemplaza por uno nuevo
+    """
+    if not request_id or not _REQUEST_ID_RE.match(request_id):
+        request_id = uuid.uuid4().hex[:16]
+    _request_id.set(request_id)
+    _payload_sampled.set(random.random() < _sample_rate)
+    return request_id
+
+
+def current_request_id() -> str:
+    return _request_id.get()
+
+
+@contextmanager
+def use_request_id(request_id: str):
+    """Registra lo que se haga dentro del bloque con `request_id`"""
+    token = _request_id.set(request_id)
+    try:
+        yield
+    finally:
+        _request_id.reset(token)
+
+
+def payload_sampled() -> bool:
+    """Si esta petición registra contenidos (fuera de una petición, por llamada)"""
+    sampled = _payload_sampled.get()
+    if sampled is None:
+        return random.random() < _sample_rate
+    return sampled
+
+
+def log_payload(logger: logging.Logger, message: str, *args):
+    """Registra en DEBUG un contenido voluminoso, solo en las peticiones muestreadas"""
+    if logger.isEnabledFor(logging.DEBUG) and payload_sampled():
+        logger.debug(message, *args)
@@ -0,0 +1,322 @@
+"""
+Métricas en memoria del proceso (histogramas y contadores) con exportación
+en formato de texto de Prometheus
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+# Buckets por defecto en segundos: de 5ms a 60s
+DEFAULT_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+_REGISTRY: List["_Metric"] = []
+_registry_lock = threading.Lock()
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(pairs: Tuple[Tuple[str, str], ...]) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[Tuple[str, str], ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(
+                f"{self.name}: se esperaban las etiquetas {self.labelnames}, "
+                f"se recibieron {tuple(labels)}"
+            )
+        return tuple((name, str(labels[name])) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+        lines.extend(self._render_samples())
+        return lines
+
+    def _render_samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Contador monótono con etiquetas opcionales"""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[Tuple[str, str], ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _render_samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+
+class Gauge(Counter):
+    """Valor que puede subir y bajar"""
+
+    type_name = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """Histograma acumulativo con buckets fijos"""
+
+    type_name = "histogram"
+
+    def __init__(
+        self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Por cada combinación de etiquetas: [conteos por bucket..., +Inf], suma
+        self._series: Dict[Tuple[Tuple[str, str], ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _render_samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1])) for k, v in self._series.items())
+        lines = []
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                labels = _format_labels(key + (("le", _format_value(bound)),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {total!r}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {cumulative}")
+        return lines
+
+
+def render_prometheus() -> str:
+    """Texto de exposición de Prometheus con todas las métricas registradas"""
+    with _registry_lock:
+        metrics = list(_REGISTRY)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# Métricas del pipeline RAG
+STAGE_LATENCY = Histogram(
+    "rag_stage_duration_seconds",
+    "Duración de cada etapa de generate_dilemma_with_rag",
+    labelnames=("stage",),
+)
+REQUEST_LATENCY = Histogram(
+    "rag_request_duration_seconds",
+    "Duración total de las peticiones por endpoint",
+    labelnames=("endpoint", "status"),
+)
+LLM_TOKENS = Counter(
+    "rag_llm_tokens_total",
+    "Tokens consumidos en llamadas al LLM",
+    labelnames=("type",),
+)
+LLM_CACHED_PROMPT_TOKENS = Counter(
+    "rag_llm_cached_prompt_tokens_total",
+    "Tokens de prompt servidos desde la caché de prefijos del proveedor "
+    '(incluidos en rag_llm_tokens_total{type="prompt"})',
+)
+JSON_PARSE_FALLBACKS = Counter(
+    "rag_json_parse_fallbacks_total",
+    "Respuestas del LLM que no se pudieron parsear como JSON",
+)
+UPSTREAM_REQUESTS = Counter(
+    "rag_upstream_requests_total",
+    "Peticiones HTTP a OpenAI por versión de HTTP y si abrieron conexión o reutilizaron una",
+    labelnames=("http_version", "connection"),
+)
+UPSTREAM_CONNECTIONS = Counter(
+    "rag_upstream_connections_total",
+    "Conexiones TCP nuevas abiertas hacia OpenAI",
+)
+UPSTREAM_TLS_HANDSHAKES = Counter(
+    "rag_upstream_tls_handshakes_total",
+    "Handshakes TLS completados hacia OpenAI",
+)
+SESSIONS_ACTIVE = Gauge(
+    "rag_sessions_active",
+    "Sesiones con historial en memoria en este proceso",
+)
+SESSION_EMBEDDING_CACHE = Counter(
+    "rag_session_embedding_cache_total",
+    "Consultas de sesión con embedding cacheado (hit) o calculado (miss)",
+    labelnames=("result",),
+)
+DEADLINE_EXCEEDED = Counter(
+    "rag_deadline_exceeded_total",
+    "Peticiones que agotaron su presupuesto de tiempo, por etapa",
+    labelnames=("stage",),
+)
+DEADLINE_FALLBACKS = Counter(
+    "rag_deadline_fallbacks_total",
+    "Dilemas de respaldo servidos al agotar el presupuesto (served) o sin respaldo (missing)",
+    labelnames=("result",),
+)
+DEADLINE_ABANDONED_CALLS = Gauge(
+    "rag_deadline_abandoned_calls",
+    "Llamadas abandonadas al vencer el plazo que aún ocupan un hilo (ver deadline.py)",
+)
+QUERY_BATCH_SIZE = Histogram(
+    "rag_query_batch_size",
+    "Consultas resueltas en cada lote de embedding y búsqueda (ver query_batcher.py)",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128),
+)
+QUERY_BATCH_QUEUE_DELAY = Histogram(
+    "rag_query_batch_queue_delay_seconds",
+    "Espera de cada consulta desde que se encola hasta que su lote empieza",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+SHARD_REQUESTS = Counter(
+    "rag_shard_requests_total",
+    "Consultas a cada shard por resultado (ok, timeout, error, stale si buscó en otra"
+    " versión, skipped si estaba fuera o abandoned si no se llegó a enviar)",
+    labelnames=("shard", "result"),
+)
+SHARD_REQUEST_LATENCY = Histogram(
+    "rag_shard_request_duration_seconds",
+    "Duración de las consultas respondidas por cada shard",
+    labelnames=("shard",),
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+SHARD_PARTIAL_RESULTS = Counter(
+    "rag_shard_partial_results_total",
+    "Búsquedas respondidas sin todos los shards",
+)
+LOG_RECORDS_DROPPED = Counter(
+    "rag_log_records_dropped_total",
+    "Registros de log descartados porque la cola del hilo escritor estaba llena",
+)
+CLIENT_DISCONNECTS = Counter(
+    "rag_client_disconnects_total",
+    "Peticiones canceladas porque el cliente se desconectó, por etapa",
+    labelnames=("stage",),
+)
+
+
+def record_token_usage(usage_metadata: Optional[Dict]) -> Dict[str, int]:
+    """
+    Tokens de una respuesta del LLM (`usage_metadata` de LangChain) como
+    {prompt_tokens, cached_prompt_tokens, completion_tokens}, sumados a las métricas
+    """
+    usage = usage_metadata or {}
+    token_usage = {
+        "prompt_tokens": usage.get("input_tokens", 0),
+        "cached_prompt_tokens": (usage.get("input_token_details") or {}).get(
+            "cache_read", 0
+        ),
+        "completion_tokens": usage.get("output_tokens", 0),
+    }
+    LLM_TOKENS.inc(token_usage["prompt_tokens"], type="prompt")
+    LLM_TOKENS.inc(token_usage["completion_tokens"], type="completion")
+    LLM_CACHED_PROMPT_TOKENS.inc(token_usage["cached_prompt_tokens"])
+    return token_usage
+
+
+class StageTimer:
+    """
+    Mide la duración de las etapas de una petición.
+    Cada etapa se registra en STAGE_LATENCY y queda en `timings_ms`
+    para poder devolverla (por ejemplo en la cabecera Server-Timing)
+    """
+
+    def __init__(self):
+        self.timings_ms: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.timings_ms[name] = self.timings_ms.get(name, 0.0) + elapsed * 1000
+            STAGE_LATENCY.observe(elapsed, stage=name)
+
+    def record(self, name: str, seconds: float):
+        """Registra una etapa medida en otro hilo (ej. un lote de query_batcher.py)"""
+        self.timings_ms[name] = self.timings_ms.get(name, 0.0) + seconds * 1000
+        STAGE_LATENCY.observe(seconds, stage=name)
+
+
+def format_server_timing(timings_ms: Dict[str, float]) -> str:
+    """Convierte {'etapa': ms} al formato de la cabecera Server-Timing"""
+    return ", ".join(f"{name};dur={ms:.1f}" for name, ms in timings_ms.items())
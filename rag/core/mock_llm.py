@@ -0,0 +1,158 @@
+"""
+Modelo de chat simulado y determinista para pruebas y benchmarks sin red.
+
+No llama a ningún servicio: a los prompts de generación de dilemas (los que
+piden el JSON con "dilemma_text") responde con un dilema fijo y a los demás
+con un texto derivado del prompt. La latencia sigue una distribución
+configurable y el uso de tokens (palabras contadas como tokens) se informa en
+`usage_metadata` como en los demás proveedores, también al hacer streaming.
+También lo usa el servidor mock de OpenAI (scripts/mock_openai.py).
+"""
+
+import json
+import math
+import random
+import threading
+import time
+from typing import Any, Iterator, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+
+MOCK_DILEMMA = {
+    "dilemma_text": (
+        "Imagina que puedes ahorrar tiempo hoy delegando una decisión difícil "
+        "en otra persona, sabiendo que sus consecuencias recaerán sobre alguien "
+        "que aún no conoces. ¿Asumirías la responsabilidad tú mismo o la cederías?"
+    ),
+    "philosophical_foundation": (
+        "Conecta con la responsabilidad hacia el otro y hacia las generaciones futuras."
+    ),
+    "used_sources": ["Hans Jonas", "Emmanuel Levinas"],
+    "hidden_variable": "La responsabilidad que no se puede delegar",
+}
+
+
+class LatencyDistribution:
+    """Distribución de latencias en milisegundos a partir de 'tipo:param:param'"""
+
+    def __init__(self, spec: str, rng: random.Random):
+        self.spec = spec
+        self.rng = rng
+        kind, *params = spec.split(":")
+        self.kind = kind
+        self.params = [float(p) for p in params]
+        expected = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2}
+        if kind not in expected or len(self.params) != expected[kind]:
+            raise ValueError(f"Distribución de latencia inválida: {spec}")
+
+    def sample_seconds(self) -> float:
+        if self.kind == "fixed":
+            ms = self.params[0]
+        elif self.kind == "uniform":
+            ms = self.rng.uniform(*self.params)
+        elif self.kind == "normal":
+            ms = self.rng.gauss(*self.params)
+        else:
+            median, sigma = self.params
+            ms = self.rng.lognormvariate(math.log(median), sigma)
+        return max(0.0, ms) / 1000
+
+
+def mock_response(prompt: str) -> str:
+    """Respuesta determinista para un prompt"""
+    if '"dilemma_text"' in prompt:
+        return json.dumps(MOCK_DILEMMA, ensure_ascii=False)
+    lines = prompt.strip().splitlines()
+    return f"Respuesta simulada a: {lines[-1] if lines else ''}"
+
+
+class MockChatModel(BaseChatModel):
+    """Modelo de chat de LangChain con respuestas de `mock_response`"""
+
+    latency: str = "fixed:0"
+    seed: int = 0
+    model_name: str = "mock-chat"
+
+    _latency: LatencyDistribution = PrivateAttr()
+    _lock: Any = PrivateAttr()
+
+    def model_post_init(self, __context: Any):
+        self._latency = LatencyDistribution(self.latency, random.Random(self.seed))
+        self._lock = threading.Lock()
+
+    @property
+    def _llm_type(self) -> str:
+        return "mock-chat"
+
+    def _wait(self, timeout: Optional[float] = None):
+        """Latencia simulada; con `timeout` menor falla como un cliente HTTP"""
+        with self._lock:
+            seconds = self._latency.sample_seconds()
+        if timeout is not None and seconds > timeout:
+            time.sleep(timeout)
+            raise TimeoutError("Request timed out.")
+        time.sleep(seconds)
+
+    @staticmethod
+    def _prompt(messages: List[BaseMessage]) -> str:
+        return " ".join(
+            m.content if isinstance(m.content, str) else json.dumps(m.content)
+            for m in messages
+        )
+
+    @staticmethod
+    def _usage(prompt: str, content: str) -> dict:
+        prompt_tokens = len(prompt.split())
+        completion_tokens = len(content.split())
+        return {
+            "input_tokens": prompt_tokens,
+            "output_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "input_token_details": {"cache_read": 0},
+        }
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager=None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        prompt = self._prompt(messages)
+        self._wait(kwargs.get("timeout"))
+        content = mock_response(prompt)
+        message = AIMessage(
+            content=content,
+            usage_metadata=self._usage(prompt, content),
+            response_metadata={"model_name": self.model_name},
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager=None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        prompt = self._prompt(messages)
+        # La latencia simula el tiempo hasta el primer token
+        self._wait(kwargs.get("timeout"))
+        content = mock_response(prompt)
+        for i, word in enumerate(content.split(" ")):
+            chunk = ChatGenerationChunk(
+                message=AIMessageChunk(content=word if i == 0 else " " + word)
+            )
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+        yield ChatGenerationChunk(
+            message=AIMessageChunk(
+                content="",
+                usage_metadata=self._usage(prompt, content),
+                response_metadata={"model_name": self.model_name},
+            )
+        )
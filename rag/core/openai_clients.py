@@ -0,0 +1,169 @@
+"""
+Cliente HTTP compartido para todas las llamadas a OpenAI (chat y embeddings).
+
+Un solo `httpx.Client` por proceso, con pool de conexiones keep-alive y HTTP/2
+si está instalado `h2` (`pip install httpx[http2]`), así las llamadas reutilizan
+conexiones en lugar de repetir el handshake TLS. Los modelos de chat también se
+crean una sola vez por configuración.
+
+Variables de entorno:
+    RAG_HTTP2                  1 para intentar HTTP/2 (por defecto 1)
+    RAG_HTTP_MAX_CONNECTIONS   conexiones máximas del pool (100)
+    RAG_HTTP_MAX_KEEPALIVE     conexiones ociosas que se conservan (20)
+    RAG_HTTP_KEEPALIVE_EXPIRY  segundos que se conserva una conexión ociosa (30)
+    RAG_HTTP_TIMEOUT           timeout de lectura/escritura en segundos (60)
+    RAG_HTTP_CONNECT_TIMEOUT   timeout de conexión en segundos (5)
+"""
+
+import logging
+import os
+import threading
+from typing import Optional
+
+from .metrics import (
+    UPSTREAM_CONNECTIONS,
+    UPSTREAM_REQUESTS,
+    UPSTREAM_TLS_HANDSHAKES,
+)
+
+logger = logging.getLogger(__name__)
+
+_client = None
+_client_pid: Optional[int] = None
+_client_lock = threading.Lock()
+_chat_models = {}
+
+
+class _RequestTrace:
+    """
+    Callback de la extensión `trace` de httpcore para una petición: cuenta
+    conexiones TCP nuevas y handshakes TLS, y recuerda si la petición reutilizó
+    una conexión del pool
+    """
+
+    __slots__ = ("new_connection",)
+
+    def __init__(self):
+        self.new_connection = False
+
+    def __call__(self, event_name: str, info: dict):
+        if event_name == "connection.connect_tcp.complete":
+            self.new_connection = True
+            UPSTREAM_CONNECTIONS.inc()
+        elif event_name == "connection.start_tls.complete":
+            UPSTREAM_TLS_HANDSHAKES.inc()
+
+
+def _on_request(request):
+    request.extensions["trace"] = _RequestTrace()
+
+
+def _on_response(response):
+    trace = response.request.extensions.get("trace")
+    new_connection = isinstance(trace, _RequestTrace) and trace.new_connection
+    UPSTREAM_REQUESTS.inc(
+        http_version=response.http_version,
+        connection="new" if new_connection else "reused",
+    )
+
+
+def http_timeout():
+    import httpx
+
+    return httpx.Timeout(
+        float(os.getenv("RAG_HTTP_TIMEOUT", "60")),
+        connect=float(os.getenv("RAG_HTTP_CONNECT_TIMEOUT", "5")),
+    )
+
+
+def _http2_enabled() -> bool:
+    if os.getenv("RAG_HTTP2", "1") != "1":
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        logger.warning(
+            "⚠️  HTTP/2 no disponible (falta 'h2', instala httpx[http2]); "
+            "usando HTTP/1.1 keep-alive"
+        )
+        return False
+    return True
+
+
+def get_http_client():
+    """
+    Cliente httpx del proceso. Se crea en el primer uso y de nuevo tras un
+    fork (cada worker de gunicorn tiene su propio pool)
+    """
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _client_lock:
+            if _client is None or _client_pid != pid:
+                import httpx
+
+                _client = httpx.Client(
+                    http2=_http2_enabled(),
+                    limits=httpx.Limits(
+                        max_connections=int(os.getenv("RAG_HTTP_MAX_CONNECTIONS", "100")),
+                        max_keepalive_connections=int(
+                            os.getenv("RAG_HTTP_MAX_KEEPALIVE", "20")
+                        ),
+                        keepalive_expiry=float(
+                            os.getenv("RAG_HTTP_KEEPALIVE_EXPIRY", "30")
+                        ),
+                    ),
+                    timeout=http_timeout(),
+                    event_hooks={"request": [_on_request], "response": [_on_response]},
+                )
+                _client_pid = pid
+                _chat_models.clear()
+    return _client
+
+
+def get_openai_chat_model(
+    model: Optional[str] = None,
+    temperature: Optional[float] = None,
+    base_url: Optional[str] = None,
+    api_key: Optional[str] = None,
+    max_retries: Optional[int] = None,
+):
+    """
+    ChatOpenAI compartido por configuración, sobre el cliente HTTP del proceso.
+    `base_url` apunta a otro servidor compatible con la API de OpenAI (ver
+    llm_providers); el streaming incluye el uso de tokens. `max_retries=0`
+    para llamadas con presupuesto de tiempo (ver deadline.py)
+    """
+    from langchain_openai import ChatOpenAI
+
+    http_client = get_http_client()
+    key = (model, temperature, base_url, max_retries)
+    chat_model = _chat_models.get(key)
+    if chat_model is None:
+        kwargs = {
+            "http_client": http_client,
+            "timeout": http_timeout(),
+            "stream_usage": True,
+        }
+        if model is not None:
+            kwargs["model"] = model
+        if temperature is not None:
+            kwargs["temperature"] = temperature
+        if base_url is not None:
+            kwargs["base_url"] = base_url
+        if api_key is not None:
+            kwargs["api_key"] = api_key
+        if max_retries is not None:
+            kwargs["max_retries"] = max_retries
+        chat_model = _chat_models.setdefault(key, ChatOpenAI(**kwargs))
+    return chat_model
+
+
+def close_http_client():
+    """Cierra las conexiones del pool (al apagar el servidor)"""
+    global _client
+    with _client_lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client = None
+        _chat_models.clear()
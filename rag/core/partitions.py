@@ -0,0 +1,228 @@
+"""
+Índices por partición (autor u obra) dentro de cada versión del índice.
+
+Además de la colección principal con todo el corpus, cada versión guarda una
+colección Chroma por partición del catálogo con los mismos vectores. Una
+búsqueda filtrada solo recorre las particiones que le tocan (y, dentro de
+ellas, solo las fuentes pedidas), así que su coste depende del tamaño de esas
+particiones y no del corpus completo.
+"""
+
+import logging
+import os
+import weakref
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from .index_store import close_store, open_store
+from .source_catalog import CATALOG_FIELDS, DATA_PATH, describe_source, load_catalog
+
+logger = logging.getLogger(__name__)
+
+PARTITION_PREFIX = "partition_"
+BATCH_SIZE = 1000
+
+# Colecciones de partición de cada versión abierta (las versiones publicadas no cambian)
+_partitions_cache = weakref.WeakKeyDictionary()
+
+
+def partition_collection_name(partition: str) -> str:
+    return f"{PARTITION_PREFIX}{partition}"
+
+
+def _batches(items: List, size: int = BATCH_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+def sync_partitions(persist_directory: str) -> int:
+    """
+    Etiqueta los chunks de la colección principal según el catálogo y deja cada
+    colección de partición con exactamente los chunks que le corresponden,
+    copiando los vectores ya calculados (sin volver a llamar al modelo de embeddings).
+    Retorna el número de cambios aplicados
+    """
+    store = open_store(persist_directory)
+    try:
+        client = store._client
+        main = store._collection
+        items = main.get(include=["metadatas"])
+
+        # Índices anteriores al catálogo, o un catálogo que cambió
+        retagged = {}
+        members = defaultdict(list)
+        for chunk_id, metadata in zip(items["ids"], items["metadatas"]):
+            tags = describe_source(metadata.get("source", ""))
+            if any(metadata.get(field) != tags[field] for field in CATALOG_FIELDS):
+                retagged[chunk_id] = {**metadata, **tags}
+            members[tags["partition"]].append(chunk_id)
+        retagged_ids = list(retagged)
+        for batch in _batches(retagged_ids):
+            main.update(ids=batch, metadatas=[retagged[i] for i in batch])
+        changes = len(retagged)
+
+        existing = {
+            c.name for c in client.list_collections() if c.name.startswith(PARTITION_PREFIX)
+        }
+        for partition, chunk_ids in members.items():
+            name = partition_collection_name(partition)
+            collection = client.get_or_create_collection(
+                name, embedding_function=None, metadata=main.metadata
+            )
+            present = set(collection.get(include=[])["ids"])
+            wanted = set(chunk_ids)
+
+            stale = list(present - wanted)
+            for batch in _batches(stale):
+                collection.delete(ids=batch)
+
+            updated = [i for i in retagged_ids if i in present and i in wanted]
+            for batch in _batches(updated):
+                collection.update(ids=batch, metadatas=[retagged[i] for i in batch])
+
+            missing = [i for i in chunk_ids if i not in present]
+            for batch in _batches(missing):
+                data = main.get(
+                    ids=batch, include=["embeddings", "documents", "metadatas"]
+                )
+                collection.add(
+                    ids=data["ids"],
+                    embeddings=data["embeddings"],
+                    documents=data["documents"],
+                    metadatas=data["metadatas"],
+                )
+
+            if stale or updated or missing:
+                logger.info(
+                    f"🗂️  Partición {partition}: {len(chunk_ids)} chunks "
+                    f"(+{len(missing)} -{len(stale)} ~{len(updated)})"
+                )
+            changes += len(stale) + len(updated) + len(missing)
+
+        # Particiones que se quedaron sin fuentes
+        for name in existing - {partition_collection_name(p) for p in members}:
+            client.delete_collection(name)
+            changes += 1
+        return changes
+    finally:
+        close_store(store)
+
+
+def _partition_collections(store) -> Dict[str, object]:
+    collections = _partitions_cache.get(store)
+    if collections is None:
+        collections = {
+            c.name[len(PARTITION_PREFIX) :]: c
+            for c in store._client.list_collections()
+            if c.name.startswith(PARTITION_PREFIX)
+        }
+        _partitions_cache[store] = collections
+    return collections
+
+
+def _to_docs_and_scores(results: Dict, index: int) -> List[Tuple[object, float]]:
+    from langchain_core.documents import Document
+
+    return [
+        (Document(page_content=text, metadata=metadata or {}), distance)
+        for text, metadata, distance in zip(
+            results["documents"][index],
+            results["metadatas"][index],
+            results["distances"][index],
+        )
+    ]
+
+
+def _query(
+    collection,
+    query_embeddings: List[List[float]],
+    k: int,
+    where=None,
+    ids_only: bool = False,
+):
+    results = collection.query(
+        query_embeddings=query_embeddings,
+        n_results=k,
+        where=where,
+        include=["distances"] if ids_only else ["documents", "metadatas", "distances"],
+    )
+    if ids_only:
+        return [
+            list(zip(results["ids"][i], results["distances"][i]))
+            for i in range(len(query_embeddings))
+        ]
+    return [_to_docs_and_scores(results, i) for i in range(len(query_embeddings))]
+
+
+def search_by_vectors(
+    store,
+    query_embeddings: List[List[float]],
+    k: int,
+    search_filters: Optional[Dict[str, Optional[List[str]]]] = None,
+    ids_only: bool = False,
+) -> List[List[Tuple[object, float]]]:
+    """
+    Los `k` chunks más cercanos a cada vector como [(Document, distancia)],
+    con una sola consulta a Chroma por colección para todos los vectores.
+    Con `ids_only` retorna [(id del chunk, distancia)] sin leer textos ni
+    metadatos (ver chunk_store.search_chunks).
+
+    Con `search_filters` (ver source_catalog.resolve_search_filters) solo se
+    buscan las particiones indicadas y, si hace falta, solo sus fuentes pedidas;
+    el filtro se aplica antes de comparar vectores
+    """
+    if not query_embeddings:
+        return []
+    search = getattr(store, "search_by_vectors", None)
+    if search is not None:
+        # Versión importada de un snapshot (ver snapshot.SnapshotStore)
+        return search(query_embeddings, k, search_filters, ids_only=ids_only)
+    if not search_filters:
+        return _query(store._collection, query_embeddings, k, ids_only=ids_only)
+
+    partitions = search_filters["partitions"]
+    sources = search_filters.get("sources")
+    collections = _partition_collections(store)
+
+    if not collections:
+        # Versión construida antes de las particiones: filtrar la colección
+        # principal por ruta de archivo
+        if sources is None:
+            sources = [
+                name
+                for name in load_catalog()
+                if describe_source(name)["partition"] in partitions
+            ]
+        if not sources:
+            # Chroma no acepta "$in" vacío; ninguna fuente del índice coincide
+            return [[] for _ in query_embeddings]
+        where = {"source": {"$in": [os.path.join(DATA_PATH, s) for s in sources]}}
+        return _query(store._collection, query_embeddings, k, where, ids_only)
+
+    where = {"source_name": {"$in": sources}} if sources else None
+    merged = [[] for _ in query_embeddings]
+    for partition in partitions:
+        collection = collections.get(partition)
+        if collection is None:
+            continue
+        for results, partition_results in zip(
+            merged, _query(collection, query_embeddings, k, where, ids_only)
+        ):
+            results.extend(partition_results)
+    for results in merged:
+        results.sort(key=lambda item: item[1])
+        del results[k:]
+    return merged
+
+
+def search_by_vector(
+    store,
+    query_embedding: List[float],
+    k: int,
+    search_filters: Optional[Dict[str, Optional[List[str]]]] = None,
+) -> List[Tuple[object, float]]:
+    """
+    Los `k` chunks más cercanos como [(Document, distancia)], igual que
+    `similarity_search_by_vector_with_relevance_scores` (ver search_by_vectors)
+    """
+    return search_by_vectors(store, [query_embedding], k, search_filters)[0]
@@ -0,0 +1,248 @@
+"""
+Agrupación de las búsquedas de contexto de peticiones concurrentes.
+
+Cada /generate-dilemma necesita el embedding de su consulta y una búsqueda
+vectorial. En lugar de una llamada de embedding de un solo texto por petición,
+las consultas que llegan casi a la vez se juntan: el hilo despachador espera
+la primera, recoge las que lleguen durante RAG_BATCH_WINDOW_MS (o hasta
+RAG_BATCH_MAX_SIZE) y el lote se resuelve con una sola llamada a
+embed_documents y una sola búsqueda por cada combinación de filtros y `k`
+(Chroma y snapshot.SnapshotStore buscan todos los vectores en una consulta).
+
+Hasta RAG_BATCH_MAX_INFLIGHT lotes se resuelven a la vez; mientras todos están
+ocupados las consultas se acumulan y el siguiente lote sale más grande.
+RAG_BATCH_WINDOW_MS=0 desactiva la agrupación (cada petición busca por su cuenta).
+
+Los backends de embedding del proyecto (OpenAI y hash) calculan igual el
+embedding de una consulta y el de un documento, por eso se usa embed_documents.
+"""
+
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from .chunk_store import ChunkStore, search_chunks
+from .log_config import current_request_id, use_request_id
+from .metrics import QUERY_BATCH_QUEUE_DELAY, QUERY_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Ids de petición que se muestran en los logs de un lote
+BATCH_LOG_IDS = 3
+
+
+class QueryJob:
+    """Una consulta pendiente: embedding (si no viene dado) y búsqueda"""
+
+    def __init__(
+        self,
+        store,
+        query: str,
+        k: int,
+        search_filters: Optional[Dict] = None,
+        embedding: Optional[List[float]] = None,
+    ):
+        self.store = store
+        self.query = query
+        self.k = k
+        self.search_filters = search_filters
+        self.embedding = embedding
+        self.future: Future = Future()
+        self.enqueued_at = time.perf_counter()
+        # Para registrar el trabajo del lote con las peticiones que lo piden
+        self.request_id = current_request_id()
+        # Duración de cada etapa para esta consulta (ver StageTimer.record)
+        self.timings: Dict[str, float] = {}
+
+
+def batch_request_id(jobs: List[QueryJob]) -> str:
+    """
+    Id para los logs del trabajo de un lote: los ids de sus peticiones unidos
+    con "+" (los primeros BATCH_LOG_IDS y cuántos más hay)
+    """
+    ids = list(dict.fromkeys(job.request_id for job in jobs))
+    shown = "+".join(ids[:BATCH_LOG_IDS])
+    if len(ids) > BATCH_LOG_IDS:
+        shown += f"+{len(ids) - BATCH_LOG_IDS}"
+    return shown
+
+
+class QueryResult:
+    """Resultado de una consulta agrupada"""
+
+    def __init__(
+        self,
+        chunks: ChunkStore,
+        hits: List[Tuple[int, float]],
+        embedding: List[float],
+        embedded: bool,
+        timings: Dict[str, float],
+        batch_size: int,
+    ):
+        self.chunks = chunks
+        self.hits = hits
+        self.embedding = embedding
+        # Si el embedding se calculó en el lote (False si venía dado)
+        self.embedded = embedded
+        self.timings = timings
+        self.batch_size = batch_size
+
+
+def _filters_key(search_filters: Optional[Dict]) -> str:
+    return json.dumps(search_filters, sort_keys=True)
+
+
+class QueryBatcher:
+    """Despachador de lotes de consultas (uno por proceso, ver get_query_batcher)"""
+
+    def __init__(self, window_ms: float = 5.0, max_size: int = 32, max_inflight: int = 4):
+        self.window = window_ms / 1000
+        self.max_size = max_size
+        self._queue: "queue.Queue[QueryJob]" = queue.Queue()
+        self._slots = threading.Semaphore(max_inflight)
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_inflight, thread_name_prefix="rag-batch"
+        )
+        self._dispatcher = threading.Thread(
+            target=self._dispatch, name="rag-batch-dispatcher", daemon=True
+        )
+        self._dispatcher.start()
+
+    def submit(
+        self,
+        store,
+        query: str,
+        k: int,
+        search_filters: Optional[Dict] = None,
+        embedding: Optional[List[float]] = None,
+    ) -> Future:
+        """Encola una consulta; el Future se resuelve con un QueryResult"""
+        job = QueryJob(store, query, k, search_filters, embedding)
+        self._queue.put(job)
+        return job.future
+
+    def search(self, *args, **kwargs) -> QueryResult:
+        return self.submit(*args, **kwargs).result()
+
+    def _collect(self) -> List[QueryJob]:
+        batch = [self._queue.get()]
+        closes_at = time.perf_counter() + self.window
+        while len(batch) < self.max_size:
+            remaining = closes_at - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _dispatch(self):
+        while True:
+            batch = self._collect()
+            self._slots.acquire()
+            # Lo que llegó mientras se esperaba un lugar va en este mismo lote
+            while len(batch) < self.max_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._executor.submit(self._run_batch, batch)
+
+    def _run_batch(self, batch: List[QueryJob]):
+        try:
+            started = time.perf_counter()
+            # Las consultas abandonadas (plazo vencido) no se calculan
+            batch = [job for job in batch if job.future.set_running_or_notify_cancel()]
+            if not batch:
+                return
+            QUERY_BATCH_SIZE.observe(len(batch))
+            for job in batch:
+                delay = started - job.enqueued_at
+                QUERY_BATCH_QUEUE_DELAY.observe(delay)
+                job.timings["batch_wait"] = delay
+            # Versiones del índice distintas (publicación durante el lote) por separado
+            by_store: Dict[int, List[QueryJob]] = {}
+            for job in batch:
+                by_store.setdefault(id(job.store), []).append(job)
+            for jobs in by_store.values():
+                with use_request_id(batch_request_id(jobs)):
+                    try:
+                        self._run_store_batch(jobs, len(batch))
+                    except Exception as e:
+                        logger.warning(
+                            "⚠️  Error en un lote de %d consultas: %s", len(jobs), e
+                        )
+                        for job in jobs:
+                            if not job.future.done():
+                                job.future.set_exception(e)
+        finally:
+            self._slots.release()
+
+    def _run_store_batch(self, jobs: List[QueryJob], batch_size: int):
+        store = jobs[0].store
+        pending = [job for job in jobs if job.embedding is None]
+        if pending:
+            start = time.perf_counter()
+            embeddings = store.embeddings.embed_documents([job.query for job in pending])
+            elapsed = time.perf_counter() - start
+            for job, embedding in zip(pending, embeddings):
+                job.embedding = embedding
+                job.timings["embed_query"] = elapsed
+
+        groups: Dict[Tuple[str, int], List[QueryJob]] = {}
+        for job in jobs:
+            groups.setdefault((_filters_key(job.search_filters), job.k), []).append(job)
+        for group in groups.values():
+            start = time.perf_counter()
+            chunks, hits = search_chunks(
+                store,
+                [job.embedding for job in group],
+                k=group[0].k,
+                search_filters=group[0].search_filters,
+            )
+            elapsed = time.perf_counter() - start
+            for job, job_hits in zip(group, hits):
+                job.timings["vector_search"] = elapsed
+                job.future.set_result(
+                    QueryResult(
+                        chunks,
+                        job_hits,
+                        job.embedding,
+                        job in pending,
+                        job.timings,
+                        batch_size,
+                    )
+                )
+
+
+_query_batcher: Optional[QueryBatcher] = None
+_query_batcher_lock = threading.Lock()
+
+
+def batching_enabled() -> bool:
+    return float(os.getenv("RAG_BATCH_WINDOW_MS", "5")) > 0
+
+
+def get_query_batcher() -> QueryBatcher:
+    """QueryBatcher del proceso (uno por worker, creado en el primer uso)"""
+    global _query_batcher
+    if _query_batcher is None:
+        with _query_batcher_lock:
+            if _query_batcher is None:
+                _query_batcher = QueryBatcher(
+                    window_ms=float(os.getenv("RAG_BATCH_WINDOW_MS", "5")),
+                    max_size=int(os.getenv("RAG_BATCH_MAX_SIZE", "32")),
+                    max_inflight=int(os.getenv("RAG_BATCH_MAX_INFLIGHT", "4")),
+                )
+                logger.info(
+                    "📦 Agrupación de consultas: ventana %.1fms, hasta %d por lote",
+                    _query_batcher.window * 1000,
+                    _query_batcher.max_size,
+                )
+    return _query_batcher
@@ -1,68 +1,322 @@
-import argparse
-from langchain.vectorstores.chroma import Chroma
-from langchain.prompts import ChatPromptTemplate
-from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
+"""
+Preguntas sobre el corpus filosófico con RAG.
+
+Tres modos (ejecutar desde rag/):
+    python -m core.query_data "¿Qué es la responsabilidad según Jonas?"
+    python -m core.query_data --batch preguntas.txt --output respuestas.jsonl
+    python -m core.query_data --interactive
 
-from get_embedding_function import get_embedding_function
+En modo batch las preguntas (una por línea, o JSON con "question" e "id") se
+embeben por lotes, se buscan todas en una sola consulta al índice y las
+llamadas al LLM se hacen en paralelo hasta `--concurrency`. El modo
+interactivo mantiene el índice y los clientes cargados entre preguntas.
+"""
 
-# Cargar las variables de entorno
-load_dotenv()
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional
 
-CHROMA_PATH = "chroma"
+from .chunk_store import search_chunks
+from .config import load_environment
+from .index_store import get_index_manager
+from .llm_providers import get_chat_model, stream_response
+from .metrics import StageTimer, record_token_usage
+from .source_catalog import FiltersNotIndexed, require_indexed, resolve_search_filters
 
-# Plantilla del prompt dandole el contexto y el prompt escrito
+# Plantilla del prompt: instrucciones fijas primero, luego el contexto y al
+# final la pregunta, para aprovechar la caché de prefijos del proveedor
 PROMPT_TEMPLATE = """
-You have to answer the following question based on the given context:
-{context}
-Answer the following question:{question}
+Answer the question at the end based on the given context.
 Provide a detailed answer in Spanish.
 Don't include non-relevant information.
+
+Context:
+{context}
+
+Question: {question}
 """
 
 
+def log(message: str):
+    """Progreso por stderr para no mezclarlo con el JSONL de salida"""
+    print(message, file=sys.stderr)
+
+
+class QueryEngine:
+    """
+    Índice, cliente de embeddings, modelo de chat y plantilla cargados una sola
+    vez y reutilizados en todas las preguntas
+    """
+
+    def __init__(
+        self,
+        k: int = 5,
+        filters: Optional[Dict[str, List[str]]] = None,
+        batch_size: int = 64,
+    ):
+        from langchain.prompts import ChatPromptTemplate
+
+        load_environment()
+        self.k = k
+        self.batch_size = batch_size
+        self.search_filters = resolve_search_filters(None, **(filters or {}))
+        self.prompt_template = ChatPromptTemplate.from_template(PROMPT_TEMPLATE)
+        self.model = get_chat_model()
+        self.index_manager = get_index_manager()
+
+    def answer(
+        self, question: str, on_token: Optional[Callable[[str], None]] = None
+    ) -> Dict:
+        """
+        Responde una pregunta; retorna el mismo registro que answer_batch.
+        Con `on_token` la respuesta se genera en streaming, fragmento a fragmento
+        """
+        return self.answer_batch([question], on_token=on_token)[0]
+
+    def answer_batch(
+        self,
+        questions: List[str],
+        concurrency: int = 4,
+        ids: Optional[List] = None,
+        on_token: Optional[Callable[[str], None]] = None,
+    ) -> List[Dict]:
+        """
+        Responde un lote de preguntas en el orden recibido.
+
+        El embedding y la búsqueda se hacen una vez para todo el lote; en
+        `timings_ms` de cada respuesta aparecen repartidos entre sus preguntas
+        """
+        ids = ids if ids is not None else list(range(len(questions)))
+        timer = StageTimer()
+        with self.index_manager.acquire() as db:
+            with timer.stage("embed_query"):
+                query_embeddings = []
+                for start in range(0, len(questions), self.batch_size):
+                    query_embeddings.extend(
+                        db.embeddings.embed_documents(
+                            questions[start : start + self.batch_size]
+                        )
+                    )
+            with timer.stage("vector_search"):
+                chunks, hits = search_chunks(
+                    db, query_embeddings, self.k, self.search_filters
+                )
+        require_indexed(self.search_filters, hits)
+
+        shared_ms = {
+            stage: ms / len(questions) for stage, ms in timer.timings_ms.items()
+        }
+
+        def run(item):
+            question_id, question, question_hits = item
+            # Orden del índice: el mismo conjunto de chunks da el mismo contexto
+            positions = sorted(position for position, _distance in question_hits)
+            return self._generate(
+                question_id, question, chunks, positions, shared_ms, on_token
+            )
+
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+            return list(executor.map(run, zip(ids, questions, hits)))
+
+    def _generate(
+        self,
+        question_id,
+        question: str,
+        chunks,
+        positions: List[int],
+        shared_ms: Dict,
+        on_token: Optional[Callable[[str], None]] = None,
+    ) -> Dict:
+        timer = StageTimer()
+        record = {
+            "id": question_id,
+            "question": question,
+            "sources": [chunks.records[p].source for p in positions],
+        }
+        try:
+            with timer.stage("prompt_build"):
+                context_text = chunks.context(positions)
+                prompt = self.prompt_template.format(
+                    context=context_text, question=question
+                )
+            with timer.stage("llm"):
+                if on_token is None:
+                    response = self.model.invoke(prompt)
+                else:
+                    response = stream_response(self.model, prompt, on_token)
+            record["answer"] = response.content
+
+            record["token_usage"] = record_token_usage(response.usage_metadata)
+        except Exception as e:
+            record["error"] = str(e)
+        record["timings_ms"] = {**shared_ms, **timer.timings_ms}
+        return record
+
+
+def query_rag(
+    query_text: str, engine: Optional[QueryEngine] = None, stream: bool = False
+):
+    """
+    Responde una pregunta e imprime la respuesta con sus fuentes. Con `stream`
+    la respuesta se imprime a medida que el modelo la genera
+    """
+    engine = engine or QueryEngine()
+    on_token = None
+    if stream:
+        print("Response: ", end="", flush=True)
+
+        def on_token(text: str):
+            print(text, end="", flush=True)
+
+    record = engine.answer(query_text, on_token=on_token)
+    if stream:
+        print()
+    if "error" in record:
+        print(f"❌ Error: {record['error']}")
+        return None
+
+    formatted_response = f"Response: {record['answer']}\nSources: {record['sources']}"
+    if stream:
+        print(f"Sources: {record['sources']}")
+    else:
+        print(formatted_response)
+    timings = ", ".join(f"{k}={v:.0f}ms" for k, v in record["timings_ms"].items())
+    print(f"⏱️  {timings}")
+    return formatted_response
+
+
+def read_questions(path: str) -> Iterator[Dict]:
+    """
+    Preguntas de un archivo ("-" = stdin): una por línea, o JSON con "question"
+    y opcionalmente "id". Se ignoran las líneas vacías y las que empiezan por #
+    """
+    stream = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    try:
+        for line_number, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("{"):
+                item = json.loads(line)
+                yield {"id": item.get("id", line_number), "question": item["question"]}
+            else:
+                yield {"id": line_number, "question": line}
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+def run_batch(engine: QueryEngine, input_path: str, output_path: str, concurrency: int):
+    """Responde todas las preguntas de `input_path` y escribe un JSONL por lotes"""
+    if output_path == "-":
+        output = sys.stdout
+    else:
+        output = open(output_path, "w", encoding="utf-8")
+    total = errors = 0
+    start = time.perf_counter()
+
+    def answer(batch: List[Dict]):
+        nonlocal total, errors
+        records = engine.answer_batch(
+            [q["question"] for q in batch],
+            concurrency=concurrency,
+            ids=[q["id"] for q in batch],
+        )
+        for record in records:
+            output.write(json.dumps(record, ensure_ascii=False) + "\n")
+        output.flush()
+        total += len(records)
+        errors += sum(1 for r in records if "error" in r)
+        log(f"📝 {total} preguntas respondidas ({errors} con error)")
+
+    try:
+        batch = []
+        for item in read_questions(input_path):
+            batch.append(item)
+            if len(batch) >= engine.batch_size:
+                answer(batch)
+                batch = []
+        if batch:
+            answer(batch)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    elapsed = time.perf_counter() - start
+    log(
+        f"✅ {total} preguntas en {elapsed:.1f}s "
+        f"({total / elapsed if elapsed else 0:.2f} preguntas/s, {errors} con error)"
+    )
+
+
+def run_interactive(engine: QueryEngine):
+    """REPL: el índice y los clientes quedan cargados entre preguntas"""
+    print("💬 Modo interactivo. Escribe 'salir' para terminar")
+    while True:
+        try:
+            question = input("\n❓ Pregunta: ").strip()
+        except (EOFError, KeyboardInterrupt):
+            print()
+            break
+        if question.lower() in ("salir", "exit", "quit"):
+            break
+        if question:
+            query_rag(question, engine, stream=True)
+
+
 def main():
     # Se crea un CLI para escribir la consulta en la terminal
     parser = argparse.ArgumentParser()
-    parser.add_argument("query_text", type=str, help="The query text.")
+    parser.add_argument("query_text", type=str, nargs="?", help="The query text.")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--batch",
+        type=str,
+        metavar="ARCHIVO",
+        help="Preguntas de un archivo ('-' = stdin)",
+    )
+    mode.add_argument(
+        "--interactive", action="store_true", help="Modo interactivo (REPL)"
+    )
+    parser.add_argument(
+        "--output", type=str, default="-", help="JSONL de salida del modo batch"
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=4, help="Llamadas al LLM en paralelo"
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=64, help="Preguntas por lote de embeddings"
+    )
+    parser.add_argument("--k", type=int, default=5, help="Documentos por pregunta")
+    parser.add_argument(
+        "--author", action="append", dest="authors", help="Filtrar por autor"
+    )
+    parser.add_argument("--work", action="append", dest="works", help="Filtrar por obra")
+    parser.add_argument(
+        "--source", action="append", dest="sources", help="Filtrar por archivo PDF"
+    )
     args = parser.parse_args()
-    query_text = args.query_text
-    query_rag(query_text)
 
+    if not (args.batch or args.interactive or args.query_text):
+        parser.error("Indica una pregunta, --batch o --interactive")
 
-def query_rag(query_text: str):
-    # Cargamos la base de datos y usamos el embedding de OpenAI
-    embedding_function = get_embedding_function()
-    db = Chroma(
-        embedding_function=embedding_function,
-        persist_directory=CHROMA_PATH,
-    )
-    print("Base de datos cargada correctamente")
-
-    # Buscamos en la base de datos los documentos mas relevantes en base a la consulta y crear el contexto
-    results = db.similarity_search_with_score(query_text, k=5)
-    print(f"Resultados encontrados: {len(results)}")
-
-    # Preparamos el prompt para el modelo de OpenAI
-    context_text = "\n\n---\n\n".join([doc.page_content for doc, _score in results])
-    prompt_template = ChatPromptTemplate.from_template(PROMPT_TEMPLATE)
-    print(f"Prompt template: {prompt_template}")
-    prompt = prompt_template.format(context=context_text, question=query_text)
-    print(f"Prompt preparado {prompt}")
-
-    # Obtenemos la respuesta del modelo de OpenAI
-    model = ChatOpenAI()
-    response_text = model.predict(prompt)
-    print(f"Respuesta del modelo: {response_text}")
-
-    # Obtenemos las fuentes que se utilizaron para responder la pregunta
-    sources = [doc.metadata.get("source", None) for doc, _score in results]
-    print(f"Fuentes encontradas: {sources}")
-
-    formatted_response = f"Response: {response_text}\nSources: {sources}"
-    print("Respuesta formateada")
-    print(formatted_response)
-    return formatted_response
+    filters = {"authors": args.authors, "works": args.works, "sources": args.sources}
+    try:
+        engine = QueryEngine(k=args.k, filters=filters, batch_size=args.batch_size)
+    except ValueError as e:
+        parser.error(str(e))
+    try:
+        if args.batch:
+            run_batch(engine, args.batch, args.output, args.concurrency)
+        elif args.interactive:
+            run_interactive(engine)
+        else:
+            query_rag(args.query_text, engine)
+    except FiltersNotIndexed as e:
+        parser.exit(1, f"❌ {e}\n")
 
 
 if __name__ == "__main__":
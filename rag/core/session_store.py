@@ -0,0 +1,262 @@
+"""
+Historial de sesiones en memoria del proceso, con expiración por inactividad.
+
+En lugar de reenviar su historial como texto libre (`user_context`), el
+cliente manda un `session_id` y el servidor guarda un registro compacto y
+acotado de los últimos dilemas y respuestas. A partir de él se construye un
+contexto de tamaño fijo para la búsqueda y para el prompt, y se cachea el
+embedding de la consulta de la sesión mientras su contexto no cambie.
+
+Cada worker tiene su propio almacén: con varios workers, el balanceador debe
+mandar las peticiones de una sesión al mismo worker. Un id que el worker no
+conoce se rechaza (SessionNotFound, 404 en el API) en lugar de crear una
+sesión vacía, así que un enrutamiento sin afinidad se nota en vez de perder
+el historial en silencio (ver scripts/start_server.py --prod).
+"""
+
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional
+
+from .metrics import SESSION_EMBEDDING_CACHE, SESSIONS_ACTIVE
+
+# Límites del registro de cada sesión
+ENTRY_TEXT_CHARS = 240
+ANSWER_CHARS = 240
+HIDDEN_VARIABLE_CHARS = 100
+RETRIEVAL_CONTEXT_CHARS = 200
+EMBEDDING_CACHE_SIZE = 8
+SESSION_ID_CHARS = 64
+
+
+def _truncate(text: Optional[str], limit: int) -> str:
+    text = " ".join((text or "").split())
+    return text if len(text) <= limit else text[: limit - 1].rstrip() + "…"
+
+
+class SessionEntry:
+    """Un dilema de la sesión y la respuesta del usuario, recortados"""
+
+    __slots__ = ("id", "topic", "intensity", "dilemma", "hidden_variable", "answer")
+
+    def __init__(self, topic: str, intensity: str, dilemma: str, hidden_variable: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.topic = topic
+        self.intensity = intensity
+        self.dilemma = _truncate(dilemma, ENTRY_TEXT_CHARS)
+        self.hidden_variable = _truncate(hidden_variable, HIDDEN_VARIABLE_CHARS)
+        self.answer: Optional[str] = None
+
+    def to_dict(self) -> Dict:
+        return {
+            "dilemma_id": self.id,
+            "topic": self.topic,
+            "intensity": self.intensity,
+            "dilemma_text": self.dilemma,
+            "hidden_variable": self.hidden_variable,
+            "answer": self.answer,
+        }
+
+
+class Session:
+    """
+    Registro acotado de una sesión: las últimas `max_entries` entradas más
+    contadores agregados, así su tamaño no crece con la duración de la sesión
+    """
+
+    def __init__(self, session_id: str, max_entries: int):
+        self.id = session_id
+        self.entries = deque(maxlen=max_entries)
+        self.total_dilemmas = 0
+        self.total_answers = 0
+        self.topic_counts: Dict[str, int] = {}
+        self.last_seen = time.monotonic()
+        # Consulta de búsqueda -> embedding, válido mientras no cambie el historial
+        self._embeddings: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add_dilemma(
+        self, topic: str, intensity: str, dilemma: str, hidden_variable: str
+    ) -> str:
+        entry = SessionEntry(topic, intensity, dilemma, hidden_variable)
+        with self._lock:
+            self.entries.append(entry)
+            self.total_dilemmas += 1
+            self.topic_counts[topic] = self.topic_counts.get(topic, 0) + 1
+        return entry.id
+
+    def add_answer(self, answer: str, dilemma_id: Optional[str] = None) -> bool:
+        """Guarda la respuesta de un dilema (por defecto el último). False si no existe"""
+        with self._lock:
+            entry = next(
+                (
+                    e
+                    for e in reversed(self.entries)
+                    if dilemma_id is None or e.id == dilemma_id
+                ),
+                None,
+            )
+            if entry is None:
+                return False
+            if entry.answer is None:
+                self.total_answers += 1
+            entry.answer = _truncate(answer, ANSWER_CHARS)
+            # El contexto de búsqueda cambió
+            self._embeddings.clear()
+            return True
+
+    def retrieval_context(self) -> str:
+        """Texto corto que se añade a la consulta de búsqueda"""
+        with self._lock:
+            answered = [e for e in self.entries if e.answer][-2:]
+        parts = [f"{e.hidden_variable} {e.answer}" for e in answered]
+        return _truncate(" ".join(parts), RETRIEVAL_CONTEXT_CHARS)
+
+    def prompt_context(self) -> str:
+        """Resumen de tamaño fijo del historial para el prompt"""
+        with self._lock:
+            entries = list(self.entries)
+            topics = ", ".join(
+                f"{topic} ({count})" for topic, count in sorted(self.topic_counts.items())
+            )
+            header = (
+                f"{self.total_dilemmas} dilemas previos, {self.total_answers} "
+                f"respondidos. Tópicos: {topics or 'ninguno'}"
+            )
+        lines = [header]
+        for entry in entries:
+            lines.append(
+                f"- [{entry.topic} | {entry.intensity}] {entry.dilemma} "
+                f"→ Respuesta: {entry.answer or 'sin responder'}"
+            )
+        return "\n".join(lines)
+
+    def cached_embedding(self, query: str) -> Optional[List[float]]:
+        with self._lock:
+            embedding = self._embeddings.get(query)
+            if embedding is not None:
+                self._embeddings.move_to_end(query)
+        SESSION_EMBEDDING_CACHE.inc(result="hit" if embedding is not None else "miss")
+        return embedding
+
+    def cache_embedding(self, query: str, embedding: List[float]):
+        with self._lock:
+            self._embeddings[query] = embedding
+            while len(self._embeddings) > EMBEDDING_CACHE_SIZE:
+                self._embeddings.popitem(last=False)
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            entries = [e.to_dict() for e in self.entries]
+            return {
+                "session_id": self.id,
+                "total_dilemmas": self.total_dilemmas,
+                "total_answers": self.total_answers,
+                "topic_counts": dict(self.topic_counts),
+                "entries": entries,
+            }
+
+
+class SessionNotFound(LookupError):
+    """Id de sesión que este worker no conoce (nunca creada, expirada o de otro worker)"""
+
+    def __init__(self, session_id: str):
+        super().__init__(f"Sesión no encontrada o expirada: {session_id}")
+        self.session_id = session_id
+
+
+class SessionStore:
+    """
+    Sesiones del proceso ordenadas por último uso. Se eliminan las inactivas
+    más de `ttl` segundos y, si hay más de `max_sessions`, las menos recientes
+    """
+
+    def __init__(self, ttl: float = 1800, max_sessions: int = 10000, max_entries: int = 5):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_entries = max_entries
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self) -> Session:
+        return self.get_or_create(uuid.uuid4().hex)
+
+    def require(self, session_id: str) -> Session:
+        """Como get, pero lanza SessionNotFound si la sesión no existe"""
+        session = self.get(session_id)
+        if session is None:
+            raise SessionNotFound(session_id)
+        return session
+
+    def get(self, session_id: str) -> Optional[Session]:
+        with self._lock:
+            self._evict(time.monotonic())
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._touch(session)
+            return session
+
+    def get_or_create(self, session_id: str) -> Session:
+        """Sesión existente o una nueva con ese id (el cliente puede elegirlo)"""
+        if not session_id or len(session_id) > SESSION_ID_CHARS:
+            raise ValueError(
+                f"session_id debe tener entre 1 y {SESSION_ID_CHARS} caracteres"
+            )
+        with self._lock:
+            now = time.monotonic()
+            self._evict(now)
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = Session(
+                    session_id, self.max_entries
+                )
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+                SESSIONS_ACTIVE.set(len(self._sessions))
+            self._touch(session)
+            return session
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            removed = self._sessions.pop(session_id, None) is not None
+            SESSIONS_ACTIVE.set(len(self._sessions))
+            return removed
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._evict(time.monotonic())
+            return len(self._sessions)
+
+    def _touch(self, session: Session):
+        session.last_seen = time.monotonic()
+        self._sessions.move_to_end(session.id)
+
+    def _evict(self, now: float):
+        # Ordenadas por último uso: las expiradas están al principio
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if now - oldest.last_seen < self.ttl:
+                break
+            self._sessions.popitem(last=False)
+        SESSIONS_ACTIVE.set(len(self._sessions))
+
+
+_session_store: Optional[SessionStore] = None
+_session_store_lock = threading.Lock()
+
+
+def get_session_store() -> SessionStore:
+    """SessionStore del proceso (uno por worker)"""
+    global _session_store
+    if _session_store is None:
+        with _session_store_lock:
+            if _session_store is None:
+                _session_store = SessionStore(
+                    ttl=float(os.getenv("RAG_SESSION_TTL", "1800")),
+                    max_sessions=int(os.getenv("RAG_SESSION_MAX", "10000")),
+                    max_entries=int(os.getenv("RAG_SESSION_MAX_ENTRIES", "5")),
+                )
+    return _session_store
@@ -0,0 +1,219 @@
+"""
+Proceso que sirve un shard del índice (ver shards.py).
+
+Sigue las versiones publicadas como el API (IndexManager con `shard`): abre
+solo su shard de cada versión, con su almacén compacto de textos, y responde
+los k chunks más cercanos de su parte a los vectores que le envía el
+coordinador (shards.ShardedStore), con texto y metadatos.
+
+Protocolo (JSON por HTTP, en localhost):
+    POST /search  {"embeddings": float32 en base64, "dimensions": d, "k": k,
+                   "search_filters": {...} | null, "version": nombre | null}
+               -> {"shard": i, "version": nombre, "results": [[[id, distancia,
+                   texto, metadatos], ...] por vector]}
+                  con `version`, 409 si el shard no puede buscar en esa versión
+                  (si es la recién publicada, primero la abre)
+    GET /health   shard, versión y chunks del shard
+    GET /metrics  métricas del proceso en formato Prometheus
+
+Uso (desde rag/):
+    python -m core.shard_server --shard 0 --port 8101
+    python -m core.shard_server --shards 4 --base-port 8101   (un proceso por shard,
+                                                            relanza el que termine)
+"""
+
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+
+from .chunk_store import get_chunk_store
+from .index_store import CHROMA_PATH, IndexManager, live_index_path
+from .shards import decode_embeddings
+
+
+def create_app(shard: int, root: str = CHROMA_PATH):
+    from fastapi import FastAPI, HTTPException
+    from fastapi.responses import ORJSONResponse, PlainTextResponse
+    from pydantic import BaseModel, Field
+
+    from .metrics import StageTimer, render_prometheus
+    from .partitions import search_by_vectors
+
+    manager = IndexManager(
+        root,
+        check_interval=float(os.getenv("RAG_INDEX_CHECK_INTERVAL", "1.0")),
+        shard=shard,
+    )
+
+    class ShardSearchRequest(BaseModel):
+        embeddings: str = Field(..., description="Vectores float32 en base64")
+        dimensions: int = Field(..., ge=1)
+        k: int = Field(..., ge=1, le=100)
+        search_filters: Optional[Dict[str, Optional[List[str]]]] = None
+        version: Optional[str] = Field(
+            None, description="Versión que sirve el coordinador (nombre del directorio)"
+        )
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        # Abrir la versión activa antes de aceptar búsquedas
+        manager.reload()
+        yield
+
+    app = FastAPI(
+        title=f"RAG shard {shard}",
+        lifespan=lifespan,
+        default_response_class=ORJSONResponse,
+    )
+
+    @app.post("/search")
+    def search(request: ShardSearchRequest):
+        try:
+            vectors = decode_embeddings(request.embeddings, request.dimensions)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Vectores inválidos: {e}")
+        if (
+            request.version is not None
+            and os.path.basename(manager.status()["live"]) != request.version
+            and os.path.basename(live_index_path(root)) == request.version
+        ):
+            # El coordinador ya cambió a la versión publicada y este shard aún no
+            manager.reload()
+        timer = StageTimer()
+        with manager.acquire_version() as (path, store), timer.stage("shard_search"):
+            version = os.path.basename(path)
+            if request.version is not None and version != request.version:
+                raise HTTPException(
+                    status_code=409,
+                    detail=f"El shard sirve la versión {version}, no {request.version}",
+                )
+            chunks = get_chunk_store(store)
+            results = []
+            for query_results in search_by_vectors(
+                store,
+                vectors.tolist(),
+                request.k,
+                request.search_filters,
+                ids_only=True,
+            ):
+                hits = []
+                for chunk_id, distance in query_results:
+                    position = chunks.position(chunk_id)
+                    if position is None:
+                        continue
+                    hits.append(
+                        [
+                            chunk_id,
+                            distance,
+                            chunks.text(position),
+                            chunks.records[position].metadata(),
+                        ]
+                    )
+                results.append(hits)
+        return {"shard": shard, "version": version, "results": results}
+
+    @app.get("/health")
+    def health():
+        with manager.acquire() as store:
+            chunks = len(get_chunk_store(store))
+        return {
+            "status": "healthy",
+            "shard": shard,
+            "version": os.path.basename(manager.status()["live"]),
+            "chunks": chunks,
+        }
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    def metrics():
+        return PlainTextResponse(
+            render_prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8"
+        )
+
+    return app
+
+
+def serve(shard: int, host: str, port: int, root: str):
+    import uvicorn
+
+    from .config import load_environment
+    from .log_config import configure_logging
+
+    load_environment()
+    configure_logging()
+    uvicorn.run(create_app(shard, root), host=host, port=port, log_level="warning")
+
+
+def serve_all(shards: int, host: str, base_port: int, root: str):
+    """
+    Lanza un proceso por shard y relanza el que termine (mientras tanto el API
+    sigue con los demás, ver shards.ShardedStore); Ctrl+C los detiene a todos
+    """
+
+    def launch(shard: int) -> subprocess.Popen:
+        return subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "core.shard_server",
+                "--shard",
+                str(shard),
+                "--host",
+                host,
+                "--port",
+                str(base_port + shard),
+                "--root",
+                root,
+            ]
+        )
+
+    # Con SIGTERM (p. ej. systemd o kill) también se detienen los shards
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    processes = [launch(shard) for shard in range(shards)]
+    urls = [f"http://{host}:{base_port + shard}" for shard in range(shards)]
+    print(f"🧩 {shards} shards en marcha. Para el API:")
+    print(f"RAG_SHARD_URLS={','.join(urls)}")
+    try:
+        while True:
+            time.sleep(1)
+            for shard, process in enumerate(processes):
+                if process.poll() is not None:
+                    print(
+                        f"❌ El shard {shard} terminó (código {process.returncode}); "
+                        "relanzándolo"
+                    )
+                    processes[shard] = launch(shard)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor de shards del índice")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--shard", type=int, help="Servir este shard")
+    group.add_argument("--shards", type=int, help="Lanzar un proceso por shard")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8101)
+    parser.add_argument(
+        "--base-port", type=int, default=8101, help="Puerto del shard 0 (con --shards)"
+    )
+    parser.add_argument("--root", default=CHROMA_PATH, help="Raíz de las versiones")
+    args = parser.parse_args()
+
+    if args.shards:
+        serve_all(args.shards, args.host, args.base_port, args.root)
+    else:
+        serve(args.shard, args.host, args.port, args.root)
+
+
+if __name__ == "__main__":
+    main()
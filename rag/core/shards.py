@@ -0,0 +1,461 @@
+"""
+Índice repartido en shards servidos por procesos aparte (scatter-gather).
+
+Una versión con shards (`chroma_<timestamp>/`) contiene `shards.json` y un
+directorio Chroma completo por shard (`shard_00/`, `shard_01/`, ...), cada uno
+con su colección principal y sus particiones. Cada chunk va al shard
+crc32(id) % N, así que una ingesta posterior sobre la misma versión lleva
+cada chunk al mismo shard (ver create_database.py --shards).
+
+Cada shard lo sirve su propio proceso (core/shard_server.py), que sigue las
+versiones publicadas igual que el API y responde los k chunks más cercanos
+de su parte con texto y metadatos. En el API la versión se abre como
+ShardedStore: envía la consulta a todos los shards en paralelo
+(RAG_SHARD_URLS) y mezcla los resultados por distancia. Cada petición HTTP
+tiene su propio plazo (RAG_SHARD_TIMEOUT_MS, el timeout del cliente httpx), que
+empieza a contar cuando sale y no mientras espera un hilo libre. Un shard que
+falla o no responde en ese plazo se deja fuera de esa búsqueda y de las de los
+siguientes RAG_SHARD_RETRY_SECONDS. Si el coordinador deja de esperar antes
+(RAG_SHARD_MAX_WAIT_MS, con el pool local saturado) el shard no se marca caído.
+
+Cada consulta lleva la versión que el coordinador está sirviendo y cada shard
+responde con la versión que buscó: los resultados de otra versión (durante un
+cambio en caliente) se descartan en lugar de mezclarse. La búsqueda falla
+(ShardsUnavailable) si responden menos de RAG_SHARD_MIN_OK shards válidos.
+
+Uso (desde rag/):
+    python -m core.create_database --shards 4
+    python -m core.shard_server --shards 4 --base-port 8101
+    RAG_SHARD_URLS=http://127.0.0.1:8101,...,http://127.0.0.1:8104 uvicorn api.server:app
+"""
+
+import base64
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, List, Optional, Tuple
+
+from .chunk_store import BATCH_SIZE, ChunkStore, register_chunk_store
+from .index_store import SHARDS_MANIFEST, close_store, open_store
+from .metrics import SHARD_PARTIAL_RESULTS, SHARD_REQUEST_LATENCY, SHARD_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+MAIN_COLLECTION = "langchain"
+
+
+class ShardsUnavailable(Exception):
+    """Respondieron menos shards de los necesarios para una búsqueda"""
+
+
+def shard_of(chunk_id: str, shards: int) -> int:
+    """Shard de un chunk (estable entre ingestas y procesos)"""
+    return zlib.crc32(chunk_id.encode("utf-8")) % shards
+
+
+def shard_path(path: str, shard: int) -> str:
+    return os.path.join(path, f"shard_{shard:02d}")
+
+
+def read_manifest(path: str) -> Optional[Dict]:
+    """Manifiesto de una versión con shards (None si no tiene)"""
+    try:
+        with open(os.path.join(path, SHARDS_MANIFEST), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def shard_count(path: str) -> int:
+    """Número de shards de una versión (0 si no tiene)"""
+    manifest = read_manifest(path)
+    return manifest["shards"] if manifest else 0
+
+
+def write_manifest(path: str, shards: int, embedding_function=None):
+    from .get_embedding_function import get_embedding_function
+    from .snapshot import embedding_model_id
+
+    manifest = {
+        "shards": shards,
+        "embedding_model": embedding_model_id(
+            embedding_function or get_embedding_function()
+        ),
+    }
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, SHARDS_MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+
+def version_stores(path: str) -> List[str]:
+    """Directorios Chroma de una versión: el suyo o el de cada shard"""
+    shards = shard_count(path)
+    if not shards:
+        return [path]
+    return [shard_path(path, shard) for shard in range(shards)]
+
+
+def split_by_store(chunks, path: str) -> Dict[str, list]:
+    """Chunks (con id, ver calculate_chunk_ids) agrupados por directorio Chroma"""
+    shards = shard_count(path)
+    if not shards:
+        return {path: list(chunks)}
+    groups = {shard_path(path, shard): [] for shard in range(shards)}
+    for chunk in chunks:
+        groups[shard_path(path, shard_of(chunk.metadata["id"], shards))].append(chunk)
+    return groups
+
+
+def reshard_version(
+    path: str, new_path: str, shards: int, batch_size: int = BATCH_SIZE
+) -> int:
+    """
+    Reparte los chunks de una versión (con o sin shards) en una versión nueva
+    con `shards` shards (0 = sin shards), copiando los vectores ya calculados.
+    Las particiones se reconstruyen después con sync_partitions.
+    Retorna los chunks copiados
+    """
+    from langchain_community.vectorstores import Chroma
+
+    if shards:
+        write_manifest(new_path, shards)
+    targets = [shard_path(new_path, shard) for shard in range(shards)] or [new_path]
+    target_stores = []
+    copied = 0
+    try:
+        for source_path in version_stores(path):
+            source = open_store(source_path)
+            try:
+                main = source._collection
+                if not target_stores:
+                    # Con la misma configuración (distancia) que la colección de origen
+                    target_stores = [
+                        Chroma(
+                            persist_directory=target,
+                            embedding_function=source.embeddings,
+                            collection_metadata=main.metadata,
+                        )
+                        for target in targets
+                    ]
+                offset = 0
+                while True:
+                    batch = main.get(
+                        limit=batch_size,
+                        offset=offset,
+                        include=["embeddings", "documents", "metadatas"],
+                    )
+                    groups = {}
+                    for i, chunk_id in enumerate(batch["ids"]):
+                        target = shard_of(chunk_id, shards) if shards else 0
+                        groups.setdefault(target, []).append(i)
+                    for target, rows in groups.items():
+                        target_stores[target]._collection.add(
+                            ids=[batch["ids"][i] for i in rows],
+                            embeddings=[batch["embeddings"][i] for i in rows],
+                            documents=[batch["documents"][i] for i in rows],
+                            metadatas=[batch["metadatas"][i] for i in rows],
+                        )
+                    copied += len(batch["ids"])
+                    if len(batch["ids"]) < batch_size:
+                        break
+                    offset += batch_size
+            finally:
+                close_store(source)
+    except Exception:
+        for store in target_stores:
+            close_store(store)
+        shutil.rmtree(new_path, ignore_errors=True)
+        raise
+    for store in target_stores:
+        close_store(store)
+    return copied
+
+
+def shard_urls() -> List[str]:
+    urls = os.getenv("RAG_SHARD_URLS", "").split(",")
+    return [url.strip().rstrip("/") for url in urls if url.strip()]
+
+
+def encode_embeddings(query_embeddings: List[List[float]]) -> Tuple[str, int]:
+    """Vectores como float32 en base64 (mucho más livianos que listas JSON)"""
+    import numpy as np
+
+    vectors = np.asarray(query_embeddings, dtype=np.float32)
+    return base64.b64encode(vectors.tobytes()).decode("ascii"), vectors.shape[1]
+
+
+def decode_embeddings(data: str, dimensions: int):
+    import numpy as np
+
+    return np.frombuffer(base64.b64decode(data), dtype=np.float32).reshape(-1, dimensions)
+
+
+class ShardedStore:
+    """
+    Versión del índice repartida en shards remotos. Ofrece lo que usa el camino
+    de servicio (`embeddings`, `search_chunks`, `search_by_vectors`,
+    `similarity_search`) mezclando los resultados de todos los shards
+    """
+
+    def __init__(
+        self,
+        path: str,
+        urls: List[str],
+        embedding_function,
+        timeout: float = 1.0,
+        min_shards: int = 1,
+        retry_after: float = 5.0,
+        max_wait: Optional[float] = None,
+    ):
+        import httpx
+
+        self.path = path
+        # Versión que deben haber buscado los shards (ver shard_server.py)
+        self.version = os.path.basename(path)
+        self.shards = urls
+        self.embeddings = embedding_function
+        self.timeout = timeout
+        self.min_shards = min_shards
+        self.retry_after = retry_after
+        # Espera local máxima por búsqueda, incluida la cola del pool de hilos
+        self.max_wait = max_wait if max_wait is not None else timeout * 4
+        # El plazo de cada shard es el timeout de httpx: cuenta desde que sale
+        # la petición (conexión, envío y lectura), no desde que se encola
+        self._client = httpx.Client(
+            timeout=timeout, limits=httpx.Limits(max_connections=len(urls) * 16)
+        )
+        self._executor = ThreadPoolExecutor(
+            max_workers=len(urls) * 8, thread_name_prefix="rag-shard"
+        )
+        # Hasta cuándo se deja fuera cada shard tras un fallo o timeout
+        self._down_until = [0.0] * len(urls)
+        self._lock = threading.Lock()
+        # Los textos llegan con los resultados de cada shard: la versión no
+        # tiene almacén compacto propio (IndexManager lo pide al abrirla)
+        register_chunk_store(self, ChunkStore().freeze())
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._client.close()
+
+    def _call(self, shard: int, payload: bytes) -> Optional[List[List[list]]]:
+        """
+        Consulta un shard (en un hilo del pool) y registra el resultado.
+        Retorna sus resultados, o None si falló, no respondió a tiempo o
+        buscó en otra versión
+        """
+        import httpx
+
+        start = time.perf_counter()
+        try:
+            response = self._client.post(
+                f"{self.shards[shard]}/search",
+                content=payload,
+                headers={"Content-Type": "application/json"},
+            )
+            if response.status_code == 409:
+                # El shard ya no tiene (o aún no tiene) esta versión
+                self._mark(shard, "stale")
+                return None
+            response.raise_for_status()
+            body = response.json()
+        except httpx.TimeoutException:
+            self._mark(shard, "timeout")
+            return None
+        except Exception as e:
+            logger.debug("Shard %d falló: %s", shard, e)
+            self._mark(shard, "error")
+            return None
+        if body.get("version") != self.version:
+            logger.debug(
+                "Shard %d respondió con la versión %s (se esperaba %s)",
+                shard,
+                body.get("version"),
+                self.version,
+            )
+            self._mark(shard, "stale")
+            return None
+        SHARD_REQUEST_LATENCY.observe(time.perf_counter() - start, shard=shard)
+        self._mark(shard, "ok")
+        return body["results"]
+
+    def _mark(self, shard: int, result: str):
+        SHARD_REQUESTS.inc(shard=shard, result=result)
+        with self._lock:
+            if result == "ok":
+                if self._down_until[shard]:
+                    logger.info("✅ Shard %d disponible de nuevo", shard)
+                self._down_until[shard] = 0.0
+            elif result in ("timeout", "error"):
+                if not self._down_until[shard]:
+                    logger.warning(
+                        "⚠️  Shard %d fuera por %.0fs (%s)",
+                        shard,
+                        self.retry_after,
+                        result,
+                    )
+                self._down_until[shard] = time.monotonic() + self.retry_after
+
+    def _scatter(
+        self,
+        query_embeddings: List[List[float]],
+        k: int,
+        search_filters: Optional[Dict],
+    ) -> List[List[list]]:
+        """
+        Consulta todos los shards disponibles en paralelo y retorna, por consulta,
+        sus [id, distancia, texto, metadatos] más cercanos de todos los shards
+        """
+        vectors, dimensions = encode_embeddings(query_embeddings)
+        payload = json.dumps(
+            {
+                "embeddings": vectors,
+                "dimensions": dimensions,
+                "k": k,
+                "search_filters": search_filters,
+                "version": self.version,
+            }
+        ).encode("utf-8")
+
+        now = time.monotonic()
+        available = [
+            shard for shard in range(len(self.shards)) if self._down_until[shard] <= now
+        ]
+        if len(available) < self.min_shards:
+            # Sin shards suficientes disponibles se vuelve a probar con todos
+            available = list(range(len(self.shards)))
+        futures = {}
+        for shard in range(len(self.shards)):
+            if shard not in available:
+                SHARD_REQUESTS.inc(shard=shard, result="skipped")
+                continue
+            futures[self._executor.submit(self._call, shard, payload)] = shard
+        done, _pending = wait(futures, timeout=self.max_wait)
+
+        merged = [[] for _ in query_embeddings]
+        answered = 0
+        for future, shard in futures.items():
+            if future not in done:
+                # Se dejó de esperar de este lado: no es culpa del shard. Si la
+                # petición ya salió, _call registra igual su resultado
+                if future.cancel():
+                    SHARD_REQUESTS.inc(shard=shard, result="abandoned")
+                continue
+            results = future.result()
+            if results is None:
+                continue
+            answered += 1
+            for query_results, shard_results in zip(merged, results):
+                query_results.extend(shard_results)
+
+        if answered < self.min_shards:
+            raise ShardsUnavailable(
+                f"Respondieron {answered} de {len(self.shards)} shards "
+                f"(mínimo {self.min_shards})"
+            )
+        if answered < len(self.shards):
+            SHARD_PARTIAL_RESULTS.inc()
+        for query_results in merged:
+            query_results.sort(key=lambda hit: (hit[1], hit[0]))
+            del query_results[k:]
+        return merged
+
+    def search_chunks(
+        self,
+        query_embeddings: List[List[float]],
+        k: int,
+        search_filters: Optional[Dict[str, Optional[List[str]]]] = None,
+    ) -> Tuple[ChunkStore, List[List[Tuple[int, float]]]]:
+        """
+        Mismo contrato que chunk_store.search_chunks, con un almacén que solo
+        tiene los chunks de los resultados
+        """
+        merged = self._scatter(query_embeddings, k, search_filters)
+        hits_by_id = {}
+        for query_results in merged:
+            for chunk_id, _distance, text, metadata in query_results:
+                hits_by_id[chunk_id] = (text, metadata)
+        # Ordenados por id: el mismo conjunto de chunks da siempre el mismo contexto
+        chunks = ChunkStore()
+        for chunk_id in sorted(hits_by_id):
+            chunks.add(chunk_id, *hits_by_id[chunk_id])
+        chunks.freeze()
+        return chunks, [
+            [
+                (chunks.position(chunk_id), distance)
+                for chunk_id, distance, _text, _metadata in query_results
+            ]
+            for query_results in merged
+        ]
+
+    def search_by_vectors(
+        self,
+        query_embeddings: List[List[float]],
+        k: int,
+        search_filters: Optional[Dict[str, Optional[List[str]]]] = None,
+        ids_only: bool = False,
+    ) -> List[List[Tuple[object, float]]]:
+        """
+        Mismo contrato que partitions.search_by_vectors; los Document traen
+        los metadatos que guarda el almacén compacto (fuente, autor, obra,
+        partición y página)
+        """
+        merged = self._scatter(query_embeddings, k, search_filters)
+        if ids_only:
+            return [
+                [(chunk_id, distance) for chunk_id, distance, _, _ in query_results]
+                for query_results in merged
+            ]
+        from langchain_core.documents import Document
+
+        return [
+            [
+                (Document(page_content=text, metadata=metadata), distance)
+                for _chunk_id, distance, text, metadata in query_results
+            ]
+            for query_results in merged
+        ]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs):
+        query_embedding = self.embeddings.embed_query(query)
+        return [doc for doc, _ in self.search_by_vectors([query_embedding], k)[0]]
+
+
+def open_sharded(path: str, embedding_function) -> ShardedStore:
+    """
+    Abre una versión con shards para servir con los procesos de RAG_SHARD_URLS.
+    Falla con ValueError si no hay tantas URLs como shards o si la versión se
+    construyó con otro modelo de embeddings que el configurado
+    """
+    from .snapshot import embedding_model_id
+
+    manifest = read_manifest(path)
+    urls = shard_urls()
+    if len(urls) != manifest["shards"]:
+        raise ValueError(
+            f"La versión {path} tiene {manifest['shards']} shards y "
+            f"RAG_SHARD_URLS indica {len(urls)}"
+        )
+    configured = embedding_model_id(embedding_function)
+    if manifest["embedding_model"] != configured:
+        raise ValueError(
+            f"La versión {path} se creó con el modelo de embeddings "
+            f"{manifest['embedding_model']} y el configurado es {configured}"
+        )
+    max_wait_ms = os.getenv("RAG_SHARD_MAX_WAIT_MS")
+    store = ShardedStore(
+        path,
+        urls,
+        embedding_function,
+        timeout=float(os.getenv("RAG_SHARD_TIMEOUT_MS", "1000")) / 1000,
+        min_shards=int(os.getenv("RAG_SHARD_MIN_OK", "1")),
+        retry_after=float(os.getenv("RAG_SHARD_RETRY_SECONDS", "5")),
+        max_wait=float(max_wait_ms) / 1000 if max_wait_ms else None,
+    )
+    logger.info(f"🧩 Versión {path} repartida en {len(urls)} shards")
+    return store
@@ -0,0 +1,546 @@
+"""
+Snapshots portables del índice: un único archivo versionado para arrancar un
+nodo nuevo sin copiar el directorio `chroma/` ni volver a calcular embeddings.
+
+Formato (little-endian; cada sección alineada a 64 bytes para mapearla en memoria):
+
+    MAGIC (8 bytes) | versión del formato (uint32) | largo del manifiesto (uint32)
+    manifiesto JSON: modelo de embeddings, dimensiones, distancia, secciones
+                     (offset, largo, dtype y forma) y checksum sha256
+    vectors        float32[count, dimensions]
+    text_offsets   uint64[count + 1]
+    texts          textos UTF-8 concatenados (el buffer de chunk_store.ChunkStore)
+    ids            JSON con los ids de los chunks
+    metadatas      JSON con los metadatos de los chunks
+
+El checksum cubre todas las secciones. Importar un snapshot lo copia como una
+versión más del índice (`chroma_<timestamp>/index.ragsnap`), lo valida y lo
+publica con el lock de ingesta tomado (ver ingest_jobs.ingest_lock), así que el cambio en caliente, los leases y la limpieza de versiones
+funcionan igual que con Chroma. El servidor abre esa versión con mmap, verifica
+el checksum y el modelo de embeddings y busca por fuerza bruta exacta sobre los
+vectores mapeados (SnapshotStore), sin pasar por Chroma. Una ingesta sobre una
+versión snapshot la materializa antes en Chroma (restore_snapshot).
+
+Uso (desde rag/):
+    python -m core.snapshot export --output indice.ragsnap
+    python -m core.snapshot verify indice.ragsnap
+    python -m core.snapshot import indice.ragsnap [--no-publish]
+    python -m core.snapshot restore indice.ragsnap --chroma chroma_restaurado
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import mmap
+import os
+import shutil
+import struct
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .chunk_store import BATCH_SIZE, ChunkStore, register_chunk_store
+from .index_store import (
+    CHROMA_PATH,
+    SHARDS_MANIFEST,
+    SNAPSHOT_NAME,
+    close_store,
+    collect_garbage,
+    live_index_path,
+    new_version_path,
+    open_store,
+    publish_version,
+    snapshot_file,
+    validate_index,
+)
+from .source_catalog import describe_source
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"RAGSNAP\x00"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<8sII")
+ALIGNMENT = 64
+DISTANCES = ("l2", "cosine", "ip")
+
+
+def _align(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def embedding_model_id(embedding_function) -> str:
+    """Identificador del modelo de embeddings (ej. text-embedding-3-large)"""
+    return getattr(embedding_function, "model", None) or type(embedding_function).__name__
+
+
+class Snapshot:
+    """Archivo de snapshot mapeado en memoria; las secciones se leen sin copiar"""
+
+    def __init__(self, path: str, verify: bool = True):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self.manifest, self._payload_start = self._read_manifest()
+            if verify:
+                self.verify()
+        except Exception:
+            self.close()
+            raise
+
+    def _read_manifest(self) -> Tuple[Dict, int]:
+        if len(self._mmap) < HEADER.size:
+            raise ValueError(f"{self.path} no es un snapshot del índice")
+        magic, version, manifest_size = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} no es un snapshot del índice")
+        if version != FORMAT_VERSION:
+            raise ValueError(
+                f"Versión de snapshot no soportada: {version} (se esperaba {FORMAT_VERSION})"
+            )
+        manifest = json.loads(
+            self._mmap[HEADER.size : HEADER.size + manifest_size].decode("utf-8")
+        )
+        payload_start = _align(HEADER.size + manifest_size)
+        payload_size = len(self._mmap) - payload_start
+        for name, section in manifest["sections"].items():
+            if section["offset"] + section["length"] > payload_size:
+                raise ValueError(f"Snapshot truncado: falta la sección {name}")
+        if manifest.get("distance") not in DISTANCES:
+            raise ValueError(
+                f"Distancia no soportada en {self.path}: {manifest.get('distance')}"
+            )
+        return manifest, payload_start
+
+    def verify(self):
+        """Compara el sha256 de las secciones con el del manifiesto"""
+        digest = hashlib.sha256(memoryview(self._mmap)[self._payload_start :]).hexdigest()
+        if digest != self.manifest["checksum"]:
+            raise ValueError(f"Checksum incorrecto en {self.path}: el archivo está dañado")
+
+    def section(self, name: str) -> memoryview:
+        section = self.manifest["sections"][name]
+        start = self._payload_start + section["offset"]
+        return memoryview(self._mmap)[start : start + section["length"]]
+
+    def array(self, name: str) -> np.ndarray:
+        section = self.manifest["sections"][name]
+        return np.frombuffer(self.section(name), dtype=section["dtype"]).reshape(
+            section["shape"]
+        )
+
+    def json(self, name: str):
+        return json.loads(str(self.section(name), "utf-8"))
+
+    def close(self):
+        try:
+            self._mmap.close()
+        except BufferError:
+            # Aún hay arrays sobre el mapa; se cierra cuando se liberen
+            pass
+
+
+class SnapshotStore:
+    """
+    Versión del índice servida desde un snapshot. Ofrece lo que usa el camino
+    de servicio (`embeddings`, `search_by_vectors`, `similarity_search`) con
+    búsqueda exacta por fuerza bruta sobre los vectores mapeados
+    """
+
+    def __init__(self, snapshot: Snapshot, embedding_function):
+        self.snapshot = snapshot
+        self.embeddings = embedding_function
+        self.distance = snapshot.manifest["distance"]
+        self.vectors = snapshot.array("vectors")
+        self._ids = snapshot.json("ids")
+        self.chunks = ChunkStore.from_buffer(
+            self._ids,
+            snapshot.section("texts"),
+            snapshot.section("text_offsets").cast("Q"),
+            snapshot.json("metadatas"),
+        )
+        # Normas de los vectores, para no recalcularlas en cada búsqueda
+        self._norms = np.einsum("ij,ij->i", self.vectors, self.vectors)
+        if self.distance == "cosine":
+            self._norms = np.sqrt(self._norms)
+
+        # Posiciones de cada partición y de cada fuente, para los filtros
+        by_partition, by_source = {}, {}
+        self._source_partition = {}
+        for position, record in enumerate(self.chunks.records):
+            partition = record.partition or describe_source(record.source or "")["partition"]
+            source_name = record.source_name or os.path.basename(record.source or "")
+            by_partition.setdefault(partition, []).append(position)
+            by_source.setdefault(source_name, []).append(position)
+            self._source_partition[source_name] = partition
+        self._by_partition = {p: np.array(v, dtype=np.int64) for p, v in by_partition.items()}
+        self._by_source = {s: np.array(v, dtype=np.int64) for s, v in by_source.items()}
+        register_chunk_store(self, self.chunks)
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def close(self):
+        self.vectors = self._norms = None
+        self.snapshot.close()
+
+    def _candidates(self, search_filters) -> Optional[np.ndarray]:
+        """Posiciones que cumplen los filtros (None = todo el corpus)"""
+        if not search_filters:
+            return None
+        partitions = set(search_filters["partitions"])
+        sources = search_filters.get("sources")
+        if sources is None:
+            arrays = [self._by_partition[p] for p in partitions if p in self._by_partition]
+        else:
+            arrays = [
+                self._by_source[s]
+                for s in sources
+                if s in self._by_source and self._source_partition[s] in partitions
+            ]
+        if not arrays:
+            return np.empty(0, dtype=np.int64)
+        return np.sort(np.concatenate(arrays))
+
+    def _distances(self, queries: np.ndarray, candidates: Optional[np.ndarray]):
+        vectors = self.vectors if candidates is None else self.vectors[candidates]
+        norms = self._norms if candidates is None else self._norms[candidates]
+        products = queries @ vectors.T
+        if self.distance == "ip":
+            return 1.0 - products
+        if self.distance == "cosine":
+            query_norms = np.linalg.norm(queries, axis=1)[:, None]
+            return 1.0 - products / np.maximum(query_norms * norms, 1e-12)
+        # l2 al cuadrado, como Chroma
+        query_norms = np.einsum("ij,ij->i", queries, queries)[:, None]
+        return np.maximum(query_norms + norms - 2.0 * products, 0.0)
+
+    def search_by_vectors(
+        self,
+        query_embeddings: List[List[float]],
+        k: int,
+        search_filters: Optional[Dict[str, Optional[List[str]]]] = None,
+        ids_only: bool = False,
+    ) -> List[List[Tuple[object, float]]]:
+        """Mismo contrato que partitions.search_by_vectors"""
+        candidates = self._candidates(search_filters)
+        size = len(self.chunks) if candidates is None else len(candidates)
+        k = min(k, size)
+        if k <= 0:
+            return [[] for _ in query_embeddings]
+
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        results = []
+        for row in self._distances(queries, candidates):
+            top = np.argpartition(row, k - 1)[:k] if k < size else np.arange(size)
+            top = top[np.argsort(row[top], kind="stable")]
+            positions = top if candidates is None else candidates[top]
+            if ids_only:
+                results.append(
+                    [(self._ids[p], float(row[i])) for p, i in zip(positions, top)]
+                )
+            else:
+                results.append(
+                    [(self._document(p), float(row[i])) for p, i in zip(positions, top)]
+                )
+        return results
+
+    def _document(self, position: int):
+        from langchain_core.documents import Document
+
+        return Document(
+            page_content=self.chunks.text(position),
+            metadata=self.chunks.records[position].metadata(),
+        )
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs):
+        query_embedding = self.embeddings.embed_query(query)
+        return [doc for doc, _ in self.search_by_vectors([query_embedding], k)[0]]
+
+
+def open_snapshot(path: str, embedding_function, verify: bool = True) -> SnapshotStore:
+    """
+    Abre un snapshot para servir. Falla con ValueError si el archivo está
+    dañado o si se creó con otro modelo de embeddings que el configurado
+    """
+    start = time.perf_counter()
+    snapshot = Snapshot(path, verify=verify)
+    expected = snapshot.manifest["embedding_model"]
+    configured = embedding_model_id(embedding_function)
+    if expected != configured:
+        snapshot.close()
+        raise ValueError(
+            f"El snapshot {path} se creó con el modelo de embeddings {expected} "
+            f"y el configurado es {configured}"
+        )
+    store = SnapshotStore(snapshot, embedding_function)
+    logger.info(
+        f"📦 Snapshot {path}: {len(store)} chunks "
+        f"({(time.perf_counter() - start) * 1000:.0f}ms)"
+    )
+    return store
+
+
+def export_snapshot(
+    index_path: str, output: str, embedding_function=None, batch_size: int = BATCH_SIZE
+) -> Dict:
+    """
+    Escribe la colección principal de una versión del índice en un snapshot.
+    Las particiones no se guardan: se derivan de los metadatos al cargar.
+    Retorna el manifiesto
+    """
+    source_snapshot = snapshot_file(index_path)
+    if source_snapshot:
+        # La versión ya es un snapshot: se verifica y se copia tal cual
+        snapshot = Snapshot(source_snapshot)
+        manifest = snapshot.manifest
+        snapshot.close()
+        shutil.copyfile(source_snapshot, output)
+        return manifest
+    if os.path.isfile(os.path.join(index_path, SHARDS_MANIFEST)):
+        raise ValueError(
+            f"La versión {index_path} está repartida en shards; exporta cada "
+            "directorio shard_NN por separado"
+        )
+
+    store = open_store(index_path, embedding_function)
+    try:
+        collection = store._collection
+        distance = (collection.metadata or {}).get("hnsw:space", "l2")
+        if distance not in DISTANCES:
+            raise ValueError(f"Distancia no soportada en el snapshot: {distance}")
+        model = embedding_model_id(store.embeddings)
+        ids, vectors, metadatas = [], [], []
+        texts = bytearray()
+        offsets = [0]
+        offset = 0
+        while True:
+            batch = collection.get(
+                limit=batch_size,
+                offset=offset,
+                include=["embeddings", "documents", "metadatas"],
+            )
+            ids.extend(batch["ids"])
+            metadatas.extend(batch["metadatas"])
+            if len(batch["ids"]):
+                vectors.append(np.asarray(batch["embeddings"], dtype=np.float32))
+            for text in batch["documents"]:
+                texts += (text or "").encode("utf-8")
+                offsets.append(len(texts))
+            if len(batch["ids"]) < batch_size:
+                break
+            offset += batch_size
+    finally:
+        close_store(store)
+
+    if not ids:
+        raise ValueError(f"El índice {index_path} está vacío")
+    matrix = np.ascontiguousarray(np.concatenate(vectors))
+    sections = [
+        ("vectors", matrix.tobytes(), "<f4", list(matrix.shape)),
+        ("text_offsets", np.asarray(offsets, dtype="<u8").tobytes(), "<u8", [len(offsets)]),
+        ("texts", bytes(texts), "u1", [len(texts)]),
+        ("ids", json.dumps(ids, ensure_ascii=False).encode("utf-8"), "u1", None),
+        ("metadatas", json.dumps(metadatas, ensure_ascii=False).encode("utf-8"), "u1", None),
+    ]
+
+    # Checksum de las secciones tal como quedan en el archivo, con el relleno
+    table = {}
+    digest = hashlib.sha256()
+    position = 0
+    for name, data, dtype, shape in sections:
+        table[name] = {"offset": position, "length": len(data), "dtype": dtype}
+        if shape is not None:
+            table[name]["shape"] = shape
+        padding = _align(position + len(data)) - position - len(data)
+        digest.update(data)
+        digest.update(b"\0" * padding)
+        position += len(data) + padding
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "source_index": os.path.basename(os.path.normpath(index_path)),
+        "embedding_model": model,
+        "dimensions": int(matrix.shape[1]),
+        "count": len(ids),
+        "distance": distance,
+        "sections": table,
+        "checksum": digest.hexdigest(),
+    }
+    manifest_bytes = json.dumps(manifest, ensure_ascii=False).encode("utf-8")
+
+    tmp_output = f"{output}.tmp.{os.getpid()}"
+    try:
+        with open(tmp_output, "wb") as f:
+            f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(manifest_bytes)))
+            f.write(manifest_bytes)
+            f.write(b"\0" * (_align(f.tell()) - f.tell()))
+            for name, data, _dtype, _shape in sections:
+                f.write(data)
+                f.write(b"\0" * (_align(len(data)) - len(data)))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_output, output)
+    except BaseException:
+        if os.path.exists(tmp_output):
+            os.remove(tmp_output)
+        raise
+    return manifest
+
+
+def import_snapshot(
+    path: str,
+    root: str = CHROMA_PATH,
+    publish: bool = True,
+    on_wait: Optional[Callable[[], None]] = None,
+) -> str:
+    """
+    Copia un snapshot como versión nueva del índice, la valida y (por defecto)
+    la publica, con el lock de ingesta tomado para que una ingesta en curso no
+    publique después una versión sin el snapshot. Retorna la ruta de la versión
+    """
+    from .get_embedding_function import get_embedding_function
+    from .ingest_jobs import ingest_lock
+
+    # Falla antes de copiar si el archivo está dañado o el modelo no coincide
+    open_snapshot(path, get_embedding_function()).close()
+
+    with ingest_lock(on_wait=on_wait):
+        version_path = new_version_path(root)
+        os.makedirs(version_path)
+        try:
+            target = os.path.join(version_path, SNAPSHOT_NAME)
+            shutil.copyfile(path, f"{target}.tmp")
+            os.replace(f"{target}.tmp", target)
+            validate_index(version_path)
+        except BaseException:
+            shutil.rmtree(version_path, ignore_errors=True)
+            raise
+        if publish:
+            publish_version(version_path, root)
+    return version_path
+
+
+def restore_snapshot(path: str, chroma_path: str, batch_size: int = BATCH_SIZE) -> int:
+    """
+    Reconstruye una versión Chroma (colección principal y particiones) con los
+    vectores y la distancia del snapshot, sin llamar al modelo de embeddings.
+    Retorna el número de chunks
+    """
+    from langchain_community.vectorstores import Chroma
+
+    from .get_embedding_function import get_embedding_function
+    from .partitions import sync_partitions
+
+    snapshot = Snapshot(path)
+    try:
+        vectors = snapshot.array("vectors")
+        offsets = snapshot.section("text_offsets").cast("Q")
+        texts = snapshot.section("texts")
+        ids = snapshot.json("ids")
+        metadatas = snapshot.json("metadatas")
+        distance = snapshot.manifest["distance"]
+        # Con la distancia del snapshot: las particiones heredan la de la
+        # colección principal (ver partitions.sync_partitions)
+        store = Chroma(
+            persist_directory=chroma_path,
+            embedding_function=get_embedding_function(),
+            collection_metadata={"hnsw:space": distance},
+        )
+        try:
+            existing = (store._collection.metadata or {}).get("hnsw:space", "l2")
+            if existing != distance:
+                raise ValueError(
+                    f"{chroma_path} ya tiene una colección con distancia {existing} "
+                    f"y el snapshot usa {distance}"
+                )
+            for start in range(0, len(ids), batch_size):
+                end = min(start + batch_size, len(ids))
+                store._collection.add(
+                    ids=ids[start:end],
+                    embeddings=vectors[start:end],
+                    documents=[
+                        str(texts[offsets[i] : offsets[i + 1]], "utf-8")
+                        for i in range(start, end)
+                    ],
+                    metadatas=metadatas[start:end],
+                )
+        finally:
+            close_store(store)
+        del vectors, offsets, texts
+    finally:
+        snapshot.close()
+    sync_partitions(chroma_path)
+    return len(ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Snapshots portables del índice")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="Exportar una versión a un snapshot")
+    export.add_argument(
+        "--chroma", type=str, help="Versión del índice (por defecto la activa)"
+    )
+    export.add_argument("--output", type=str, required=True, help="Archivo de salida")
+    verify = commands.add_parser("verify", help="Verificar un snapshot")
+    verify.add_argument("snapshot", type=str)
+    load = commands.add_parser("import", help="Importar y publicar un snapshot")
+    load.add_argument("snapshot", type=str)
+    load.add_argument(
+        "--no-publish", action="store_true", help="Importar y validar sin publicar"
+    )
+    restore = commands.add_parser("restore", help="Reconstruir un directorio Chroma")
+    restore.add_argument("snapshot", type=str)
+    restore.add_argument("--chroma", type=str, required=True, help="Directorio destino")
+    args = parser.parse_args()
+
+    from .config import load_environment
+
+    load_environment()
+    if args.command == "export":
+        path = args.chroma or live_index_path()
+        start = time.perf_counter()
+        manifest = export_snapshot(path, args.output)
+        print(
+            f"📦 Snapshot {args.output}: {manifest['count']} chunks de {path}, "
+            f"{manifest['embedding_model']} ({manifest['dimensions']} dim), "
+            f"{os.path.getsize(args.output) / 1024 / 1024:.1f} MiB "
+            f"en {time.perf_counter() - start:.1f}s"
+        )
+    elif args.command == "verify":
+        from .get_embedding_function import get_embedding_function
+
+        start = time.perf_counter()
+        store = open_snapshot(args.snapshot, get_embedding_function())
+        manifest = store.snapshot.manifest
+        store.close()
+        print(
+            f"✅ Snapshot válido: {manifest['count']} chunks, "
+            f"{manifest['embedding_model']}, distancia {manifest['distance']}, "
+            f"creado {manifest['created_at']} "
+            f"({(time.perf_counter() - start) * 1000:.0f}ms)"
+        )
+    elif args.command == "import":
+        version_path = import_snapshot(
+            args.snapshot,
+            publish=not args.no_publish,
+            on_wait=lambda: print("⏳ Hay otra ingesta en curso; esperando su turno"),
+        )
+        if args.no_publish:
+            print(f"📦 Versión lista sin publicar: {version_path}")
+        else:
+            print(f"🚀 Versión publicada: {version_path}")
+            for path in collect_garbage(CHROMA_PATH):
+                print(f"🗑️  Versión antigua eliminada: {path}")
+    else:
+        if os.path.exists(args.chroma):
+            parser.error(f"{args.chroma} ya existe")
+        count = restore_snapshot(args.snapshot, args.chroma)
+        print(f"✅ {count} chunks restaurados en {args.chroma}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Catálogo de fuentes: autor, obra y partición del índice de cada PDF de `data/`.
+
+La ingesta etiqueta cada chunk con estos metadatos y construye un índice por
+partición (ver core/partitions.py). Las búsquedas pueden filtrar por autor,
+obra o fuente, y los tópicos declaran sus particiones por defecto en
+core/topics.py. Los PDFs que no están en el catálogo van a la partición "general".
+"""
+
+import json
+import os
+import threading
+from typing import Dict, Iterable, List, Optional
+
+from .topics import TOPIC_PARTITIONS
+
+DATA_PATH = "data"
+CATALOG_PATH = os.path.join(DATA_PATH, "catalog.json")
+DEFAULT_PARTITION = "general"
+UNKNOWN_AUTHOR = "Desconocido"
+
+# Metadatos que la ingesta añade a cada chunk
+CATALOG_FIELDS = ("author", "work", "partition", "source_name")
+
+class FiltersNotIndexed(LookupError):
+    """Los filtros están en el catálogo, pero ningún chunk del índice activo los cumple"""
+
+
+_catalog_cache = {"mtime": None, "sources": {}}
+_catalog_lock = threading.Lock()
+
+
+def load_catalog(path: str = CATALOG_PATH) -> Dict[str, Dict[str, str]]:
+    """
+    Catálogo {nombre de archivo: {author, work, partition}}.
+    Se vuelve a leer solo si el archivo cambió
+    """
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return {}
+    with _catalog_lock:
+        if _catalog_cache["mtime"] != mtime:
+            with open(path, encoding="utf-8") as f:
+                _catalog_cache["sources"] = json.load(f).get("sources", {})
+            _catalog_cache["mtime"] = mtime
+        return _catalog_cache["sources"]
+
+
+def describe_source(source: str) -> Dict[str, str]:
+    """Metadatos de catálogo de una fuente (ruta o nombre de archivo)"""
+    source_name = os.path.basename(source)
+    entry = load_catalog().get(source_name, {})
+    return {
+        "author": entry.get("author", UNKNOWN_AUTHOR),
+        "work": entry.get("work", os.path.splitext(source_name)[0]),
+        "partition": entry.get("partition", DEFAULT_PARTITION),
+        "source_name": source_name,
+    }
+
+
+def tag_chunks(chunks):
+    """Añade autor, obra, partición y nombre de archivo a los metadatos de cada chunk"""
+    for chunk in chunks:
+        chunk.metadata.update(describe_source(chunk.metadata.get("source", "")))
+    return chunks
+
+
+def _matches(value: str, accepted: Iterable[str]) -> bool:
+    return value.casefold() in {a.casefold() for a in accepted}
+
+
+def resolve_search_filters(
+    topic: Optional[str] = None,
+    authors: Optional[List[str]] = None,
+    works: Optional[List[str]] = None,
+    sources: Optional[List[str]] = None,
+) -> Optional[Dict[str, Optional[List[str]]]]:
+    """
+    Traduce los filtros de una búsqueda a particiones del índice y fuentes.
+
+    Los autores se aceptan por nombre o por partición ("levinas") y las obras
+    por título, sin distinguir mayúsculas. Sin filtros se usan las particiones
+    por defecto del tópico; si tampoco tiene, retorna None (todo el corpus).
+
+    Returns:
+        {"partitions": [...], "sources": [...] o None}; `sources` es None
+        cuando las particiones completas ya cumplen los filtros
+
+    Raises:
+        ValueError: si un autor u obra no está en el catálogo, o si ninguna
+        fuente cumple todos los filtros
+    """
+    catalog = {name: describe_source(name) for name in load_catalog()}
+    for name in sources or []:
+        catalog.setdefault(os.path.basename(name), describe_source(name))
+
+    if not (authors or works or sources):
+        default_partitions = TOPIC_PARTITIONS.get(topic)
+        if not default_partitions:
+            return None
+        return {"partitions": sorted(default_partitions), "sources": None}
+
+    known_authors = {i["author"] for i in catalog.values()} | {
+        i["partition"] for i in catalog.values()
+    }
+    for author in authors or []:
+        if not _matches(author, known_authors):
+            raise ValueError(f"Autor no encontrado en el catálogo: {author}")
+    for work in works or []:
+        if not _matches(work, {i["work"] for i in catalog.values()}):
+            raise ValueError(f"Obra no encontrada en el catálogo: {work}")
+
+    selected = {
+        name: info
+        for name, info in catalog.items()
+        if (
+            not authors
+            or _matches(info["author"], authors)
+            or _matches(info["partition"], authors)
+        )
+        and (not works or _matches(info["work"], works))
+        and (not sources or name in {os.path.basename(s) for s in sources})
+    }
+    if not selected:
+        raise ValueError("Ninguna fuente del catálogo cumple todos los filtros")
+
+    partitions = sorted({info["partition"] for info in selected.values()})
+    # La partición general puede tener fuentes fuera del catálogo
+    whole_partitions = DEFAULT_PARTITION not in partitions and all(
+        name in selected
+        for name, info in catalog.items()
+        if info["partition"] in partitions
+    )
+    return {
+        "partitions": partitions,
+        "sources": None if whole_partitions else sorted(selected),
+    }
+
+
+def require_indexed(search_filters: Optional[Dict[str, Optional[List[str]]]], hits) -> None:
+    """
+    Falla con FiltersNotIndexed si una búsqueda filtrada no encontró ningún
+    chunk (`hits`, uno por consulta): las fuentes que piden los filtros están
+    en el catálogo pero no en el índice, y sin contexto la respuesta no
+    tendría base en el corpus
+    """
+    if search_filters and not any(hits):
+        wanted = search_filters.get("sources") or search_filters["partitions"]
+        raise FiltersNotIndexed(
+            f"Ninguna fuente indexada cumple los filtros ({', '.join(wanted)}); "
+            "están en el catálogo pero no en el índice activo"
+        )
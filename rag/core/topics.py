@@ -0,0 +1,22 @@
+"""
+Tópicos éticos e intensidades disponibles para generar dilemas
+"""
+
+TOPICS = [
+    "Temporalidad Moral",
+    "Alteridad Radical",
+    "Imperativo de Universalización",
+    "Ontología de la Ignorancia",
+    "Economía Moral del Deseo",
+    "Microética Cotidiana",
+]
+
+INTENSITIES = ["Suave", "Medio", "Extremo"]
+
+# Particiones del índice (ver data/catalog.json) donde se busca el contexto de
+# cada tópico si la petición no trae filtros. Los tópicos sin entrada buscan
+# en todo el corpus
+TOPIC_PARTITIONS = {
+    "Temporalidad Moral": ["jonas", "dilemas"],
+    "Alteridad Radical": ["levinas", "butler", "dilemas"],
+}
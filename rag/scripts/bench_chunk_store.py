@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Benchmark de memoria del camino de servicio: Documents de LangChain frente al
+almacén compacto de chunks (core/chunk_store.py).
+
+Para cada consulta de producción (todos los tópicos e intensidades) hace la
+búsqueda y arma el contexto del prompt igual que generate_dilemma_rag, por los
+dos caminos, y mide con tracemalloc la memoria Python reservada por petición
+(pico y lo que queda retenido en los resultados) y la latencia. Además compara
+la memoria residente de todo el corpus como lista de Documents y como ChunkStore.
+
+Los vectores de las consultas se calculan antes de medir. Usa el índice activo
+(o --chroma) y el embedding configurado (RAG_EMBEDDING_BACKEND=hash sin red).
+
+Uso (desde rag/):
+    python scripts/bench_chunk_store.py
+    python scripts/bench_chunk_store.py --k 10 --repeat 20 --output chunks.json
+"""
+
+import argparse
+import gc
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+RAG_DIR = Path(__file__).parent.parent
+sys.path.append(str(RAG_DIR))
+from core.bulk_generate import percentile
+from core.chunk_store import (
+    UNKNOWN_SOURCE,
+    build_chunk_store,
+    get_chunk_store,
+    search_chunks,
+)
+from core.config import load_environment
+from core.generate_dilemma_rag import build_search_query
+from core.index_store import close_store, live_index_path, open_store
+from core.partitions import search_by_vectors
+from core.source_catalog import resolve_search_filters
+from core.topics import INTENSITIES, TOPICS
+
+
+def documents_path(store, query_embedding, k, search_filters):
+    """Camino anterior: Documents y formateo por resultado"""
+    results = search_by_vectors(store, [query_embedding], k, search_filters)[0]
+    context_text = "\n\n---\n\n".join(
+        [
+            f"Fuente: {doc.metadata.get('source', UNKNOWN_SOURCE)}\n{doc.page_content}"
+            for doc, _score in results
+        ]
+    )
+    sources = [doc.metadata.get("source", UNKNOWN_SOURCE) for doc, _ in results]
+    return context_text, sources, results
+
+
+def chunks_path(store, query_embedding, k, search_filters):
+    """Camino compacto: ids, y el texto se corta del buffer al armar el contexto"""
+    chunks, hits = search_chunks(store, [query_embedding], k, search_filters)
+    positions = [position for position, _distance in hits[0]]
+    return chunks.context(positions, with_source=True), chunks.sources(positions), hits
+
+
+def measure(path, store, queries, k, repeat):
+    """Memoria por petición con tracemalloc y latencia en una pasada aparte"""
+    peaks, retained = [], []
+    tracemalloc.start()
+    for _ in range(repeat):
+        for query_embedding, search_filters in queries:
+            gc.collect()
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            result = path(store, query_embedding, k, search_filters)
+            current, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+            retained.append(current - before)
+            del result
+    tracemalloc.stop()
+
+    latencies = []
+    for _ in range(repeat):
+        for query_embedding, search_filters in queries:
+            start = time.perf_counter()
+            path(store, query_embedding, k, search_filters)
+            latencies.append((time.perf_counter() - start) * 1000)
+    return {
+        "peak_kib_mean": statistics.mean(peaks) / 1024,
+        "peak_kib_p95": percentile(peaks, 0.95) / 1024,
+        "retained_kib_mean": statistics.mean(retained) / 1024,
+        "latency_ms_p50": percentile(latencies, 0.5),
+        "latency_ms_p95": percentile(latencies, 0.95),
+    }
+
+
+def resident(build):
+    """Memoria Python que queda retenida tras construir una representación"""
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    value = build()
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return value, current - before
+
+
+def corpus_documents(collection):
+    from langchain_core.documents import Document
+
+    data = collection.get(include=["documents", "metadatas"])
+    return [
+        Document(page_content=text, metadata=metadata)
+        for text, metadata in zip(data["documents"], data["metadatas"])
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del almacén de chunks")
+    parser.add_argument(
+        "--chroma", type=str, help="Versión del índice (por defecto la activa)"
+    )
+    parser.add_argument("--k", type=int, default=6, help="Documentos por consulta")
+    parser.add_argument("--repeat", type=int, default=10, help="Repeticiones por consulta")
+    parser.add_argument("--output", type=str, help="Guardar resultados en JSON")
+    args = parser.parse_args()
+
+    load_environment()
+    path = args.chroma or live_index_path()
+    store = open_store(path)
+    try:
+        queries = []
+        for topic in TOPICS:
+            for intensity in INTENSITIES:
+                queries.append(
+                    (
+                        store.embeddings.embed_query(build_search_query(topic, intensity)),
+                        resolve_search_filters(topic),
+                    )
+                )
+        print(f"📚 {path}: {store._collection.count()} chunks, {len(queries)} consultas")
+
+        # Calentar ambos caminos (y construir el almacén) fuera de la medición
+        get_chunk_store(store)
+        for run in (documents_path, chunks_path):
+            run(store, queries[0][0], args.k, queries[0][1])
+
+        results = {
+            name: measure(run, store, queries, args.k, args.repeat)
+            for name, run in (("documents", documents_path), ("chunks", chunks_path))
+        }
+
+        documents, documents_bytes = resident(lambda: corpus_documents(store._collection))
+        del documents
+        chunks, chunks_bytes = resident(lambda: build_chunk_store(store._collection))
+        results["resident_kib"] = {
+            "documents": documents_bytes / 1024,
+            "chunks": chunks_bytes / 1024,
+        }
+    finally:
+        close_store(store)
+
+    print(
+        f"\n{'camino':<10} {'pico KiB':>10} {'p95 KiB':>9} {'retenido KiB':>13} "
+        f"{'p50 ms':>8} {'p95 ms':>8}"
+    )
+    for name in ("documents", "chunks"):
+        r = results[name]
+        print(
+            f"{name:<10} {r['peak_kib_mean']:>10.1f} {r['peak_kib_p95']:>9.1f} "
+            f"{r['retained_kib_mean']:>13.1f} {r['latency_ms_p50']:>8.2f} "
+            f"{r['latency_ms_p95']:>8.2f}"
+        )
+    resident_kib = results["resident_kib"]
+    print(
+        f"\n🧱 Corpus en memoria: Documents {resident_kib['documents']:.0f} KiB, "
+        f"ChunkStore {resident_kib['chunks']:.0f} KiB "
+        f"({len(chunks)} chunks, buffer {chunks.nbytes / 1024:.0f} KiB)"
+    )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+        print(f"\n💾 Resultados guardados en {args.output}")
+
+
+if __name__ == "__main__":
+    main()
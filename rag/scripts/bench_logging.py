@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Benchmark del coste del logging por petición en el hilo que atiende la petición.
+
+Reproduce los registros que genera una petición a /generate-dilemma (ruta y
+generate_dilemma_with_rag) con varios hilos a la vez, como los workers de
+asyncio.to_thread, y mide cuánto tarda cada petición en emitirlos:
+
+- print: como antes, `print` de la respuesta completa del LLM y demás datos a
+  stdout y logging.basicConfig síncrono con el contexto del usuario en INFO
+- queue: core/log_config.py en texto (cola, contenidos en DEBUG y muestreados)
+- queue-json: igual, en JSON
+- queue-debug: cola con DEBUG y contenidos en todas las peticiones (peor caso)
+
+La salida va a un archivo temporal o, con --sink-latency-ms, a un destino que
+tarda en cada escritura (una tubería de logs saturada, como la de un contenedor).
+
+Uso (desde rag/):
+    python scripts/bench_logging.py
+    python scripts/bench_logging.py --threads 16 --requests 4000 --sink-latency-ms 0.2
+"""
+
+import argparse
+import contextlib
+import json
+import logging
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+RAG_DIR = Path(__file__).parent.parent
+sys.path.append(str(RAG_DIR))
+from core.bulk_generate import percentile
+from core.log_config import (
+    configure_logging,
+    log_payload,
+    shutdown_logging,
+    start_request,
+)
+from core.metrics import LOG_RECORDS_DROPPED
+from core.mock_llm import MOCK_DILEMMA
+
+MODES = ("print", "queue", "queue-json", "queue-debug")
+
+RESPONSE_TEXT = json.dumps(MOCK_DILEMMA, ensure_ascii=False, indent=2)
+USER_CONTEXT = "Usuario empático con 3 respuestas previas sobre responsabilidad"
+
+routes_logger = logging.getLogger("api.routes")
+rag_logger = logging.getLogger("core.generate_dilemma_rag")
+
+
+class SlowSink:
+    """Archivo en el que cada escritura tarda `latency` segundos"""
+
+    def __init__(self, stream, latency: float):
+        self.stream = stream
+        self.latency = latency
+
+    def write(self, text: str):
+        if self.latency:
+            time.sleep(self.latency)
+        return self.stream.write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+
+def print_request(sink):
+    """Registros de una petición antes de log_config"""
+    routes_logger.info(f"🎯 Generando dilema: Alteridad Radical | Medio")
+    routes_logger.info(f"👤 Contexto de usuario: {USER_CONTEXT}")
+    print("📚 Base de datos cargada correctamente", file=sink)
+    print(f"🔍 Encontrados {6} documentos relevantes", file=sink)
+    print("🤖 Respuesta generada:", file=sink)
+    print(RESPONSE_TEXT, file=sink)
+    routes_logger.info(f"✅ Dilema generado exitosamente en {2401.7:.2f}ms")
+
+
+def queue_request(sink):
+    """Registros de una petición con log_config"""
+    start_request()
+    routes_logger.info("🎯 Generando dilema: %s | %s", "Alteridad Radical", "Medio")
+    log_payload(routes_logger, "👤 Contexto de usuario: %s", USER_CONTEXT)
+    rag_logger.debug("📚 Base de datos cargada correctamente")
+    rag_logger.debug("🔍 Encontrados %d documentos relevantes", 6)
+    log_payload(rag_logger, "🤖 Respuesta generada:\n%s", RESPONSE_TEXT)
+    routes_logger.info("✅ Dilema generado exitosamente en %.2fms", 2401.7)
+
+
+def configure(mode: str, sink, sample_rate: float):
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    for name in ("api.routes", "core.generate_dilemma_rag"):
+        logging.getLogger(name).setLevel(logging.NOTSET)
+    shutdown_logging()
+    if mode == "print":
+        logging.basicConfig(level=logging.INFO, stream=sink, force=True)
+        return print_request
+    if mode == "queue-debug":
+        configure_logging(level="DEBUG", stream=sink, sample_rate=1.0)
+    else:
+        configure_logging(
+            fmt="json" if mode == "queue-json" else "text",
+            stream=sink,
+            sample_rate=sample_rate,
+        )
+    return queue_request
+
+
+def run(mode: str, args, sink):
+    emit = configure(mode, sink, args.sample_rate)
+    dropped = LOG_RECORDS_DROPPED.value()
+    latencies = [[] for _ in range(args.threads)]
+    per_thread = args.requests // args.threads
+    barrier = threading.Barrier(args.threads)
+
+    def worker(index: int):
+        barrier.wait()
+        for _ in range(per_thread):
+            start = time.perf_counter()
+            emit(sink)
+            latencies[index].append((time.perf_counter() - start) * 1_000_000)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    # Lo que quede en la cola se escribe fuera de la medición
+    shutdown_logging()
+
+    values = [v for thread_values in latencies for v in thread_values]
+    return {
+        "mean_us": statistics.mean(values),
+        "p50_us": percentile(values, 0.5),
+        "p99_us": percentile(values, 0.99),
+        "requests_per_s": len(values) / elapsed,
+        "dropped": LOG_RECORDS_DROPPED.value() - dropped,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del logging por petición")
+    parser.add_argument("--threads", type=int, default=8, help="Hilos emitiendo a la vez")
+    parser.add_argument("--requests", type=int, default=2000, help="Peticiones en total")
+    parser.add_argument(
+        "--sink-latency-ms",
+        type=float,
+        default=0.0,
+        help="Latencia de cada escritura del destino de los logs",
+    )
+    parser.add_argument(
+        "--sample-rate", type=float, default=0.01, help="Muestreo de contenidos (queue)"
+    )
+    parser.add_argument("--modes", type=str, default=",".join(MODES))
+    parser.add_argument("--output", type=str, help="Guardar resultados en JSON")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryFile("w+", encoding="utf-8") as log_file:
+        sink = SlowSink(log_file, args.sink_latency_ms / 1000)
+        for mode in args.modes.split(","):
+            # La salida del benchmark no debe mezclarse con la de los logs
+            with contextlib.redirect_stdout(sink):
+                results[mode] = run(mode, args, sink)
+        written_kib = log_file.tell() / 1024
+
+    print(
+        f"🧪 {args.requests} peticiones, {args.threads} hilos, "
+        f"destino {args.sink_latency_ms}ms por escritura, "
+        f"muestreo {args.sample_rate:.0%}"
+    )
+    print(f"\n{'modo':<12} {'media µs':>10} {'p50 µs':>9} {'p99 µs':>10} {'pet/s':>10} {'descartados':>12}")
+    for mode, r in results.items():
+        print(
+            f"{mode:<12} {r['mean_us']:>10.1f} {r['p50_us']:>9.1f} "
+            f"{r['p99_us']:>10.1f} {r['requests_per_s']:>10.0f} {r['dropped']:>12.0f}"
+        )
+    print(f"\n📝 {written_kib:.0f} KiB escritos en total")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+        print(f"\n💾 Resultados guardados en {args.output}")
+
+
+if __name__ == "__main__":
+    main()
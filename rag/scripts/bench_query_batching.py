@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la agrupación de consultas (core/query_batcher.py) sin red.
+
+Levanta el mock de OpenAI (scripts/mock_openai.py) con la latencia de
+embeddings indicada, construye un índice sintético y lanza búsquedas de
+contexto (embedding + búsqueda vectorial, como /generate-dilemma) desde
+varios hilos a la vez, cada consulta por su cuenta ("direct") o agrupadas con
+cada ventana de --windows. Reporta consultas/s, latencia p50/p99 y cuántas
+peticiones de embedding llegaron al mock.
+
+Uso (desde rag/):
+    python scripts/bench_query_batching.py
+    python scripts/bench_query_batching.py --threads 64 --queries 2000 \\
+        --embedding-latency lognormal:80:0.3 --windows 2,5,10 --output batching.json
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+RAG_DIR = Path(__file__).parent.parent
+sys.path.append(str(RAG_DIR))
+from load_test import build_synthetic_index, free_port, wait_for_http
+
+from core.bulk_generate import percentile
+from core.chunk_store import search_chunks
+from core.generate_dilemma_rag import build_search_query
+from core.metrics import UPSTREAM_REQUESTS
+from core.topics import INTENSITIES, TOPICS
+
+
+def upstream_requests() -> float:
+    return sum(
+        UPSTREAM_REQUESTS.value(http_version=version, connection=connection)
+        for version in ("HTTP/1.1", "HTTP/2")
+        for connection in ("new", "reused")
+    )
+
+
+def queries(count: int):
+    """Consultas distintas (tópico, intensidad y un contexto de usuario que varía)"""
+    return [
+        build_search_query(
+            TOPICS[i % len(TOPICS)],
+            INTENSITIES[i % len(INTENSITIES)],
+            f"respuesta previa número {i}",
+        )
+        for i in range(count)
+    ]
+
+
+def run(store, texts, threads: int, k: int, batcher=None):
+    latencies = []
+    lock = threading.Lock()
+    pending = iter(texts)
+    barrier = threading.Barrier(threads)
+
+    def search_direct(text):
+        embedding = store.embeddings.embed_query(text)
+        return search_chunks(store, [embedding], k=k)
+
+    def worker():
+        barrier.wait()
+        own = []
+        while True:
+            with lock:
+                text = next(pending, None)
+            if text is None:
+                break
+            start = time.perf_counter()
+            if batcher is None:
+                search_direct(text)
+            else:
+                batcher.search(store, text, k)
+            own.append((time.perf_counter() - start) * 1000)
+        with lock:
+            latencies.extend(own)
+
+    before = upstream_requests()
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return {
+        "queries_per_s": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 0.5),
+        "p99_ms": percentile(latencies, 0.99),
+        "embedding_requests": upstream_requests() - before,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la agrupación de consultas")
+    parser.add_argument("--threads", type=int, default=32, help="Hilos buscando a la vez")
+    parser.add_argument("--queries", type=int, default=1000, help="Consultas en total")
+    parser.add_argument("--k", type=int, default=6)
+    parser.add_argument(
+        "--windows", type=str, default="2,5,10", help="Ventanas en ms a comparar"
+    )
+    parser.add_argument("--max-batch", type=int, default=32)
+    parser.add_argument("--max-inflight", type=int, default=4)
+    parser.add_argument("--embedding-latency", type=str, default="fixed:40")
+    parser.add_argument("--corpus-chunks", type=int, default=2000)
+    parser.add_argument("--output", type=str, help="Guardar resultados en JSON")
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="rag_batching_"))
+    mock_url = f"http://127.0.0.1:{free_port()}"
+    os.environ.update(
+        OPENAI_API_KEY="mock",
+        OPENAI_API_BASE=f"{mock_url}/v1",
+        OPENAI_BASE_URL=f"{mock_url}/v1",
+        RAG_EMBEDDING_TOKENIZE="0",
+        RAG_EMBEDDING_BACKEND="openai",
+    )
+    mock = subprocess.Popen(
+        [
+            sys.executable,
+            str(RAG_DIR / "scripts" / "mock_openai.py"),
+            "--port",
+            mock_url.rsplit(":", 1)[1],
+            "--embedding-latency",
+            args.embedding_latency,
+        ],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    results = {}
+    try:
+        wait_for_http(f"{mock_url}/docs")
+        print(f"📚 Construyendo índice sintético ({args.corpus_chunks} chunks)")
+        build_synthetic_index(workdir, args.corpus_chunks, seed=7)
+
+        from core.index_store import close_store, open_store
+        from core.query_batcher import QueryBatcher
+
+        store = open_store(str(workdir / "chroma"))
+        texts = queries(args.queries)
+        # Calentamiento: almacén compacto de chunks y conexiones al mock
+        run(store, texts[: args.threads], args.threads, args.k)
+
+        print(f"⏱️  {args.queries} consultas desde {args.threads} hilos")
+        results["direct"] = run(store, texts, args.threads, args.k)
+        for window in args.windows.split(","):
+            batcher = QueryBatcher(
+                window_ms=float(window),
+                max_size=args.max_batch,
+                max_inflight=args.max_inflight,
+            )
+            results[f"batch {window}ms"] = run(
+                store, texts, args.threads, args.k, batcher
+            )
+        close_store(store)
+    finally:
+        mock.terminate()
+        mock.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(
+        f"\n{'modo':<12} {'consultas/s':>12} {'p50 ms':>9} {'p99 ms':>9} {'embeddings':>11}"
+    )
+    for mode, r in results.items():
+        print(
+            f"{mode:<12} {r['queries_per_s']:>12.1f} {r['p50_ms']:>9.1f} "
+            f"{r['p99_ms']:>9.1f} {r['embedding_requests']:>11.0f}"
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+        print(f"\n💾 Resultados guardados en {args.output}")
+
+
+if __name__ == "__main__":
+    main()
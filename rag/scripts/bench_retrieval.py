@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+Benchmark de calidad y latencia de recuperación sobre los PDFs de rag/data.
+
+Evalúa cada combinación de chunking, embedding, backend de índice y k con las
+consultas etiquetadas de scripts/fixtures/retrieval_queries.json (todos los
+tópicos e intensidades de /topics) y muestra en una tabla recall@k, MRR,
+latencia de consulta, tamaño del índice y tiempo de construcción.
+
+Por defecto usa el embedding local determinista ("hash"), así que funciona sin red.
+
+Uso:
+    python scripts/bench_retrieval.py
+    python scripts/bench_retrieval.py --chunk-sizes 400,800,1200 --ks 4,6,10 \\
+        --backends chroma,exact --dimensions 256,384,768 --output bench.json
+"""
+
+import argparse
+import itertools
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+RAG_DIR = Path(__file__).parent.parent
+sys.path.append(str(RAG_DIR))
+from core.create_database import calculate_chunk_ids, load_documents, split_documents
+from core.generate_dilemma_rag import build_search_query
+from core.get_embedding_function import get_embedding_function
+from core.local_embeddings import HashingEmbeddings
+from core.source_catalog import describe_source, resolve_search_filters
+
+QUERIES_PATH = RAG_DIR / "scripts" / "fixtures" / "retrieval_queries.json"
+
+
+def int_list(value: str):
+    return [int(v) for v in value.split(",") if v]
+
+
+def load_queries():
+    """Consultas del fixture más la consulta de producción de cada celda"""
+    with open(QUERIES_PATH, encoding="utf-8") as f:
+        fixture = json.load(f)
+
+    queries = []
+    for item in fixture["queries"]:
+        relevant = {(r["source"], r["page"]) for r in item["relevant"]}
+        queries.append(
+            {
+                "id": item["id"],
+                "topic": item["topic"],
+                "text": item["query"],
+                "relevant": relevant,
+            }
+        )
+        queries.append(
+            {
+                "id": f"{item['id']}-prod",
+                "topic": item["topic"],
+                "text": build_search_query(item["topic"], item["intensity"]),
+                "relevant": relevant,
+            }
+        )
+    return queries
+
+
+def directory_size(path: str) -> int:
+    total = 0
+    for root, _dirs, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total
+
+
+class ChromaBackend:
+    """Índice HNSW de Chroma (el backend de producción)"""
+
+    name = "chroma"
+
+    def __init__(self, chunks, vectors):
+        import chromadb
+
+        self.path = tempfile.mkdtemp(prefix="rag_bench_")
+        self.client = chromadb.PersistentClient(path=self.path)
+        self.collection = self.create_collection("bench", chunks, vectors)
+
+    def create_collection(self, name, chunks, vectors):
+        collection = self.client.create_collection(name)
+        ids = [chunk.metadata["id"] for chunk in chunks]
+        metadatas = [
+            {"source": chunk.metadata["source"], "page": chunk.metadata["page"]}
+            for chunk in chunks
+        ]
+        for start in range(0, len(chunks), 1000):
+            end = start + 1000
+            collection.add(
+                ids=ids[start:end],
+                embeddings=vectors[start:end].tolist(),
+                metadatas=metadatas[start:end],
+            )
+        return collection
+
+    def search(self, query_vector, k, topic=None):
+        return [
+            (m["source"], m["page"])
+            for m, _ in self.query(self.collection, query_vector, k)
+        ]
+
+    @staticmethod
+    def query(collection, query_vector, k):
+        result = collection.query(
+            query_embeddings=[query_vector.tolist()],
+            n_results=k,
+            include=["metadatas", "distances"],
+        )
+        return list(zip(result["metadatas"][0], result["distances"][0]))
+
+    def size_bytes(self):
+        return directory_size(self.path)
+
+    def close(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+class PartitionedBackend(ChromaBackend):
+    """
+    Como en producción: la colección completa más una por partición del
+    catálogo; cada consulta busca solo en las particiones por defecto de su
+    tópico, o en la colección completa si el tópico no tiene
+    """
+
+    name = "partitioned"
+
+    def __init__(self, chunks, vectors):
+        import chromadb
+
+        self.path = tempfile.mkdtemp(prefix="rag_bench_")
+        self.client = chromadb.PersistentClient(path=self.path)
+        self.collection = self.create_collection("bench", chunks, vectors)
+        partitions = {}
+        for index, chunk in enumerate(chunks):
+            partition = describe_source(chunk.metadata["source"])["partition"]
+            partitions.setdefault(partition, []).append(index)
+        self.collections = {
+            partition: self.create_collection(
+                f"partition_{partition}", [chunks[i] for i in indices], vectors[indices]
+            )
+            for partition, indices in partitions.items()
+        }
+
+    def search(self, query_vector, k, topic=None):
+        search_filters = resolve_search_filters(topic)
+        if not search_filters:
+            return super().search(query_vector, k)
+        results = []
+        for partition in search_filters["partitions"]:
+            if partition in self.collections:
+                results.extend(self.query(self.collections[partition], query_vector, k))
+        results.sort(key=lambda item: item[1])
+        return [(m["source"], m["page"]) for m, _ in results[:k]]
+
+
+class ExactBackend:
+    """Búsqueda exacta por producto punto sobre una matriz numpy"""
+
+    name = "exact"
+
+    def __init__(self, chunks, vectors):
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        self.matrix = vectors / np.where(norms == 0, 1, norms)
+        self.keys = [(c.metadata["source"], c.metadata["page"]) for c in chunks]
+
+    def search(self, query_vector, k, topic=None):
+        scores = self.matrix @ query_vector
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [self.keys[i] for i in top]
+
+    def size_bytes(self):
+        return self.matrix.nbytes
+
+    def close(self):
+        pass
+
+
+BACKENDS = {
+    "chroma": ChromaBackend,
+    "partitioned": PartitionedBackend,
+    "exact": ExactBackend,
+}
+
+
+def evaluate(backend, embeddings, queries, k, repeat):
+    """recall@k y MRR medios, y latencias (embedding + búsqueda) en ms"""
+    recalls, reciprocal_ranks, latencies = [], [], []
+    for query in queries:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            vector = np.asarray(embeddings.embed_query(query["text"]), dtype=np.float32)
+            retrieved = backend.search(vector, k, topic=query["topic"])
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        # Las fuentes se comparan por nombre de archivo
+        pages = [(os.path.basename(source), page) for source, page in retrieved]
+        relevant = query["relevant"]
+        recalls.append(len(relevant & set(pages)) / len(relevant))
+        rank = next((i + 1 for i, p in enumerate(pages) if p in relevant), None)
+        reciprocal_ranks.append(1 / rank if rank else 0.0)
+
+    latencies.sort()
+    return {
+        "recall": float(np.mean(recalls)),
+        "mrr": float(np.mean(reciprocal_ranks)),
+        "latency_p50_ms": float(np.percentile(latencies, 50)),
+        "latency_p95_ms": float(np.percentile(latencies, 95)),
+    }
+
+
+def embedding_configs(args):
+    if args.embedding == "hash":
+        return [(f"hash-{d}", HashingEmbeddings(d)) for d in args.dimensions]
+    return [(args.embedding, get_embedding_function(args.embedding))]
+
+
+def print_table(rows):
+    header = (
+        f"{'chunk':>6}{'ovl':>5} {'embedding':<12}{'backend':<12}{'k':>3}{'chunks':>8}"
+        f"{'recall@k':>10}{'MRR':>7}{'p50 ms':>9}{'p95 ms':>9}{'index MB':>10}{'build s':>9}"
+    )
+    print("\n" + header)
+    print("-" * len(header))
+    for r in rows:
+        print(
+            f"{r['chunk_size']:>6}{r['chunk_overlap']:>5} {r['embedding']:<12}"
+            f"{r['backend']:<12}{r['k']:>3}{r['chunks']:>8}{r['recall']:>10.3f}"
+            f"{r['mrr']:>7.3f}{r['latency_p50_ms']:>9.2f}{r['latency_p95_ms']:>9.2f}"
+            f"{r['index_bytes'] / (1 << 20):>10.2f}{r['build_s']:>9.2f}"
+        )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark de recuperación")
+    parser.add_argument("--data", type=str, default=str(RAG_DIR / "data"))
+    parser.add_argument("--chunk-sizes", type=int_list, default=[800])
+    parser.add_argument("--overlaps", type=int_list, default=[100])
+    parser.add_argument("--ks", type=int_list, default=[4, 6, 10])
+    parser.add_argument(
+        "--backends",
+        type=lambda v: v.split(","),
+        default=["chroma", "partitioned", "exact"],
+    )
+    parser.add_argument(
+        "--embedding",
+        type=str,
+        default="hash",
+        choices=["hash", "openai"],
+        help="hash = local y determinista (sin red)",
+    )
+    parser.add_argument("--dimensions", type=int_list, default=[384])
+    parser.add_argument("--repeat", type=int, default=3, help="Repeticiones por consulta")
+    parser.add_argument("--output", type=str, help="Guardar resultados en JSON")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    print("📏 BENCHMARK DE RECUPERACIÓN")
+    print("=" * 60)
+
+    queries = load_queries()
+    print(f"❓ {len(queries)} consultas etiquetadas")
+
+    start = time.perf_counter()
+    documents = load_documents(args.data)
+    print(f"📄 {len(documents)} páginas cargadas en {time.perf_counter() - start:.1f}s")
+
+    rows = []
+    for chunk_size, overlap in itertools.product(args.chunk_sizes, args.overlaps):
+        chunks = calculate_chunk_ids(split_documents(documents, chunk_size, overlap))
+        texts = [chunk.page_content for chunk in chunks]
+
+        for embedding_name, embeddings in embedding_configs(args):
+            start = time.perf_counter()
+            vectors = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+            embed_s = time.perf_counter() - start
+            print(
+                f"🔢 chunk={chunk_size}/{overlap} {embedding_name}: "
+                f"{len(chunks)} chunks embebidos en {embed_s:.1f}s"
+            )
+
+            for backend_name in args.backends:
+                start = time.perf_counter()
+                backend = BACKENDS[backend_name](chunks, vectors)
+                build_s = embed_s + time.perf_counter() - start
+                try:
+                    for k in args.ks:
+                        result = evaluate(backend, embeddings, queries, k, args.repeat)
+                        rows.append(
+                            {
+                                "chunk_size": chunk_size,
+                                "chunk_overlap": overlap,
+                                "embedding": embedding_name,
+                                "backend": backend_name,
+                                "k": k,
+                                "chunks": len(chunks),
+                                "index_bytes": backend.size_bytes(),
+                                "build_s": build_s,
+                                **result,
+                            }
+                        )
+                finally:
+                    backend.close()
+
+    print_table(rows)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "results": rows}, f, indent=2)
+        print(f"\n💾 Resultados guardados en {args.output}")
+
+
+if __name__ == "__main__":
+    main()
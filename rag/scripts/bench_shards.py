@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la búsqueda repartida en shards (core/shards.py).
+
+Reparte el índice activo (o --chroma) en cada número de shards de --shards
+con los vectores ya calculados, levanta un proceso core/shard_server.py por
+shard y lanza búsquedas (los k chunks más cercanos con sus textos, como
+/generate-dilemma) desde varios hilos a la vez a través de ShardedStore.
+"0" es la línea base: el índice sin shards buscado en el mismo proceso.
+Reporta consultas/s, latencia p50/p99, búsquedas con resultados parciales y
+la memoria residente de cada proceso de shard.
+
+Con --fault stop|kill se detiene (SIGSTOP) o se mata (SIGKILL) el último
+shard a mitad de la medición, para ver cuánto cuesta un shard lento o caído.
+
+Los vectores de las consultas se calculan antes de medir con el embedding
+configurado (RAG_EMBEDDING_BACKEND=hash sin red).
+
+Uso (desde rag/):
+    python scripts/bench_shards.py
+    python scripts/bench_shards.py --shards 0,1,2,4 --threads 32 --queries 4000 \\
+        --fault stop --output shards.json
+"""
+
+import argparse
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+RAG_DIR = Path(__file__).parent.parent
+sys.path.append(str(RAG_DIR))
+from load_test import free_port, wait_for_http
+
+from core.bulk_generate import percentile
+from core.chunk_store import get_chunk_store, search_chunks
+from core.config import load_environment
+from core.generate_dilemma_rag import build_search_query
+from core.get_embedding_function import get_embedding_function
+from core.index_store import (
+    CHROMA_PATH,
+    close_store,
+    live_index_path,
+    new_version_path,
+    open_store,
+    publish_version,
+)
+from core.metrics import SHARD_PARTIAL_RESULTS
+from core.shards import ShardedStore, reshard_version
+from core.topics import INTENSITIES, TOPICS
+
+
+def queries(count: int):
+    """Consultas distintas (tópico, intensidad y un contexto de usuario que varía)"""
+    return [
+        build_search_query(
+            TOPICS[i % len(TOPICS)],
+            INTENSITIES[i % len(INTENSITIES)],
+            f"respuesta previa número {i}",
+        )
+        for i in range(count)
+    ]
+
+
+def rss_mib(pid: int) -> float:
+    """Memoria residente de un proceso (Linux, 0 si no se puede leer)"""
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def start_shards(root: Path, shards: int):
+    processes, urls = [], []
+    for shard in range(shards):
+        port = free_port()
+        urls.append(f"http://127.0.0.1:{port}")
+        processes.append(
+            subprocess.Popen(
+                [
+                    sys.executable,
+                    "-m",
+                    "core.shard_server",
+                    "--shard",
+                    str(shard),
+                    "--port",
+                    str(port),
+                    "--root",
+                    str(root),
+                ],
+                cwd=RAG_DIR,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+        )
+    for url in urls:
+        wait_for_http(f"{url}/health")
+    return processes, urls
+
+
+def stop_shards(processes):
+    for process in processes:
+        if process.poll() is None:
+            # Un shard detenido con SIGSTOP no atiende SIGTERM
+            process.send_signal(signal.SIGCONT)
+            process.terminate()
+    for process in processes:
+        process.wait()
+
+
+def run(store, vectors, threads: int, k: int, fault=None):
+    """
+    Búsquedas desde `threads` hilos. `fault` se llama una vez cuando va la
+    mitad de las consultas
+    """
+    latencies = []
+    failures = 0
+    lock = threading.Lock()
+    pending = iter(enumerate(vectors))
+    barrier = threading.Barrier(threads)
+    halfway = len(vectors) // 2
+
+    def worker():
+        nonlocal failures
+        barrier.wait()
+        own = []
+        own_failures = 0
+        while True:
+            with lock:
+                index, vector = next(pending, (None, None))
+            if vector is None:
+                break
+            if fault is not None and index == halfway:
+                fault()
+            start = time.perf_counter()
+            try:
+                search_chunks(store, [vector], k)
+            except Exception:
+                own_failures += 1
+                continue
+            own.append((time.perf_counter() - start) * 1000)
+        with lock:
+            latencies.extend(own)
+            failures += own_failures
+
+    partial_before = SHARD_PARTIAL_RESULTS.value()
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return {
+        "queries_per_s": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 0.5),
+        "p99_ms": percentile(latencies, 0.99),
+        "partial": SHARD_PARTIAL_RESULTS.value() - partial_before,
+        "failed": failures,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la búsqueda con shards")
+    parser.add_argument(
+        "--shards", type=str, default="0,1,2,4", help="Números de shards (0 = sin shards)"
+    )
+    parser.add_argument("--threads", type=int, default=16, help="Hilos buscando a la vez")
+    parser.add_argument("--queries", type=int, default=2000, help="Consultas por medición")
+    parser.add_argument("--k", type=int, default=6)
+    parser.add_argument("--chroma", type=str, default=CHROMA_PATH, help="Raíz del índice")
+    parser.add_argument(
+        "--timeout-ms", type=float, default=1000, help="Espera máxima por shard"
+    )
+    parser.add_argument(
+        "--fault",
+        choices=["stop", "kill"],
+        help="Detener o matar el último shard a mitad de la medición",
+    )
+    parser.add_argument("--output", type=str, help="Guardar resultados en JSON")
+    args = parser.parse_args()
+
+    load_environment()
+    source = live_index_path(args.chroma)
+    embedding_function = get_embedding_function()
+    print("🧮 Calculando los vectores de las consultas")
+    vectors = embedding_function.embed_documents(queries(args.queries))
+
+    results = {}
+    for shards in [int(n) for n in args.shards.split(",")]:
+        workdir = Path(tempfile.mkdtemp(prefix="rag_shards_"))
+        processes = []
+        store = None
+        try:
+            root = workdir / "chroma"
+            version = new_version_path(str(root))
+            copied = reshard_version(source, version, shards)
+            publish_version(version, str(root))
+            if shards:
+                print(f"🧩 {copied} chunks en {shards} shards")
+                processes, urls = start_shards(root, shards)
+                store = ShardedStore(
+                    version,
+                    urls,
+                    embedding_function,
+                    timeout=args.timeout_ms / 1000,
+                    retry_after=5.0,
+                )
+            else:
+                print(f"📚 {copied} chunks sin shards (en proceso)")
+                store = open_store(version, embedding_function)
+                get_chunk_store(store)
+
+            # Calentamiento: conexiones, índices HNSW y almacenes compactos
+            run(store, vectors[: args.threads * 4], args.threads, args.k)
+
+            fault = None
+            if args.fault and shards:
+                victim = processes[-1]
+                sig = signal.SIGSTOP if args.fault == "stop" else signal.SIGKILL
+                fault = lambda: victim.send_signal(sig)
+
+            result = run(store, vectors, args.threads, args.k, fault)
+            result["shard_rss_mib"] = [
+                round(rss_mib(p.pid), 1) for p in processes if p.poll() is None
+            ]
+            results[f"{shards} shards" if shards else "sin shards"] = result
+        finally:
+            if store is not None:
+                close_store(store)
+            stop_shards(processes)
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print(
+        f"\n{'modo':<12} {'consultas/s':>12} {'p50 ms':>9} {'p99 ms':>9} "
+        f"{'parciales':>10} {'fallidas':>9}  RSS por shard (MiB)"
+    )
+    for mode, r in results.items():
+        print(
+            f"{mode:<12} {r['queries_per_s']:>12.1f} {r['p50_ms']:>9.1f} "
+            f"{r['p99_ms']:>9.1f} {r['partial']:>10.0f} {r['failed']:>9}  "
+            f"{', '.join(str(m) for m in r['shard_rss_mib']) or '-'}"
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+        print(f"\n💾 Resultados guardados en {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Fixtures de pytest para las pruebas sin red de scripts/ (python -m pytest scripts).
+
+`offline` deja cada prueba en un directorio temporal propio (las rutas del
+proyecto, como chroma/ y data/, son relativas al directorio de trabajo), con
+embeddings hash y el proveedor de chat mock. `make_index` construye ahí una
+versión Chroma pequeña con el formato de create_database.py.
+"""
+
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+RAG_DIR = Path(__file__).parent.parent
+if str(RAG_DIR) not in sys.path:
+    sys.path.append(str(RAG_DIR))
+
+AUTHORS = {"bauman": "Zygmunt Bauman", "levinas": "Emmanuel Levinas"}
+
+
+@pytest.fixture
+def offline(tmp_path, monkeypatch):
+    """Directorio de trabajo temporal con embeddings hash y LLM mock"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("RAG_EMBEDDING_BACKEND", "hash")
+    monkeypatch.setenv("RAG_LLM_PROVIDER", "mock")
+    monkeypatch.setenv("RAG_MOCK_LLM_LATENCY", "fixed:0")
+    monkeypatch.setenv("ANONYMIZED_TELEMETRY", "False")
+    os.makedirs("data")
+    # El catálogo se cachea por mtime, no por ruta, y el IndexManager del
+    # proceso quedaría con la versión de otra prueba
+    from core import index_store, source_catalog
+
+    monkeypatch.setitem(source_catalog._catalog_cache, "mtime", None)
+    monkeypatch.setattr(index_store, "_index_manager", None)
+    yield tmp_path
+    # chromadb reutiliza un cliente por ruta (relativa) en todo el proceso: los
+    # que quedaron abiertos apuntan al directorio de esta prueba
+    from chromadb.api.shared_system_client import SharedSystemClient
+
+    SharedSystemClient.clear_system_cache()
+
+
+def chunk_texts(source: str, count: int):
+    """Textos distintos y con vocabulario del corpus para `count` chunks de `source`"""
+    return [
+        f"{source} página {i}: la responsabilidad ética frente al otro, caso {i}"
+        for i in range(count)
+    ]
+
+
+@pytest.fixture
+def make_index(offline):
+    """
+    Construye una versión Chroma en `path` con `count` chunks por autor de
+    AUTHORS (una fuente cada uno, catalogada) y sus particiones. Retorna la ruta
+    """
+    import json
+
+    def build(path: str = "chroma", count: int = 20, distance: str = "l2") -> str:
+        from langchain_community.vectorstores import Chroma
+
+        from core.get_embedding_function import get_embedding_function
+        from core.index_store import close_store
+        from core.partitions import sync_partitions
+        from core.source_catalog import CATALOG_PATH
+
+        catalog = {
+            "sources": {
+                f"{partition}.pdf": {"author": author, "work": f"Obra de {author}", "partition": partition}
+                for partition, author in AUTHORS.items()
+            }
+        }
+        with open(CATALOG_PATH, "w", encoding="utf-8") as f:
+            json.dump(catalog, f, ensure_ascii=False)
+
+        store = Chroma(
+            persist_directory=path,
+            embedding_function=get_embedding_function(),
+            collection_metadata={"hnsw:space": distance},
+        )
+        try:
+            for partition in AUTHORS:
+                source = os.path.join("data", f"{partition}.pdf")
+                store.add_texts(
+                    chunk_texts(partition, count),
+                    metadatas=[{"source": source, "page": i} for i in range(count)],
+                    ids=[f"{source}:{i}:0" for i in range(count)],
+                )
+        finally:
+            close_store(store)
+        sync_partitions(path)
+        return path
+
+    return build
@@ -0,0 +1,413 @@
+#!/usr/bin/env python3
+"""
+Pruebas de carga del API sin red: levanta el servidor contra un mock local de
+OpenAI (chat + embeddings), construye un índice sintético y mide throughput,
+latencias p50/p95/p99 y tasa de errores por endpoint.
+
+Uso:
+    python scripts/load_test.py --rate 20 --duration 60 --output run.json
+    python scripts/load_test.py --concurrency 32 --duration 60 --compare base.json
+    python scripts/load_test.py --target http://localhost:8000 --rate 5  (servidor ya en marcha)
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+RAG_DIR = Path(__file__).parent.parent
+sys.path.append(str(RAG_DIR))
+from core.topics import INTENSITIES, TOPICS
+
+# Vocabulario para el corpus sintético
+VOCABULARY = (
+    "responsabilidad otro rostro deber futuro generaciones naturaleza técnica "
+    "vulnerabilidad duelo precariedad violencia reconocimiento alteridad infinito "
+    "imperativo máxima universal ley razón autonomía dignidad deseo consumo "
+    "mercado ignorancia saber verdad cotidiano gesto cuidado miedo riesgo vida "
+    "muerte comunidad justicia libertad prudencia temor esperanza promesa culpa"
+).split()
+
+# Escenarios: nombre -> (método, ruta, ¿necesita cuerpo?)
+SCENARIOS = {
+    "generate": ("POST", "/generate-dilemma", True),
+    "topics": ("GET", "/topics", False),
+    "health": ("GET", "/health", False),
+}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_http(url: str, timeout: float = 60.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"El servidor no respondió en {timeout:.0f}s: {url}")
+
+
+def build_synthetic_index(workdir: Path, chunks: int, seed: int):
+    """
+    Construye `workdir/chroma` con chunks sintéticos. Los embeddings se piden
+    al mock (variables de entorno ya apuntando a él), igual que en producción
+    """
+    from langchain.schema.document import Document
+    from langchain_community.vectorstores import Chroma
+
+    from core.create_database import calculate_chunk_ids
+    from core.get_embedding_function import get_embedding_function
+
+    rng = random.Random(seed)
+    documents = []
+    for i in range(chunks):
+        topic = TOPICS[i % len(TOPICS)]
+        words = " ".join(rng.choice(VOCABULARY) for _ in range(120))
+        documents.append(
+            Document(
+                page_content=f"{topic}. {words}",
+                metadata={"source": f"data/sintetico_{i // 8 % 4}.pdf", "page": i // 8},
+            )
+        )
+    documents = calculate_chunk_ids(documents)
+
+    db = Chroma(
+        persist_directory=str(workdir / "chroma"),
+        embedding_function=get_embedding_function(),
+    )
+    for start in range(0, len(documents), 1000):
+        batch = documents[start : start + 1000]
+        db.add_documents(batch, ids=[doc.metadata["id"] for doc in batch])
+
+
+def request_bodies():
+    """Cuerpos de /generate-dilemma recorriendo tópicos x intensidades"""
+    for topic, intensity in itertools.cycle(
+        list(itertools.product(TOPICS, INTENSITIES))
+    ):
+        yield {"topic": topic, "intensity": intensity}
+
+
+def parse_mix(mix: str):
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        if name not in SCENARIOS:
+            raise ValueError(f"Escenario desconocido: {name}")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+async def run_load(base_url: str, args) -> dict:
+    """Ejecuta la carga y devuelve las muestras por endpoint"""
+    weights = parse_mix(args.mix)
+    names = list(weights)
+    rng = random.Random(args.seed)
+    bodies = request_bodies()
+    samples = {name: [] for name in names}  # (latencia_s, status | None)
+
+    limits = httpx.Limits(max_connections=args.max_in_flight)
+    async with httpx.AsyncClient(
+        base_url=base_url, timeout=args.timeout, limits=limits
+    ) as client:
+
+        async def one_request():
+            name = rng.choices(names, weights=[weights[n] for n in names])[0]
+            method, path, has_body = SCENARIOS[name]
+            start = time.perf_counter()
+            try:
+                response = await client.request(
+                    method, path, json=next(bodies) if has_body else None
+                )
+                status = response.status_code
+            except httpx.HTTPError:
+                status = None
+            samples[name].append((time.perf_counter() - start, status))
+
+        started = time.perf_counter()
+        end_at = started + args.duration
+
+        if args.concurrency:
+            # Carga en lazo cerrado: N clientes que envían en cuanto reciben
+            async def worker():
+                while time.perf_counter() < end_at:
+                    await one_request()
+
+            await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        else:
+            # Carga en lazo abierto: llegadas de Poisson a la tasa objetivo
+            in_flight = set()
+            semaphore = asyncio.Semaphore(args.max_in_flight)
+            next_at = started
+            while next_at < end_at:
+                await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+                await semaphore.acquire()
+                task = asyncio.create_task(one_request())
+                task.add_done_callback(lambda _t: semaphore.release())
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+                next_at += rng.expovariate(args.rate)
+            if in_flight:
+                await asyncio.gather(*in_flight)
+
+        elapsed = time.perf_counter() - started
+
+    return {"elapsed_s": elapsed, "samples": samples}
+
+
+def percentile(values, p: float) -> float:
+    """Percentil con interpolación lineal (valores ya ordenados)"""
+    if not values:
+        return 0.0
+    rank = (len(values) - 1) * p / 100
+    low = int(rank)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (rank - low)
+
+
+def summarize(run: dict) -> dict:
+    elapsed = run["elapsed_s"]
+    endpoints = {}
+    all_samples = []
+    for name, samples in run["samples"].items():
+        all_samples.extend(samples)
+        endpoints[name] = _summarize_samples(samples, elapsed)
+    return {
+        "elapsed_s": elapsed,
+        "endpoints": endpoints,
+        "overall": _summarize_samples(all_samples, elapsed),
+    }
+
+
+def _summarize_samples(samples, elapsed: float) -> dict:
+    ok = sorted(lat * 1000 for lat, status in samples if status and status < 400)
+    errors = sum(1 for _lat, status in samples if not status or status >= 400)
+    total = len(samples)
+    status_counts = {}
+    for _lat, status in samples:
+        key = str(status) if status else "connection_error"
+        status_counts[key] = status_counts.get(key, 0) + 1
+    return {
+        "requests": total,
+        "errors": errors,
+        "error_rate": errors / total if total else 0.0,
+        "throughput_rps": len(ok) / elapsed if elapsed else 0.0,
+        "latency_ms": {
+            "mean": sum(ok) / len(ok) if ok else 0.0,
+            "p50": percentile(ok, 50),
+            "p95": percentile(ok, 95),
+            "p99": percentile(ok, 99),
+            "max": ok[-1] if ok else 0.0,
+        },
+        "status_counts": status_counts,
+    }
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list:
+    """Lista de regresiones respecto a un resultado anterior"""
+    regressions = []
+    for name, now in current["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(name)
+        if not before or not before["requests"]:
+            continue
+        for p in ("p50", "p95", "p99"):
+            old, new = before["latency_ms"][p], now["latency_ms"][p]
+            if old and new > old * (1 + tolerance):
+                regressions.append(f"{name} {p}: {old:.1f}ms -> {new:.1f}ms")
+        old, new = before["throughput_rps"], now["throughput_rps"]
+        if old and new < old * (1 - tolerance):
+            regressions.append(f"{name} throughput: {old:.2f} -> {new:.2f} rps")
+        old, new = before["error_rate"], now["error_rate"]
+        if new > old + 0.01:
+            regressions.append(f"{name} error_rate: {old:.2%} -> {new:.2%}")
+    return regressions
+
+
+def print_report(summary: dict):
+    print("\n" + "=" * 78)
+    print("📊 RESULTADOS")
+    print("=" * 78)
+    header = f"{'endpoint':<12}{'reqs':>7}{'err%':>8}{'rps':>9}{'p50':>10}{'p95':>10}{'p99':>10}"
+    print(header)
+    print("-" * len(header))
+    rows = list(summary["endpoints"].items()) + [("TOTAL", summary["overall"])]
+    for name, s in rows:
+        lat = s["latency_ms"]
+        print(
+            f"{name:<12}{s['requests']:>7}{s['error_rate'] * 100:>7.2f}%"
+            f"{s['throughput_rps']:>9.2f}{lat['p50']:>9.1f}ms{lat['p95']:>8.1f}ms"
+            f"{lat['p99']:>8.1f}ms"
+        )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Pruebas de carga offline del API")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--rate", type=float, default=10.0, help="Peticiones/s objetivo")
+    mode.add_argument("--concurrency", type=int, help="Clientes concurrentes (lazo cerrado)")
+    parser.add_argument("--duration", type=float, default=30.0, help="Segundos de carga")
+    parser.add_argument("--warmup", type=float, default=3.0, help="Segundos de calentamiento")
+    parser.add_argument(
+        "--mix", type=str, default="generate=8,topics=1,health=1", help="Pesos por endpoint"
+    )
+    parser.add_argument("--timeout", type=float, default=30.0, help="Timeout por petición")
+    parser.add_argument("--max-in-flight", type=int, default=512)
+    parser.add_argument("--target", type=str, help="URL de un servidor ya en marcha")
+    parser.add_argument("--api-workers", type=int, default=1, help="Workers de uvicorn")
+    parser.add_argument("--corpus-chunks", type=int, default=2000)
+    parser.add_argument("--chat-latency", type=str, default="lognormal:800:0.4")
+    parser.add_argument("--embedding-latency", type=str, default="lognormal:60:0.3")
+    parser.add_argument("--chat-error-rate", type=float, default=0.0)
+    parser.add_argument("--embedding-error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=str, help="Guardar resultados en JSON")
+    parser.add_argument("--compare", type=str, help="JSON de una ejecución anterior")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.10, help="Margen antes de marcar regresión"
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.concurrency:
+        args.rate = None
+
+    print("🧪 RAG DILEMMA API - PRUEBAS DE CARGA")
+    print("=" * 60)
+
+    processes = []
+    workdir = None
+    try:
+        if args.target:
+            base_url = args.target.rstrip("/")
+        else:
+            workdir = Path(tempfile.mkdtemp(prefix="rag_load_"))
+            mock_port, api_port = free_port(), free_port()
+            mock_url = f"http://127.0.0.1:{mock_port}"
+            env = dict(
+                os.environ,
+                OPENAI_API_KEY="mock",
+                OPENAI_API_BASE=f"{mock_url}/v1",
+                OPENAI_BASE_URL=f"{mock_url}/v1",
+                RAG_EMBEDDING_TOKENIZE="0",
+            )
+            os.environ.update(env)
+
+            print(f"🤖 Iniciando mock de OpenAI en {mock_url}")
+            processes.append(
+                subprocess.Popen(
+                    [
+                        sys.executable,
+                        str(RAG_DIR / "scripts" / "mock_openai.py"),
+                        "--port",
+                        str(mock_port),
+                        "--chat-latency",
+                        args.chat_latency,
+                        "--embedding-latency",
+                        args.embedding_latency,
+                        "--chat-error-rate",
+                        str(args.chat_error_rate),
+                        "--embedding-error-rate",
+                        str(args.embedding_error_rate),
+                        "--seed",
+                        str(args.seed),
+                    ],
+                    env=env,
+                )
+            )
+            wait_for_http(f"{mock_url}/docs")
+
+            print(f"📚 Construyendo índice sintético ({args.corpus_chunks} chunks)")
+            build_synthetic_index(workdir, args.corpus_chunks, args.seed)
+
+            base_url = f"http://127.0.0.1:{api_port}"
+            print(f"🚀 Iniciando API en {base_url} ({args.api_workers} workers)")
+            processes.append(
+                subprocess.Popen(
+                    [
+                        sys.executable,
+                        "-m",
+                        "uvicorn",
+                        "api.server:app",
+                        "--app-dir",
+                        str(RAG_DIR),
+                        "--host",
+                        "127.0.0.1",
+                        "--port",
+                        str(api_port),
+                        "--workers",
+                        str(args.api_workers),
+                        "--log-level",
+                        "warning",
+                    ],
+                    cwd=workdir,
+                    env=env,
+                )
+            )
+            wait_for_http(f"{base_url}/health")
+
+        if args.warmup:
+            print(f"🔥 Calentamiento ({args.warmup:.0f}s)")
+            warmup = argparse.Namespace(**vars(args))
+            warmup.duration = args.warmup
+            asyncio.run(run_load(base_url, warmup))
+
+        mode = (
+            f"{args.concurrency} clientes concurrentes"
+            if args.concurrency
+            else f"{args.rate} peticiones/s"
+        )
+        print(f"⏱️  Carga: {mode} durante {args.duration:.0f}s")
+        summary = summarize(asyncio.run(run_load(base_url, args)))
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            process.wait()
+        if workdir is not None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    summary["config"] = {
+        key: value
+        for key, value in vars(args).items()
+        if key not in ("output", "compare")
+    }
+    summary["timestamp"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    print_report(summary)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+        print(f"\n💾 Resultados guardados en {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(summary, baseline, args.tolerance)
+        if regressions:
+            print(f"\n❌ Regresiones respecto a {args.compare}:")
+            for line in regressions:
+                print(f"   - {line}")
+            sys.exit(1)
+        print(f"\n✅ Sin regresiones respecto a {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Servidor mock compatible con la API de OpenAI (chat y embeddings) para pruebas
+de carga sin red. Latencias y tasas de error configurables.
+Uso: python scripts/mock_openai.py --port 9100 --chat-latency lognormal:800:0.5
+
+Emula la caché de prefijos de OpenAI (contando palabras como tokens): desde
+--cache-min-tokens, la parte inicial del prompt que coincide con un prompt
+anterior se informa en bloques de 128 como `prompt_tokens_details.cached_tokens`.
+
+Distribuciones de latencia (en ms):
+    fixed:200            siempre 200 ms
+    uniform:100:400      uniforme entre 100 y 400 ms
+    normal:800:200       normal con media 800 y desviación 200
+    lognormal:800:0.5    lognormal con mediana 800 y sigma 0.5
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import random
+import sys
+import time
+import uuid
+from pathlib import Path
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+sys.path.append(str(Path(__file__).parent.parent))
+from core.local_embeddings import DEFAULT_DIMENSIONS, hash_embedding
+from core.mock_llm import LatencyDistribution, mock_response
+
+class PromptPrefixCache:
+    """Prefijos de prompts ya vistos, en bloques de CACHE_BLOCK palabras"""
+
+    CACHE_BLOCK = 128
+    MAX_ENTRIES = 100_000
+
+    def __init__(self, min_tokens: int):
+        self.min_tokens = min_tokens
+        self._prefixes = set()
+
+    def lookup(self, model, words) -> int:
+        """Palabras iniciales servidas desde la caché; registra los prefijos nuevos"""
+        if self.min_tokens <= 0:
+            return 0
+        cached = 0
+        for end in range(self.min_tokens, len(words) + 1, self.CACHE_BLOCK):
+            key = hash((model, " ".join(words[:end])))
+            if key in self._prefixes:
+                cached = end
+            else:
+                if len(self._prefixes) >= self.MAX_ENTRIES:
+                    self._prefixes.clear()
+                self._prefixes.add(key)
+        return cached
+
+
+def create_app(args) -> FastAPI:
+    rng = random.Random(args.seed)
+    chat_latency = LatencyDistribution(args.chat_latency, rng)
+    embedding_latency = LatencyDistribution(args.embedding_latency, rng)
+    prompt_cache = PromptPrefixCache(args.cache_min_tokens)
+    app = FastAPI(title="Mock OpenAI")
+
+    def error_response(kind: str):
+        return JSONResponse(
+            status_code=args.error_status,
+            content={
+                "error": {
+                    "message": f"Error simulado en {kind}",
+                    "type": "server_error",
+                    "code": None,
+                }
+            },
+        )
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        await asyncio.sleep(embedding_latency.sample_seconds())
+        if rng.random() < args.embedding_error_rate:
+            return error_response("embeddings")
+
+        inputs = body["input"]
+        # Un solo texto, una lista de textos, o ids de token (uno o varios)
+        if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+
+        dimensions = body.get("dimensions") or args.dimensions
+        data = []
+        tokens = 0
+        for index, item in enumerate(inputs):
+            vector = hash_embedding(item, dimensions)
+            tokens += len(item.split()) if isinstance(item, str) else len(item)
+            if body.get("encoding_format") == "base64":
+                embedding = base64.b64encode(vector.tobytes()).decode("ascii")
+            else:
+                embedding = vector.tolist()
+            data.append({"object": "embedding", "index": index, "embedding": embedding})
+
+        return {
+            "object": "list",
+            "data": data,
+            "model": body.get("model", "mock-embedding"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        await asyncio.sleep(chat_latency.sample_seconds())
+        if rng.random() < args.chat_error_rate:
+            return error_response("chat")
+
+        prompt = " ".join(
+            m["content"] if isinstance(m["content"], str) else json.dumps(m["content"])
+            for m in body.get("messages", [])
+        )
+        content = mock_response(prompt)
+        prompt_words = prompt.split()
+        usage = {
+            "prompt_tokens": len(prompt_words),
+            "completion_tokens": len(content.split()),
+            "total_tokens": len(prompt_words) + len(content.split()),
+            "prompt_tokens_details": {
+                "cached_tokens": prompt_cache.lookup(body.get("model"), prompt_words)
+            },
+        }
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        model = body.get("model", "mock-chat")
+        created = int(time.time())
+
+        if body.get("stream"):
+            include_usage = (body.get("stream_options") or {}).get("include_usage")
+
+            async def event_stream():
+                words = content.split(" ")
+                for i, word in enumerate(words):
+                    piece = word if i == 0 else " " + word
+                    chunk = {
+                        "id": completion_id,
+                        "object": "chat.completion.chunk",
+                        "created": created,
+                        "model": model,
+                        "choices": [
+                            {"index": 0, "delta": {"content": piece}, "finish_reason": None}
+                        ],
+                    }
+                    yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+                final = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                }
+                yield f"data: {json.dumps(final)}\n\n"
+                if include_usage:
+                    usage_chunk = dict(final, choices=[], usage=usage)
+                    yield f"data: {json.dumps(usage_chunk)}\n\n"
+                yield "data: [DONE]\n\n"
+
+            return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": usage,
+        }
+
+    return app
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Servidor mock de OpenAI")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument(
+        "--chat-latency", type=str, default="lognormal:800:0.4", help="Latencia del chat"
+    )
+    parser.add_argument(
+        "--embedding-latency",
+        type=str,
+        default="lognormal:60:0.3",
+        help="Latencia de embeddings",
+    )
+    parser.add_argument("--chat-error-rate", type=float, default=0.0)
+    parser.add_argument("--embedding-error-rate", type=float, default=0.0)
+    parser.add_argument(
+        "--error-status", type=int, default=500, help="Código HTTP de los errores"
+    )
+    parser.add_argument("--dimensions", type=int, default=DEFAULT_DIMENSIONS)
+    parser.add_argument(
+        "--cache-min-tokens",
+        type=int,
+        default=1024,
+        help="Tamaño mínimo de prompt para la caché de prefijos (0 = sin caché)",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    print(f"🧪 Mock OpenAI en http://{args.host}:{args.port}/v1")
+    print(f"   💬 Chat: {args.chat_latency} | errores {args.chat_error_rate:.1%}")
+    print(
+        f"   🔢 Embeddings: {args.embedding_latency} | errores {args.embedding_error_rate:.1%}"
+    )
+    uvicorn.run(create_app(args), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,19 @@
 #!/usr/bin/env python3
 """
 Script para iniciar el servidor FastAPI con verificaciones previas
-Uso: python start_server.py
+Uso: python start_server.py            (desarrollo, uvicorn con --reload)
+     python start_server.py --prod     (producción, gunicorn multi-worker)
 """
 
+import argparse
 import os
 import sys
 import subprocess
+from pathlib import Path
+
+# Permite importar api/ y core/ al arrancar en modo producción (mismo proceso)
+sys.path.append(str(Path(__file__).parent.parent))
+from core.index_store import index_exists, live_index_path
 
 
 def check_dependencies():
@@ -24,15 +31,17 @@ def check_environment():
     checks = []
 
     # Verificar ChromaDB
-    if os.path.exists("chroma"):
-        print("✅ Base de datos ChromaDB encontrada")
+    if index_exists():
+        print(f"✅ Base de datos ChromaDB encontrada: {live_index_path()}")
         checks.append(True)
     else:
         print("❌ Base de datos ChromaDB no encontrada")
         print("💡 Ejecuta: python core/create_database.py")
         checks.append(False)
 
-    # Verificar .env y OpenAI API Key
+    # Verificar .env y OpenAI API Key (solo si el chat o los embeddings usan OpenAI)
+    from core.llm_providers import openai_key_required
+
     if os.path.exists(".env"):
         print("✅ Archivo .env encontrado")
         # Cargar .env
@@ -40,25 +49,25 @@ def check_environment():
 
         load_dotenv()
 
-        if os.getenv("OPENAI_API_KEY"):
-            print("✅ OpenAI API Key configurada")
-            checks.append(True)
-        else:
-            print("❌ OpenAI API Key no encontrada en .env")
-            checks.append(False)
+    if os.getenv("OPENAI_API_KEY"):
+        print("✅ OpenAI API Key configurada")
+        checks.append(True)
+    elif not openai_key_required():
+        print("✅ OpenAI API Key no requerida (chat y embeddings sin OpenAI)")
+        checks.append(True)
     else:
-        print("❌ Archivo .env no encontrado")
+        print("❌ OpenAI API Key no encontrada")
         print("💡 Crea un archivo .env con: OPENAI_API_KEY=tu_clave_aqui")
         checks.append(False)
 
     return all(checks)
 
 
-def start_server():
-    """Iniciar el servidor FastAPI"""
+def start_server(host="127.0.0.1", port=8000):
+    """Iniciar el servidor FastAPI en modo desarrollo"""
     print("\n🚀 Iniciando servidor FastAPI...")
-    print("📍 URL: http://localhost:8000")
-    print("📖 Docs: http://localhost:8000/docs")
+    print(f"📍 URL: http://{host}:{port}")
+    print(f"📖 Docs: http://{host}:{port}/docs")
     print("🛑 Para detener: Ctrl+C")
     print("-" * 50)
 
@@ -70,9 +79,9 @@ def start_server():
             "uvicorn",
             "api.server:app",
             "--host",
-            "127.0.0.1",
+            host,
             "--port",
-            "8000",
+            str(port),
             "--reload",
             "--log-level",
             "info",
@@ -87,7 +96,190 @@ def start_server():
         sys.exit(1)
 
 
+def default_workers():
+    """
+    Número de workers según los núcleos disponibles para este proceso
+    (respeta cpusets/afinidad en contenedores). WEB_CONCURRENCY lo sobrescribe
+    """
+    if os.getenv("WEB_CONCURRENCY"):
+        return int(os.environ["WEB_CONCURRENCY"])
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cores = os.cpu_count() or 1
+    return max(1, cores)
+
+
+def warm_index_pages(path):
+    """
+    Lee los archivos del índice en el proceso padre antes del fork.
+    Las páginas quedan en la caché del sistema operativo y todos los workers
+    las comparten en solo lectura en lugar de leerlas cada uno desde disco
+    """
+    total = 0
+    for root, _dirs, files in os.walk(path):
+        for name in files:
+            file_path = os.path.join(root, name)
+            try:
+                with open(file_path, "rb") as f:
+                    if hasattr(os, "posix_fadvise"):
+                        os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+                    while f.read(1 << 20):
+                        pass
+                total += os.path.getsize(file_path)
+            except OSError as e:
+                print(f"⚠️  No se pudo precargar {file_path}: {e}")
+    return total
+
+
+def start_production_server(args):
+    """
+    Iniciar el servidor en modo producción con gunicorn + workers uvicorn.
+
+    - La app se importa una vez en el padre (preload_app) y los workers la
+      heredan por fork, compartiendo copy-on-write las páginas de código
+    - El índice se precarga en la caché de páginas antes del fork; cada worker
+      abre su propio cliente Chroma después del fork (no es seguro heredarlo)
+    - SIGHUP al proceso padre reinicia los workers de forma ordenada
+      (graceful_timeout) sin cerrar el socket de escucha
+    """
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        print("❌ gunicorn no está instalado (requerido para --prod)")
+        print("💡 Ejecuta: pip install -r config/requirements_api.txt")
+        sys.exit(1)
+
+    # Las verificaciones ya se hicieron aquí; los workers no las repiten
+    os.environ["RAG_PREFLIGHT_DONE"] = "1"
+
+    def post_worker_init(worker):
+        # Abrir el índice antes de aceptar tráfico para que la primera
+        # petición de cada worker no pague la apertura de Chroma
+        from core.index_store import get_index_manager
+
+        if not index_exists():
+            return
+        try:
+            get_index_manager().reload()
+        except Exception as e:
+            worker.log.warning(f"⚠️  No se pudo abrir el índice: {e}")
+
+    class ProductionServer(BaseApplication):
+        def __init__(self, options):
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from api.server import app
+            from core.generate_dilemma_rag import preload_dependencies
+
+            # Importar LangChain/Chroma/OpenAI antes del fork: los workers
+            # comparten esas páginas en lugar de importarlas cada uno
+            preload_dependencies()
+
+            warmed = warm_index_pages(live_index_path())
+            print(f"📚 Índice precargado: {warmed / (1 << 20):.1f} MiB")
+            return app
+
+    options = {
+        "bind": f"{args.host}:{args.port}",
+        "workers": args.workers,
+        "worker_class": "uvicorn.workers.UvicornWorker",
+        "preload_app": True,
+        "keepalive": args.keep_alive,
+        "backlog": args.backlog,
+        "graceful_timeout": args.graceful_timeout,
+        "timeout": args.timeout,
+        "max_requests": args.max_requests,
+        "max_requests_jitter": args.max_requests_jitter,
+        "post_worker_init": post_worker_init,
+        "loglevel": "info",
+    }
+    if args.pid_file:
+        options["pidfile"] = args.pid_file
+
+    print("\n🚀 Iniciando servidor FastAPI (producción)...")
+    print(f"📍 URL: http://{args.host}:{args.port}")
+    print(f"👷 Workers: {args.workers}")
+    if args.workers > 1:
+        # Las sesiones viven en memoria de cada worker (core/session_store.py)
+        print(
+            "⚠️  Sesiones (/sessions, session_id) por worker: requieren afinidad "
+            "por session_id en el balanceador o --workers 1 (si no, 404)"
+        )
+    print("🔄 Reinicio ordenado: kill -HUP <pid del proceso padre>")
+    print("-" * 50)
+
+    ProductionServer(options).run()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Iniciar RAG Dilemma API Server")
+    parser.add_argument(
+        "--prod",
+        action="store_true",
+        help="Modo producción: gunicorn multi-worker sin --reload",
+    )
+    parser.add_argument("--host", type=str, help="Host (dev: 127.0.0.1, prod: 0.0.0.0)")
+    parser.add_argument("--port", type=int, default=8000, help="Puerto")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=default_workers(),
+        help="Número de workers (por defecto: núcleos disponibles). Las sesiones "
+        "viven en cada worker: con más de uno, afinidad por session_id",
+    )
+    parser.add_argument(
+        "--keep-alive",
+        type=int,
+        default=5,
+        help="Segundos que se mantiene abierta una conexión keep-alive",
+    )
+    parser.add_argument(
+        "--backlog", type=int, default=2048, help="Conexiones pendientes máximas"
+    )
+    parser.add_argument(
+        "--graceful-timeout",
+        type=int,
+        default=30,
+        help="Segundos para terminar peticiones en curso al reiniciar",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=int,
+        default=120,
+        help="Segundos sin respuesta antes de reiniciar un worker",
+    )
+    parser.add_argument(
+        "--max-requests",
+        type=int,
+        default=0,
+        help="Reciclar cada worker tras N peticiones (0 = nunca)",
+    )
+    parser.add_argument(
+        "--max-requests-jitter",
+        type=int,
+        default=0,
+        help="Variación aleatoria de --max-requests entre workers",
+    )
+    parser.add_argument("--pid-file", type=str, help="Archivo PID del proceso padre")
+    parser.add_argument(
+        "--yes",
+        "-y",
+        action="store_true",
+        help="Continuar sin preguntar aunque fallen las verificaciones",
+    )
+    return parser.parse_args()
+
+
 def main():
+    args = parse_args()
+
     print("🔧 RAG Dilemma API Server - Verificación e inicio")
     print("=" * 60)
 
@@ -99,15 +291,24 @@ def main():
     # Verificar entorno
     if not check_environment():
         print("\n⚠️  Hay problemas de configuración.")
-        response = input("¿Quieres continuar de todos modos? (y/N): ")
-        if response.lower() != "y":
-            print("Abortando...")
+        if args.prod and not args.yes:
+            # En producción no hay terminal interactiva a la que preguntar
+            print("Abortando... (usa --yes para continuar de todos modos)")
             sys.exit(1)
+        if not args.yes:
+            response = input("¿Quieres continuar de todos modos? (y/N): ")
+            if response.lower() != "y":
+                print("Abortando...")
+                sys.exit(1)
 
     print("\n🎉 Todo listo para iniciar el servidor!")
 
     # Iniciar servidor
-    start_server()
+    if args.prod:
+        args.host = args.host or "0.0.0.0"
+        start_production_server(args)
+    else:
+        start_server(host=args.host or "127.0.0.1", port=args.port)
 
 
 if __name__ == "__main__":
@@ -1,186 +1,251 @@
 #!/usr/bin/env python3
 """
-Script de pruebas para el servidor FastAPI
-Uso: python scripts/test_api.py
+Pruebas sin red de las rutas del servidor FastAPI, con TestClient, embeddings
+hash y el proveedor de chat mock sobre un índice pequeño en un directorio
+temporal (ver conftest.py): salud, tópicos, fuentes, sesiones, ingesta,
+generación, presupuesto de tiempo (X-Deadline-Ms y su tope), 499 si el
+cliente se desconecta y 503 si no responden los shards.
+Ejecutar con: python -m pytest scripts/test_api.py  (o python scripts/test_api.py)
 """
 
-import requests
-import time
+import asyncio
+import json
 import sys
-
-BASE_URL = "http://localhost:8000"
-
-
-def test_health_endpoint():
-    """Probar el endpoint de salud"""
-    print("🏥 Probando endpoint de salud...")
-    try:
-        response = requests.get(f"{BASE_URL}/")
-        if response.status_code == 200:
-            print("✅ Endpoint de salud OK")
-            print(f"   Respuesta: {response.json()}")
-            return True
-        else:
-            print(f"❌ Error en health: {response.status_code}")
-            return False
-    except requests.exceptions.ConnectionError:
-        print(
-            "❌ No se pudo conectar al servidor. ¿Está ejecutándose en localhost:8000?"
+import time
+from pathlib import Path
+
+import pytest
+
+RAG_DIR = Path(__file__).parent.parent
+sys.path.append(str(RAG_DIR))
+from conftest import AUTHORS
+
+TOPICS = [
+    ("Temporalidad Moral", "Suave"),
+    ("Alteridad Radical", "Medio"),
+    ("Imperativo de Universalización", "Extremo"),
+    ("Ontología de la Ignorancia", "Suave"),
+    ("Economía Moral del Deseo", "Medio"),
+    ("Microética Cotidiana", "Extremo"),
+]
+
+
+@pytest.fixture
+def client(make_index, monkeypatch):
+    """TestClient del servidor con un índice publicado y sin dilemas de respaldo"""
+    from fastapi.testclient import TestClient
+
+    from api.server import app
+    from core import fallback_cache, session_store
+
+    make_index()
+    monkeypatch.setattr(fallback_cache, "_fallback_cache", None)
+    monkeypatch.setattr(session_store, "_session_store", None)
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def generate(client, topic="Alteridad Radical", intensity="Medio", headers=None, **fields):
+    return client.post(
+        "/generate-dilemma",
+        json={"topic": topic, "intensity": intensity, **fields},
+        headers=headers or {},
+    )
+
+
+def test_health_topics_and_docs(client):
+    response = client.get("/")
+    assert response.status_code == 200
+    assert response.json()["database_status"] == "connected"
+    assert client.get("/health").json()["status"] == "healthy"
+
+    topics = client.get("/topics").json()
+    assert [topic for topic, _ in TOPICS] == [t for t in topics["topics"] if t in dict(TOPICS)]
+    assert {"Suave", "Medio", "Extremo"} <= set(topics["intensities"])
+    assert client.get("/docs").status_code == 200
+
+
+def test_sources(client):
+    response = client.get("/sources")
+    assert response.status_code == 200
+    sources = {source["partition"]: source for source in response.json()["sources"]}
+    assert set(sources) == set(AUTHORS)
+    for partition, author in AUTHORS.items():
+        assert sources[partition]["author"] == author
+        assert sources[partition]["source"] == f"{partition}.pdf"
+    assert response.json()["topic_partitions"]
+
+    assert generate(client, filters={"authors": ["Autor inexistente"]}).status_code == 400
+    filtered = generate(client, filters={"authors": ["Levinas"]})
+    assert filtered.status_code == 200
+    assert filtered.json()["sources_metadata"]
+
+
+@pytest.mark.parametrize("topic,intensity", TOPICS)
+def test_generate_dilemma(client, topic, intensity):
+    response = generate(client, topic, intensity, user_context="Usuario de prueba")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["dilemma_text"] and data["philosophical_foundation"]
+    assert not data.get("fallback")
+    assert "total" in response.headers["Server-Timing"]
+
+
+def test_sessions(client):
+    session_id = client.post("/sessions").json()["session_id"]
+    response = generate(client, session_id=session_id)
+    assert response.status_code == 200
+    answered = client.post(
+        f"/sessions/{session_id}/answers",
+        json={"answer": "Ayudaría al otro", "dilemma_id": response.json()["dilemma_id"]},
+    )
+    assert answered.status_code == 200
+    assert answered.json()["total_answers"] == 1
+    assert client.delete(f"/sessions/{session_id}").status_code == 204
+    # Un id desconocido (o de otro worker) no crea una sesión vacía
+    assert generate(client, session_id=session_id).status_code == 404
+
+
+def test_ingest_validation(offline, monkeypatch):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from api import ingest
+
+    # Las rutas de administración se montan al importar el servidor solo con
+    # RAG_ADMIN_TOKEN; el token se valida en cada petición
+    app = FastAPI()
+    app.include_router(ingest.router)
+    monkeypatch.setenv("RAG_ADMIN_TOKEN", "secreto")
+    with TestClient(app) as client:
+        assert client.get("/ingest").status_code == 403
+        headers = {"X-Admin-Token": "secreto"}
+        response = client.post(
+            "/ingest",
+            params={"filename": "no_es_pdf.pdf"},
+            content=b"texto plano",
+            headers=headers,
+        )
+        assert response.status_code == 415
+        response = client.get("/ingest", headers=headers)
+        assert response.status_code == 200
+        assert response.json()["jobs"] == []
+
+
+@pytest.mark.parametrize("value", ["abc", "0", "-5"])
+def test_invalid_deadline_header(client, value):
+    assert generate(client, headers={"X-Deadline-Ms": value}).status_code == 400
+
+
+def test_deadline_clamped_to_max(monkeypatch):
+    from api.routes import request_deadline
+
+    monkeypatch.setenv("RAG_DEADLINE_MS", "30000")
+    monkeypatch.setenv("RAG_DEADLINE_MAX_MS", "5000")
+    assert request_deadline(None).budget_ms == 5000
+    assert request_deadline("60000").budget_ms == 5000
+    assert request_deadline("1500").budget_ms == 1500
+
+
+def test_deadline_fallback_and_504(client, monkeypatch):
+    served = generate(client)
+    assert served.status_code == 200
+
+    # El LLM tarda 2s y la cabecera pide 60s, pero el tope es 200ms
+    monkeypatch.setenv("RAG_MOCK_LLM_LATENCY", "fixed:2000")
+    monkeypatch.setenv("RAG_DEADLINE_MAX_MS", "200")
+    started = time.monotonic()
+    response = generate(client, headers={"X-Deadline-Ms": "60000"})
+    assert time.monotonic() - started < 1.5
+    assert response.status_code == 200
+    data = response.json()
+    assert data["fallback"] and data["dilemma_text"] == served.json()["dilemma_text"]
+
+    # Sin un dilema reciente del mismo tópico e intensidad no hay respaldo
+    response = generate(client, "Microética Cotidiana", "Suave", headers={"X-Deadline-Ms": "1"})
+    assert response.status_code == 504
+
+
+async def call_with_disconnect(app, path: str, body: dict, disconnect_after: float):
+    """
+    Llama a la app ASGI como un servidor cuyo cliente se desconecta
+    `disconnect_after` segundos después de enviar el cuerpo. Retorna el estado
+    """
+    payload = json.dumps(body).encode("utf-8")
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [
+            (b"host", b"testserver"),
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(payload)).encode()),
+        ],
+        "client": ("testclient", 50000),
+        "server": ("testserver", 80),
+    }
+    sent_body = False
+    disconnect_at = None
+    messages = []
+
+    async def receive():
+        nonlocal sent_body, disconnect_at
+        if not sent_body:
+            sent_body = True
+            disconnect_at = time.monotonic() + disconnect_after
+            return {"type": "http.request", "body": payload, "more_body": False}
+        while time.monotonic() < disconnect_at:
+            await asyncio.sleep(0.01)
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    return next(m["status"] for m in messages if m["type"] == "http.response.start")
+
+
+def test_client_disconnect_is_499(client, monkeypatch):
+    from api.server import app
+    from core.metrics import CLIENT_DISCONNECTS
+
+    monkeypatch.setenv("RAG_MOCK_LLM_LATENCY", "fixed:1000")
+    before = CLIENT_DISCONNECTS.value(stage="llm")
+    started = time.monotonic()
+    status = asyncio.run(
+        call_with_disconnect(
+            app, "/generate-dilemma", {"topic": "Alteridad Radical", "intensity": "Medio"}, 0.2
         )
-        return False
-    except Exception as e:
-        print(f"❌ Error inesperado: {e}")
-        return False
-
-
-def test_topics_endpoint():
-    """Probar endpoint de tópicos disponibles"""
-    print("\n📚 Probando endpoint de tópicos...")
-    try:
-        response = requests.get(f"{BASE_URL}/topics")
-        if response.status_code == 200:
-            data = response.json()
-            print("✅ Endpoint de tópicos OK")
-            print(f"   Tópicos: {data['topics']}")
-            print(f"   Intensidades: {data['intensities']}")
-            return True
-        else:
-            print(f"❌ Error en topics: {response.status_code}")
-            return False
-    except Exception as e:
-        print(f"❌ Error: {e}")
-        return False
-
-
-def test_generate_dilemma():
-    """Probar la generación de dilemas"""
-    print("\n🎯 Probando generación de dilemas...")
-
-    test_cases = [
-        {
-            "topic": "Temporalidad Moral",
-            "intensity": "Suave",
-            "user_context": "Usuario de prueba",
-        },
-        {"topic": "Alteridad Radical", "intensity": "Medio"},
-        {"topic": "Imperativo de Universalización", "intensity": "Extremo"},
-        {"topic": "Ontología de la Ignorancia", "intensity": "Suave"},
-        {"topic": "Economía Moral del Deseo", "intensity": "Medio"},
-        {"topic": "Microética Cotidiana", "intensity": "Extremo"},
-    ]
-
-    results = []
-
-    for i, test_case in enumerate(test_cases, 1):
-        print(f"\n🧪 Caso de prueba {i}:")
-        print(f"   📋 {test_case['topic']} - {test_case['intensity']}")
-
-        try:
-            start_time = time.time()
-            response = requests.post(
-                f"{BASE_URL}/generate-dilemma",
-                json=test_case,
-                timeout=30,  # 30 segundos timeout
-            )
-            end_time = time.time()
-
-            if response.status_code == 200:
-                data = response.json()
-                print(f"✅ Dilema generado en {(end_time - start_time):.2f}s")
-                print(f"   💭 Texto: {data['dilemma_text'][:100]}...")
-                print(
-                    f"   🧠 Fundamentación: {data['philosophical_foundation'][:80]}..."
-                )
-                print(f"   📚 Fuentes: {data['used_sources']}")
-                results.append(
-                    {"test": i, "success": True, "time": end_time - start_time}
-                )
-            else:
-                print(f"❌ Error {response.status_code}: {response.text}")
-                results.append(
-                    {"test": i, "success": False, "error": response.status_code}
-                )
-
-        except requests.exceptions.Timeout:
-            print("❌ Timeout - El servidor tardó más de 30 segundos")
-            results.append({"test": i, "success": False, "error": "timeout"})
-        except Exception as e:
-            print(f"❌ Error: {e}")
-            results.append({"test": i, "success": False, "error": str(e)})
-
-    return results
-
-
-def test_swagger_docs():
-    """Verificar que la documentación Swagger esté disponible"""
-    print("\n📖 Verificando documentación Swagger...")
-    try:
-        response = requests.get(f"{BASE_URL}/docs")
-        if response.status_code == 200:
-            print("✅ Documentación Swagger disponible en http://localhost:8000/docs")
-            return True
-        else:
-            print(f"❌ Error accediendo a docs: {response.status_code}")
-            return False
-    except Exception as e:
-        print(f"❌ Error: {e}")
-        return False
-
-
-def main():
-    print("🧪 RAG DILEMMA API - SUITE DE PRUEBAS")
-    print("=" * 60)
-    print("💡 Asegúrate de que el servidor esté ejecutándose:")
-    print("   python start_api_server.py")
-    print("-" * 60)
-
-    # Ejecutar todas las pruebas
-    tests = [
-        ("Health Check", test_health_endpoint),
-        ("Topics Endpoint", test_topics_endpoint),
-        ("Swagger Docs", test_swagger_docs),
-        ("Generate Dilemma", test_generate_dilemma),
-    ]
-
-    results = []
-
-    for test_name, test_func in tests:
-        print(f"\n🔄 Ejecutando: {test_name}")
-        try:
-            result = test_func()
-            if isinstance(result, list):  # Para test_generate_dilemma que retorna lista
-                success = all(r["success"] for r in result)
-                results.append(
-                    {"name": test_name, "success": success, "details": result}
-                )
-            else:
-                results.append({"name": test_name, "success": result})
-        except Exception as e:
-            print(f"❌ Error crítico en {test_name}: {e}")
-            results.append({"name": test_name, "success": False, "error": str(e)})
-
-    # Resumen final
-    print("\n" + "=" * 60)
-    print("📊 RESUMEN DE PRUEBAS")
-    print("=" * 60)
-
-    successful = sum(1 for r in results if r["success"])
-    total = len(results)
-
-    for result in results:
-        status = "✅" if result["success"] else "❌"
-        print(f"{status} {result['name']}")
-
-    print(f"\n🎯 Resultado final: {successful}/{total} pruebas exitosas")
-
-    if successful == total:
-        print("🎉 ¡TODAS LAS PRUEBAS PASARON!")
-        print("✨ Tu servidor FastAPI está funcionando correctamente")
-        print("🚀 Listo para integrar con Next.js")
-    else:
-        print("⚠️  Algunas pruebas fallaron. Revisa los errores arriba.")
-        sys.exit(1)
+    )
+    assert status == 499
+    assert time.monotonic() - started < 5
+    assert CLIENT_DISCONNECTS.value(stage="llm") - before == 1
+
+
+def test_shards_unavailable_is_503(client, monkeypatch):
+    from core.index_store import new_version_path, publish_version
+    from core.partitions import sync_partitions
+    from core.shards import reshard_version, version_stores
+
+    # Versión en dos shards cuyos procesos no están levantados
+    version = new_version_path()
+    reshard_version("chroma", version, 2)
+    for store_path in version_stores(version):
+        sync_partitions(store_path)
+    monkeypatch.setenv("RAG_SHARD_URLS", "http://127.0.0.1:9,http://127.0.0.1:9")
+    monkeypatch.setenv("RAG_SHARD_TIMEOUT_MS", "200")
+    publish_version(version)
+
+    response = generate(client, "Microética Cotidiana", "Extremo")
+    assert response.status_code == 503
+    assert "shards" in response.json()["detail"]
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Pruebas sin red del almacén compacto de chunks (core/chunk_store.py): los
+offsets del buffer devuelven exactamente los textos originales, también con
+caracteres de varios bytes, leídos por lotes desde Chroma y sobre un buffer ya
+armado como el de los snapshots.
+Ejecutar con: python -m pytest scripts/test_chunk_store.py  (o python scripts/test_chunk_store.py)
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+RAG_DIR = Path(__file__).parent.parent
+sys.path.append(str(RAG_DIR))
+from conftest import AUTHORS, chunk_texts
+from core.chunk_store import (
+    CONTEXT_SEPARATOR,
+    UNKNOWN_SOURCE,
+    ChunkStore,
+    build_chunk_store,
+    get_chunk_store,
+    search_chunks,
+)
+
+TEXTS = {
+    "a": "Lévinas: el rostro del otro me interpela",
+    "b": "",
+    "c": "Bauman — modernidad líquida 🌊, señal y ñandú",
+    "d": "日本語のテキスト",
+    "e": None,
+    "f": "x" * 5000,
+}
+
+
+def make_store() -> ChunkStore:
+    chunks = ChunkStore()
+    for i, (chunk_id, text) in enumerate(TEXTS.items()):
+        chunks.add(chunk_id, text, {"source": f"data/{chunk_id}.pdf", "page": i} if i else None)
+    return chunks.freeze()
+
+
+def test_offsets_return_original_texts():
+    chunks = make_store()
+    assert len(chunks) == len(TEXTS)
+    for chunk_id, text in TEXTS.items():
+        position = chunks.position(chunk_id)
+        assert chunks.text(position) == (text or "")
+        assert bytes(chunks.raw(position)) == (text or "").encode("utf-8")
+    assert chunks.position("no-existe") is None
+    assert chunks.nbytes == sum(len((t or "").encode("utf-8")) for t in TEXTS.values()) + 8 * (
+        len(TEXTS) + 1
+    )
+
+
+def test_context_and_sources():
+    chunks = make_store()
+    positions = [chunks.position(chunk_id) for chunk_id in ("c", "a", "d")]
+    assert chunks.context(positions) == CONTEXT_SEPARATOR.join(
+        TEXTS[chunk_id] for chunk_id in ("c", "a", "d")
+    )
+    # "a" no tiene metadatos
+    assert chunks.context(positions, with_source=True) == CONTEXT_SEPARATOR.join(
+        [
+            f"Fuente: data/c.pdf\n{TEXTS['c']}",
+            f"Fuente: {UNKNOWN_SOURCE}\n{TEXTS['a']}",
+            f"Fuente: data/d.pdf\n{TEXTS['d']}",
+        ]
+    )
+    assert chunks.context([]) == ""
+    first = chunks.position("a")
+    assert chunks.sources([first]) == [UNKNOWN_SOURCE]
+    assert chunks.records[first].metadata() == {}
+    assert chunks.records[chunks.position("c")].metadata() == {"source": "data/c.pdf", "page": 2}
+
+
+def test_from_buffer_shares_layout():
+    chunks = make_store()
+    ids = list(TEXTS)
+    mapped = ChunkStore.from_buffer(
+        ids, chunks._buffer, chunks._offsets, [r.metadata() for r in chunks.records]
+    )
+    for chunk_id, text in TEXTS.items():
+        assert mapped.text(mapped.position(chunk_id)) == (text or "")
+    positions = list(range(len(ids)))
+    assert mapped.context(positions, with_source=True) == chunks.context(
+        positions, with_source=True
+    )
+
+
+@pytest.mark.parametrize("batch_size", [7, 1000])
+def test_build_from_chroma_matches_index(make_index, batch_size):
+    from core.index_store import close_store, open_store
+
+    make_index(count=20)
+    store = open_store("chroma")
+    try:
+        chunks = build_chunk_store(store._collection, batch_size=batch_size)
+        assert len(chunks) == 20 * len(AUTHORS)
+        for partition in AUTHORS:
+            source = f"data/{partition}.pdf"
+            for i, text in enumerate(chunk_texts(partition, 20)):
+                position = chunks.position(f"{source}:{i}:0")
+                assert chunks.text(position) == text
+                assert chunks.records[position].source == source
+                assert chunks.records[position].page == i
+    finally:
+        close_store(store)
+
+
+def test_search_hits_point_to_their_texts(make_index):
+    from core.index_store import close_store, open_store
+
+    make_index()
+    store = open_store("chroma")
+    try:
+        query = chunk_texts("levinas", 20)[7]
+        chunks, hits = search_chunks(store, [store.embeddings.embed_query(query)], k=3)
+        assert chunks is get_chunk_store(store)
+        position, distance = hits[0][0]
+        # El mismo texto que el chunk indexado: distancia 0 y mismo contenido
+        assert chunks.text(position) == query and distance == pytest.approx(0, abs=1e-4)
+        documents = store._collection.get(ids=["data/levinas.pdf:7:0"])["documents"]
+        assert documents == [query]
+    finally:
+        close_store(store)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Prueba del tiempo de arranque: importa los módulos de entrada con
+`python -X importtime` y verifica que estén dentro del presupuesto y que no
+carguen dependencias pesadas (LangChain, Chroma, OpenAI) al importarse.
+Ejecutar con: python scripts/test_import_time.py [--report]
+         o: python -m pytest scripts/test_import_time.py
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+RAG_DIR = Path(__file__).parent.parent
+
+# Módulo -> presupuesto en ms (tiempo acumulado de importación)
+IMPORT_BUDGETS_MS = {
+    "core": 50,
+    "core.generate_dilemma_rag": 100,
+    "core.create_database": 100,
+    "api.server": 1000,  # dominado por el import de FastAPI
+}
+
+# Paquetes que solo deben cargarse cuando se usan
+HEAVY_PACKAGES = (
+    "langchain",
+    "langchain_core",
+    "langchain_community",
+    "langchain_openai",
+    "langchain_text_splitters",
+    "chromadb",
+    "openai",
+    "pypdf",
+)
+
+
+def measure_import(module: str):
+    """
+    Importa `module` en un proceso nuevo sin OPENAI_API_KEY y devuelve
+    (tiempo acumulado en ms, {paquete: ms propio}) según -X importtime
+    """
+    env = {k: v for k, v in os.environ.items() if k != "OPENAI_API_KEY"}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=RAG_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    cumulative_ms = 0.0
+    packages = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        # "import time: self [us] | cumulative | imported package"
+        parts = [p.strip() for p in line[len("import time:") :].split("|")]
+        if len(parts) != 3:
+            continue
+        self_us, cumulative_us, name = parts
+        if not self_us.isdigit():
+            continue  # cabecera
+        top_level = name.split(".")[0]
+        packages[top_level] = packages.get(top_level, 0) + int(self_us) / 1000
+        if name == module:
+            cumulative_ms = int(cumulative_us) / 1000
+    return cumulative_ms, packages
+
+
+def check_import_budgets(runs: int = 3, report: bool = False) -> bool:
+    print("⏱️  Verificando tiempos de importación...")
+    ok = True
+    for module, budget_ms in IMPORT_BUDGETS_MS.items():
+        try:
+            # Mejor de N ejecuciones para reducir el ruido
+            measurements = [measure_import(module) for _ in range(runs)]
+        except RuntimeError as e:
+            print(f"❌ {module}: falla al importar sin OPENAI_API_KEY: {e}")
+            ok = False
+            continue
+
+        cumulative_ms, packages = min(measurements, key=lambda m: m[0])
+        heavy = sorted(p for p in packages if p in HEAVY_PACKAGES)
+        status = cumulative_ms <= budget_ms and not heavy
+        ok = ok and status
+        print(
+            f"{'✅' if status else '❌'} {module}: {cumulative_ms:.1f}ms "
+            f"(presupuesto {budget_ms}ms)"
+        )
+        if heavy:
+            print(f"   📦 Dependencias pesadas cargadas al importar: {', '.join(heavy)}")
+        if report:
+            top = sorted(packages.items(), key=lambda item: -item[1])[:8]
+            for name, ms in top:
+                print(f"      {ms:8.1f}ms  {name}")
+    return ok
+
+
+def test_import_budgets():
+    """Misma verificación para pytest"""
+    assert check_import_budgets(), "Hay módulos fuera del presupuesto de importación"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba del tiempo de arranque")
+    parser.add_argument("--runs", type=int, default=3, help="Ejecuciones por módulo")
+    parser.add_argument(
+        "--report", action="store_true", help="Mostrar los paquetes más lentos"
+    )
+    args = parser.parse_args()
+
+    print("🚀 PRUEBA DE TIEMPO DE ARRANQUE")
+    print("=" * 60)
+    if check_import_budgets(args.runs, args.report):
+        print("\n🎉 Todos los módulos están dentro del presupuesto")
+    else:
+        print("\n⚠️  Hay módulos fuera del presupuesto")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Pruebas sin red de las versiones del índice (core/index_store.py): publicación,
+cambio en caliente del IndexManager, leases y limpieza de versiones viejas.
+Usan embeddings hash sobre índices pequeños en un directorio temporal.
+Ejecutar con: python -m pytest scripts/test_index_store.py  (o python scripts/test_index_store.py)
+"""
+
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+RAG_DIR = Path(__file__).parent.parent
+sys.path.append(str(RAG_DIR))
+from core import index_store
+from core.index_store import (
+    IndexManager,
+    collect_garbage,
+    live_index_path,
+    new_version_path,
+    publish_version,
+)
+
+
+def wait_until(condition, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+
+def leases(root: str = "chroma"):
+    leases_dir = root + index_store.LEASES_SUFFIX
+    return sorted(os.listdir(leases_dir)) if os.path.isdir(leases_dir) else []
+
+
+@pytest.fixture
+def versions(make_index):
+    """Dos versiones construidas; solo la primera publicada"""
+    old = make_index(new_version_path())
+    publish_version(old)
+    new = make_index(new_version_path())
+    return old, new
+
+
+def test_publish_switches_pointer(versions):
+    old, new = versions
+    assert live_index_path() == old
+    publish_version(new)
+    assert live_index_path() == new
+    with pytest.raises(FileNotFoundError):
+        publish_version("chroma_no_existe")
+    assert live_index_path() == new
+
+
+def test_gc_keeps_unpublished_and_live_versions(versions):
+    old, new = versions
+    # `new` es más nueva y aún no se publicó: no se toca
+    assert collect_garbage() == []
+    publish_version(new)
+    assert collect_garbage() == [old]
+    assert not os.path.exists(old) and os.path.isdir(new)
+
+
+def test_gc_waits_for_lease(versions):
+    old, new = versions
+    manager = IndexManager(check_interval=3600)
+    assert manager.reload() == old
+    lease = f"{os.path.basename(old)}.{os.getpid()}"
+    assert leases() == [lease]
+
+    with manager.acquire() as store:
+        publish_version(new)
+        assert manager.reload() == new
+        # La petición en curso sigue con la versión vieja: lease y disco intactos
+        assert manager.status()["draining"] == [{"path": old, "in_flight": 1}]
+        assert lease in leases()
+        assert collect_garbage() == []
+        assert os.path.isdir(old)
+        assert store._collection.count() == 40
+
+    # Al terminar la petición se libera el lease y la limpieza la borra
+    assert manager.status()["draining"] == []
+    assert lease not in leases()
+    assert wait_until(lambda: not os.path.exists(old))
+    assert os.path.isdir(new)
+    assert leases() == [f"{os.path.basename(new)}.{os.getpid()}"]
+
+
+def test_gc_respects_other_process_lease(versions):
+    old, new = versions
+    other = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"])
+    try:
+        os.makedirs("chroma" + index_store.LEASES_SUFFIX, exist_ok=True)
+        lease = os.path.join(
+            "chroma" + index_store.LEASES_SUFFIX, f"{os.path.basename(old)}.{other.pid}"
+        )
+        open(lease, "w").close()
+        publish_version(new)
+        assert collect_garbage() == []
+    finally:
+        other.kill()
+        other.wait()
+    # El proceso terminó sin liberar el lease: se descarta y la versión se borra
+    assert collect_garbage() == [old]
+    assert not os.path.exists(lease)
+
+
+def test_background_reload(versions):
+    old, new = versions
+    manager = IndexManager(check_interval=0)
+    assert manager.reload() == old
+    publish_version(new)
+    # La primera petición tras publicar dispara la apertura en segundo plano
+    # y sigue con la versión activa
+    with manager.acquire():
+        pass
+    assert wait_until(lambda: manager.status()["live"] == new)
+    with manager.acquire() as store:
+        assert store._collection.count() == 40
+    assert wait_until(lambda: not os.path.exists(old))
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Prueba de la atribución de componentes del perfilador (api/profiling.py):
+arma pilas sintéticas con marcos de los módulos de cada componente y verifica
+la raíz que les asigna SamplingProfiler, sin servidor ni red.
+Ejecutar con: python scripts/test_profiling.py
+"""
+
+import sys
+from pathlib import Path
+
+RAG_DIR = Path(__file__).parent.parent
+sys.path.append(str(RAG_DIR))
+from api.profiling import SamplingProfiler
+
+# Pila (de la raíz a la hoja) -> componente esperado
+STACKS = [
+    (
+        [
+            "core.generate_dilemma_rag",
+            "langchain_openai.embeddings.base",
+            "openai.resources.embeddings",
+            "openai._base_client",
+            "httpx._client",
+        ],
+        "embedding",
+    ),
+    (
+        [
+            "core.generate_dilemma_rag",
+            "openai.resources.chat.completions",
+            "openai._base_client",
+        ],
+        "openai",
+    ),
+    (["core.ingest_jobs", "langchain_community.document_loaders", "pypdf._page"], "pypdf"),
+    (["core.partitions", "chromadb.api.models.Collection"], "chroma"),
+    (["api.routes", "core.chunk_store"], "other"),
+]
+
+
+def synthetic_frame(modules):
+    """Marco hoja de una cadena de llamadas, una función por módulo"""
+    leaf = {}
+
+    def call_next(depth):
+        if depth == len(modules):
+            leaf["frame"] = sys._getframe(1)
+            return
+        namespace = {"__name__": modules[depth], "call_next": call_next}
+        exec("def step(depth):\n    call_next(depth)\n", namespace)
+        namespace["step"](depth + 1)
+
+    call_next(0)
+    return leaf["frame"]
+
+
+def test_components():
+    profiler = SamplingProfiler(include_idle=True)
+    ok = True
+    for modules, expected in STACKS:
+        stack = profiler._collapse(synthetic_frame(modules))
+        component = stack.split(";", 1)[0]
+        status = component == f"[{expected}]"
+        ok = ok and status
+        print(f"{'✅' if status else '❌'} {' > '.join(modules)}: {component}")
+    assert ok, "Hay pilas atribuidas a otro componente"
+
+
+def main():
+    print("🔥 PRUEBA DE COMPONENTES DEL PERFILADOR")
+    print("=" * 60)
+    try:
+        test_components()
+    except AssertionError as e:
+        print(f"\n⚠️  {e}")
+        sys.exit(1)
+    print("\n🎉 Todas las pilas se atribuyen a su componente")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Pruebas sin red de la agrupación de consultas (core/query_batcher.py) y del
+presupuesto de tiempo (core/deadline.py): ventana y tamaño máximo de los
+lotes, una búsqueda por combinación de filtros, cada resultado a quien lo
+pidió, y plazos que vencen esperando un lote o una llamada colgada sin
+bloquear a las peticiones siguientes.
+Ejecutar con: python -m pytest scripts/test_query_batcher.py  (o python scripts/test_query_batcher.py)
+"""
+
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+RAG_DIR = Path(__file__).parent.parent
+sys.path.append(str(RAG_DIR))
+from core import deadline as deadline_module
+from core import query_batcher
+from core.deadline import Deadline, DeadlineExceeded
+from core.metrics import DEADLINE_ABANDONED_CALLS
+from core.query_batcher import QueryBatcher
+
+TOPIC = "Alteridad Radical"
+
+
+class FakeEmbeddings:
+    """Embedding de una dimensión: el número al final de la consulta"""
+
+    def __init__(self, gate: threading.Event = None):
+        self.calls = []
+        self.gate = gate
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        if self.gate is not None:
+            self.gate.wait(10)
+        return [[float(text.rsplit(" ", 1)[1])] for text in texts]
+
+
+class FakeStore:
+    def __init__(self, gate: threading.Event = None):
+        self.embeddings = FakeEmbeddings(gate)
+
+
+@pytest.fixture
+def searches(monkeypatch):
+    """
+    Reemplaza search_chunks: cada consulta recibe un hit con su propio
+    embedding y la distancia `k`. Retorna las búsquedas hechas (filtros, k, n)
+    """
+    calls = []
+
+    def search_chunks(store, embeddings, k, search_filters=None):
+        calls.append((search_filters, k, len(embeddings)))
+        return None, [[(int(embedding[0]), float(k))] for embedding in embeddings]
+
+    monkeypatch.setattr(query_batcher, "search_chunks", search_chunks)
+    return calls
+
+
+def submit_all(batcher, store, jobs):
+    """Encola (número, k, filtros) a la vez, cada uno desde su hilo"""
+    futures = {}
+
+    def submit(number, k, search_filters):
+        futures[number] = batcher.submit(store, f"consulta {number}", k, search_filters)
+
+    threads = [threading.Thread(target=submit, args=job) for job in jobs]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return futures
+
+
+def test_results_go_back_to_each_caller(searches):
+    batcher = QueryBatcher(window_ms=100, max_size=32)
+    store = FakeStore()
+    levinas = {"partitions": ["levinas"]}
+    bauman = {"partitions": ["bauman"]}
+    jobs = [
+        (0, 6, None),
+        (1, 6, levinas),
+        (2, 6, bauman),
+        (3, 6, levinas),
+        (4, 3, levinas),
+        (5, 6, None),
+    ]
+    futures = submit_all(batcher, store, jobs)
+
+    for number, k, _ in jobs:
+        result = futures[number].result(timeout=5)
+        assert result.hits == [(number, float(k))]
+        assert result.embedding == [float(number)]
+        assert result.embedded and result.batch_size == len(jobs)
+    # Un solo embedding para el lote y una búsqueda por filtros y k
+    assert len(store.embeddings.calls) == 1
+    assert sorted(store.embeddings.calls[0]) == sorted(f"consulta {n}" for n, _, _ in jobs)
+    assert sorted(searches, key=repr) == sorted(
+        [(None, 6, 2), (levinas, 6, 2), (bauman, 6, 1), (levinas, 3, 1)], key=repr
+    )
+
+
+def test_given_embedding_is_not_recomputed(searches):
+    batcher = QueryBatcher(window_ms=50)
+    store = FakeStore()
+    given = batcher.submit(store, "consulta 1", 6, embedding=[7.0])
+    computed = batcher.submit(store, "consulta 2", 6)
+    assert given.result(timeout=5).hits == [(7, 6.0)]
+    assert not given.result().embedded
+    assert computed.result(timeout=5).embedded
+    assert store.embeddings.calls == [["consulta 2"]]
+
+
+def test_max_size_splits_batches(searches):
+    batcher = QueryBatcher(window_ms=300, max_size=3)
+    futures = submit_all(batcher, FakeStore(), [(n, 6, None) for n in range(7)])
+    sizes = sorted(future.result(timeout=5).batch_size for future in futures.values())
+    assert sizes == [1, 3, 3, 3, 3, 3, 3]
+    assert all(futures[n].result().hits == [(n, 6.0)] for n in range(7))
+
+
+def test_window_closes_batch(searches):
+    batcher = QueryBatcher(window_ms=20)
+    store = FakeStore()
+    first = batcher.submit(store, "consulta 1", 6)
+    time.sleep(0.2)
+    # Llega después de la ventana del primero: lote aparte
+    second = batcher.submit(store, "consulta 2", 6)
+    assert first.result(timeout=5).batch_size == 1
+    assert second.result(timeout=5).batch_size == 1
+    assert store.embeddings.calls == [["consulta 1"], ["consulta 2"]]
+
+
+def test_batch_error_only_fails_its_store(searches):
+    batcher = QueryBatcher(window_ms=100)
+
+    class BrokenEmbeddings:
+        def embed_documents(self, texts):
+            raise RuntimeError("embedding caído")
+
+    broken = FakeStore()
+    broken.embeddings = BrokenEmbeddings()
+    failed = batcher.submit(broken, "consulta 1", 6)
+    ok = batcher.submit(FakeStore(), "consulta 2", 6)
+    with pytest.raises(RuntimeError, match="embedding caído"):
+        failed.result(timeout=5)
+    assert ok.result(timeout=5).hits == [(2, 6.0)]
+
+
+def test_deadline_expires_waiting_for_batch(searches):
+    gate = threading.Event()
+    batcher = QueryBatcher(window_ms=1, max_inflight=1)
+    # Un lote colgado ocupa el único lugar
+    stuck = batcher.submit(FakeStore(gate), "consulta 1", 6)
+    time.sleep(0.05)
+    waiting_store = FakeStore()
+    deadline = Deadline(100)
+    with pytest.raises(DeadlineExceeded) as excinfo:
+        deadline.wait("query_batch", batcher.submit(waiting_store, "consulta 2", 6))
+    assert excinfo.value.stage == "query_batch"
+
+    gate.set()
+    assert stuck.result(timeout=5).hits == [(1, 6.0)]
+    # La consulta abandonada no se calcula y el despachador sigue atendiendo
+    assert batcher.submit(waiting_store, "consulta 3", 6).result(timeout=5).hits == [(3, 6.0)]
+    assert waiting_store.embeddings.calls == [["consulta 3"]]
+
+
+def test_deadline_serves_fallback_without_blocking_batcher(make_index, monkeypatch):
+    from core import fallback_cache
+    from core.generate_dilemma_rag import fallback_dilemma, generate_dilemma_with_rag
+
+    make_index()
+    monkeypatch.setattr(fallback_cache, "_fallback_cache", None)
+    batcher = QueryBatcher(window_ms=1, max_inflight=1)
+    monkeypatch.setattr(query_batcher, "_query_batcher", batcher)
+    generated = generate_dilemma_with_rag(TOPIC, "Medio")
+
+    gate = threading.Event()
+    # Lote colgado en el embedding (su búsqueda después falla: no es un Chroma)
+    stuck = batcher.submit(FakeStore(gate), "consulta 1", 6)
+    time.sleep(0.05)
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded) as excinfo:
+        generate_dilemma_with_rag(TOPIC, "Medio", deadline=Deadline(200))
+    assert excinfo.value.stage == "query_batch"
+    assert time.monotonic() - started < 2
+    # El mismo camino que /generate-dilemma: el dilema reciente como respaldo
+    fallback = fallback_dilemma(TOPIC, "Medio")
+    assert fallback["fallback"] and fallback["dilemma_text"] == generated["dilemma_text"]
+
+    gate.set()
+    stuck.exception(timeout=5)
+    assert not generate_dilemma_with_rag(TOPIC, "Medio", deadline=Deadline(5000)).get(
+        "fallback"
+    )
+
+
+def test_abandoned_calls_are_bounded(monkeypatch):
+    monkeypatch.setenv("RAG_DEADLINE_MAX_CALLS", "2")
+    monkeypatch.setattr(deadline_module, "_executor", None)
+    monkeypatch.setattr(deadline_module, "_call_slots", None)
+    gate = threading.Event()
+    ran = []
+
+    def hang(name):
+        ran.append(name)
+        gate.wait(10)
+        return name
+
+    abandoned = DEADLINE_ABANDONED_CALLS.value()
+    try:
+        for name in ("a", "b"):
+            with pytest.raises(DeadlineExceeded):
+                Deadline(50).run("embed_query", hang, name)
+        assert DEADLINE_ABANDONED_CALLS.value() - abandoned == 2
+
+        # Los dos hilos están colgados: la siguiente no se encola detrás, agota
+        # su plazo esperando un lugar y nunca se ejecuta
+        started = time.monotonic()
+        with pytest.raises(DeadlineExceeded) as excinfo:
+            Deadline(100).run("embed_query", hang, "c")
+        assert excinfo.value.stage == "embed_query"
+        assert time.monotonic() - started < 1
+        assert ran == ["a", "b"]
+    finally:
+        gate.set()
+
+    # Al terminar las abandonadas se liberan sus lugares
+    assert Deadline(5000).run("embed_query", lambda: "ok") == "ok"
+    deadline_module._executor.shutdown(wait=True)
+    assert DEADLINE_ABANDONED_CALLS.value() == abandoned
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -9,6 +9,7 @@ from pathlib import Path
 
 sys.path.append(str(Path(__file__).parent.parent))
 from core.generate_dilemma_rag import generate_dilemma_with_rag
+from core.index_store import index_exists
 import os
 
 
@@ -19,7 +20,7 @@ def test_dilemma_generation():
     print("=" * 60)
 
     # Verificar que existe la base de datos
-    if not os.path.exists("chroma"):
+    if not index_exists():
         print("❌ ERROR: No se encontró la carpeta 'chroma'")
         print(
             "💡 SOLUCIÓN: Ejecuta primero 'python core/create_database.py' para crear la base de datos"
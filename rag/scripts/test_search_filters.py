@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Pruebas sin red de los filtros de búsqueda por autor u obra
+(core/source_catalog.py): un filtro fuera del catálogo se rechaza (400) y uno
+catalogado sin fuentes en el índice falla (404) en lugar de generar sin
+contexto, tanto en QueryEngine como en /generate-dilemma.
+Ejecutar con: python -m pytest scripts/test_search_filters.py  (o python scripts/test_search_filters.py)
+"""
+
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+RAG_DIR = Path(__file__).parent.parent
+sys.path.append(str(RAG_DIR))
+from core import source_catalog
+from core.source_catalog import FiltersNotIndexed, resolve_search_filters
+
+TOPIC = "Alteridad Radical"
+
+
+@pytest.fixture
+def index(make_index, monkeypatch):
+    """Índice con Bauman y Levinas; Hans Jonas está en el catálogo pero no indexado"""
+    make_index()
+    with open(source_catalog.CATALOG_PATH, encoding="utf-8") as f:
+        catalog = json.load(f)
+    catalog["sources"]["jonas.pdf"] = {
+        "author": "Hans Jonas",
+        "work": "El principio de responsabilidad",
+        "partition": "jonas",
+    }
+    with open(source_catalog.CATALOG_PATH, "w", encoding="utf-8") as f:
+        json.dump(catalog, f, ensure_ascii=False)
+    monkeypatch.setitem(source_catalog._catalog_cache, "mtime", None)
+
+
+def test_unknown_values_are_rejected(index):
+    with pytest.raises(ValueError):
+        resolve_search_filters(TOPIC, authors=["Nadie"])
+    with pytest.raises(ValueError):
+        resolve_search_filters(TOPIC, works=["Obra inexistente"])
+    # Catalogado: se resuelve aunque no esté indexado
+    assert resolve_search_filters(TOPIC, authors=["Hans Jonas"])["partitions"] == ["jonas"]
+
+
+def test_query_engine(index):
+    from core.query_data import QueryEngine
+
+    record = QueryEngine(k=3, filters={"authors": ["levinas"]}).answer("¿Qué debo al otro?")
+    assert "error" not in record
+    assert record["sources"] and all(s.endswith("levinas.pdf") for s in record["sources"])
+
+    engine = QueryEngine(k=3, filters={"works": ["El principio de responsabilidad"]})
+    with pytest.raises(FiltersNotIndexed):
+        engine.answer("¿Qué debo a las generaciones futuras?")
+
+
+@pytest.mark.parametrize("window_ms", ["5", "0"])
+def test_generate_dilemma(index, monkeypatch, window_ms):
+    # Con y sin agrupación de consultas (core/query_batcher.py)
+    monkeypatch.setenv("RAG_BATCH_WINDOW_MS", window_ms)
+    from core.generate_dilemma_rag import generate_dilemma_with_rag
+
+    result = generate_dilemma_with_rag(TOPIC, "Medio", filters={"authors": ["Bauman"]})
+    sources = result["sources_metadata"]
+    assert sources and all(s.endswith("bauman.pdf") for s in sources)
+    with pytest.raises(FiltersNotIndexed):
+        generate_dilemma_with_rag(TOPIC, "Medio", filters={"authors": ["Hans Jonas"]})
+
+
+def test_api_status_codes(index):
+    from fastapi.testclient import TestClient
+
+    from api.server import app
+
+    def generate(filters):
+        return client.post(
+            "/generate-dilemma",
+            json={"topic": TOPIC, "intensity": "Suave", "filters": filters},
+        )
+
+    with TestClient(app) as client:
+        assert generate({"authors": ["levinas"]}).status_code == 200
+        assert generate({"authors": ["Nadie"]}).status_code == 400
+        response = generate({"authors": ["Hans Jonas"]})
+        assert response.status_code == 404
+        assert "no en el índice" in response.json()["detail"]
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
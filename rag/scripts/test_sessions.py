@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Pruebas sin red de las sesiones (core/session_store.py y api/sessions.py):
+expiración por inactividad, límite RAG_SESSION_MAX, caché del embedding de
+la consulta de la sesión y 404 para ids desconocidos.
+Ejecutar con: python -m pytest scripts/test_sessions.py  (o python scripts/test_sessions.py)
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+RAG_DIR = Path(__file__).parent.parent
+sys.path.append(str(RAG_DIR))
+from core import session_store
+from core.metrics import SESSION_EMBEDDING_CACHE
+from core.session_store import SessionNotFound, SessionStore, get_session_store
+
+TOPIC = "Alteridad Radical"
+
+
+@pytest.fixture
+def sessions(monkeypatch):
+    """SessionStore del proceso nuevo para cada prueba"""
+    monkeypatch.setattr(session_store, "_session_store", None)
+    return get_session_store
+
+
+def test_ttl_expiry():
+    store = SessionStore(ttl=0.2)
+    kept, expired = store.create(), store.create()
+    time.sleep(0.12)
+    # Usarla renueva su plazo
+    assert store.get(kept.id) is kept
+    time.sleep(0.12)
+    assert store.get(kept.id) is kept
+    assert store.get(expired.id) is None
+    with pytest.raises(SessionNotFound):
+        store.require(expired.id)
+    time.sleep(0.25)
+    assert len(store) == 0
+
+
+def test_max_sessions_evicts_least_recent(sessions, monkeypatch):
+    monkeypatch.setenv("RAG_SESSION_MAX", "2")
+    store = sessions()
+    first, second = store.create(), store.create()
+    store.get(first.id)
+    third = store.create()
+    assert len(store) == 2
+    assert store.get(second.id) is None
+    assert store.get(first.id) is first and store.get(third.id) is third
+
+
+def test_embedding_cache_reset_on_answer():
+    session = SessionStore().create()
+    dilemma_id = session.add_dilemma(TOPIC, "Medio", "¿Mentir para proteger?", "lealtad")
+    session.cache_embedding("consulta", [0.1, 0.2])
+    assert session.cached_embedding("consulta") == [0.1, 0.2]
+    assert session.add_answer("Sí, por lealtad", dilemma_id)
+    assert session.cached_embedding("consulta") is None
+    assert not session.add_answer("respuesta", "no-existe")
+
+
+def test_generation_reuses_embedding_until_history_changes(make_index, sessions):
+    from core.generate_dilemma_rag import generate_dilemma_with_rag
+
+    make_index()
+    session = sessions().create()
+
+    def misses_and_hits():
+        return (
+            SESSION_EMBEDDING_CACHE.value(result="miss"),
+            SESSION_EMBEDDING_CACHE.value(result="hit"),
+        )
+
+    before = misses_and_hits()
+    first = generate_dilemma_with_rag(TOPIC, "Medio", session_id=session.id)
+    generate_dilemma_with_rag(TOPIC, "Medio", session_id=session.id)
+    after = misses_and_hits()
+    assert (after[0] - before[0], after[1] - before[1]) == (1, 1)
+
+    # Responder cambia el contexto de búsqueda: se vuelve a calcular
+    session.add_answer("Priorizo al otro", first["dilemma_id"])
+    generate_dilemma_with_rag(TOPIC, "Medio", session_id=session.id)
+    assert misses_and_hits()[0] - after[0] == 1
+    assert session.to_dict()["total_dilemmas"] == 3
+
+
+def test_api_unknown_session_is_404(make_index, sessions):
+    from fastapi.testclient import TestClient
+
+    from api.server import app
+
+    make_index()
+    with TestClient(app) as client:
+        created = client.post("/sessions")
+        assert created.status_code == 201
+        session_id = created.json()["session_id"]
+
+        generated = client.post(
+            "/generate-dilemma",
+            json={"topic": TOPIC, "intensity": "Suave", "session_id": session_id},
+        )
+        assert generated.status_code == 200
+        dilemma_id = generated.json()["dilemma_id"]
+        answered = client.post(
+            f"/sessions/{session_id}/answers",
+            json={"answer": "Priorizo al otro", "dilemma_id": dilemma_id},
+        )
+        assert answered.status_code == 200
+        assert answered.json()["total_answers"] == 1
+        missing_dilemma = client.post(
+            f"/sessions/{session_id}/answers",
+            json={"answer": "x", "dilemma_id": "no-existe"},
+        )
+        assert missing_dilemma.status_code == 404
+
+        unknown = "sesion-desconocida"
+        assert client.get(f"/sessions/{unknown}").status_code == 404
+        assert (
+            client.post(f"/sessions/{unknown}/answers", json={"answer": "x"}).status_code
+            == 404
+        )
+        assert client.delete(f"/sessions/{unknown}").status_code == 404
+        generated = client.post(
+            "/generate-dilemma",
+            json={"topic": TOPIC, "intensity": "Suave", "session_id": unknown},
+        )
+        assert generated.status_code == 404
+        # No se creó una sesión vacía con ese id
+        assert get_session_store().get(unknown) is None
+
+        assert client.delete(f"/sessions/{session_id}").status_code == 204
+        assert client.get(f"/sessions/{session_id}").status_code == 404
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
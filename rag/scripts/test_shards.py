@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Prueba del coordinador de shards (core/shards.py) sin procesos de shard:
+los shards se simulan con un transporte httpx en memoria.
+
+Verifica que la espera en el pool local no cuente como timeout del shard,
+que un timeout real sí lo deje fuera, y que los resultados de otra versión
+del índice se descarten en lugar de mezclarse.
+Ejecutar con: python scripts/test_shards.py  (o pytest scripts/test_shards.py)
+"""
+
+import json
+import sys
+import threading
+import time
+from pathlib import Path
+
+RAG_DIR = Path(__file__).parent.parent
+sys.path.append(str(RAG_DIR))
+import httpx
+
+from core.shards import ShardedStore, ShardsUnavailable
+
+VERSION = "chroma_20260101T000000"
+
+
+def make_store(handler, shards=1, **kwargs) -> ShardedStore:
+    """ShardedStore sobre shards simulados; `handler(shard, body)` responde cada consulta"""
+    urls = [f"http://shard{shard}" for shard in range(shards)]
+    store = ShardedStore(f"/tmp/{VERSION}", urls, None, **kwargs)
+
+    def route(request: httpx.Request) -> httpx.Response:
+        shard = urls.index(f"{request.url.scheme}://{request.url.host}")
+        return handler(shard, json.loads(request.content))
+
+    store._client.close()
+    store._client = httpx.Client(transport=httpx.MockTransport(route))
+    return store
+
+
+def answer(shard, body, version=VERSION):
+    hits = [[f"s{shard}:{i}", shard + i / 10, f"texto {shard}", {}] for i in range(body["k"])]
+    return httpx.Response(
+        200, json={"shard": shard, "version": version, "results": [hits]}
+    )
+
+
+def test_local_queue_is_not_a_shard_timeout():
+    def slow(shard, body):
+        time.sleep(0.05)
+        return answer(shard, body)
+
+    # 8 hilos para 40 búsquedas a la vez: la mayoría espera en la cola local
+    # bastante más que el plazo de 0.1s de cada petición
+    store = make_store(slow, timeout=0.1, max_wait=5.0)
+    errors = []
+
+    def search():
+        try:
+            store._scatter([[0.0, 1.0]], 2, None)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=search) for _ in range(40)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    store.close()
+    assert not errors, errors
+    assert store._down_until == [0.0]
+
+
+def test_shard_timeout_marks_it_down():
+    def stuck(shard, body):
+        if shard == 1:
+            raise httpx.ReadTimeout("sin respuesta")
+        return answer(shard, body)
+
+    store = make_store(stuck, shards=2, retry_after=60)
+    merged = store._scatter([[0.0, 1.0]], 2, None)
+    store.close()
+    assert [hit[0] for hit in merged[0]] == ["s0:0", "s0:1"]
+    assert store._down_until[0] == 0.0
+    assert store._down_until[1] > time.monotonic()
+
+
+def test_local_give_up_does_not_mark_down():
+    def slow(shard, body):
+        time.sleep(0.3)
+        return answer(shard, body)
+
+    store = make_store(slow, timeout=1.0, max_wait=0.05)
+    try:
+        store._scatter([[0.0, 1.0]], 2, None)
+    except ShardsUnavailable:
+        pass
+    else:
+        raise AssertionError("Se esperaba ShardsUnavailable")
+    time.sleep(0.4)
+    store.close()
+    assert store._down_until == [0.0]
+
+
+def test_other_version_is_rejected():
+    def swapping(shard, body):
+        assert body["version"] == VERSION
+        if shard == 1:
+            return answer(shard, body, version="chroma_20260102T000000")
+        return answer(shard, body)
+
+    store = make_store(swapping, shards=2)
+    merged = store._scatter([[0.0, 1.0]], 4, None)
+    assert {hit[0].split(":")[0] for hit in merged[0]} == {"s0"}
+    # Buscar en otra versión no es una falla del shard
+    assert store._down_until == [0.0, 0.0]
+
+    store.min_shards = 2
+    try:
+        store._scatter([[0.0, 1.0]], 4, None)
+    except ShardsUnavailable:
+        pass
+    else:
+        raise AssertionError("Se esperaba ShardsUnavailable")
+    store.close()
+
+
+def test_conflict_is_rejected():
+    def conflict(shard, body):
+        if shard == 0:
+            return httpx.Response(409, json={"detail": "otra versión"})
+        return answer(shard, body)
+
+    store = make_store(conflict, shards=2)
+    merged = store._scatter([[0.0, 1.0]], 2, None)
+    store.close()
+    assert [hit[0] for hit in merged[0]] == ["s1:0", "s1:1"]
+    assert store._down_until == [0.0, 0.0]
+
+
+def main():
+    print("🧩 PRUEBA DEL COORDINADOR DE SHARDS")
+    print("=" * 60)
+    tests = [
+        test_local_queue_is_not_a_shard_timeout,
+        test_shard_timeout_marks_it_down,
+        test_local_give_up_does_not_mark_down,
+        test_other_version_is_rejected,
+        test_conflict_is_rejected,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e}")
+    if failed:
+        print(f"\n⚠️  {failed} pruebas fallaron")
+        sys.exit(1)
+    print("\n🎉 Todas las pruebas pasaron")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Pruebas sin red de los snapshots del índice (core/snapshot.py), con
+embeddings hash sobre un índice pequeño construido en un directorio temporal:
+ida y vuelta export → verify → import con los mismos textos y resultados,
+archivos dañados rechazados por el sha256, distancia y lock de ingesta.
+Ejecutar con: python -m pytest scripts/test_snapshot.py  (o python scripts/test_snapshot.py)
+"""
+
+import fcntl
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+RAG_DIR = Path(__file__).parent.parent
+sys.path.append(str(RAG_DIR))
+from conftest import AUTHORS, chunk_texts
+from core.chunk_store import search_chunks
+from core.index_store import close_store, live_index_path, open_store
+from core.ingest_jobs import LOCK_PATH
+from core.snapshot import Snapshot, export_snapshot, import_snapshot, restore_snapshot
+
+
+def search(store, query: str, search_filters=None):
+    """
+    Texto y fuente del primer resultado de `query` y las distancias de los 5
+    primeros (con embeddings hash hay empates, el orden entre ellos puede variar)
+    """
+    chunks, hits = search_chunks(
+        store, [store.embeddings.embed_query(query)], k=5, search_filters=search_filters
+    )
+    position = hits[0][0][0]
+    distances = [round(distance, 4) for _, distance in hits[0]]
+    return chunks.text(position), chunks.records[position].source, distances
+
+
+def test_export_verify_import_roundtrip(make_index):
+    make_index("fuente")
+    manifest = export_snapshot("fuente", "indice.ragsnap")
+    assert manifest["count"] == 20 * len(AUTHORS)
+
+    snapshot = Snapshot("indice.ragsnap")
+    try:
+        snapshot.verify()
+        assert snapshot.manifest["checksum"] == manifest["checksum"]
+        assert snapshot.array("vectors").shape[0] == manifest["count"]
+    finally:
+        snapshot.close()
+
+    version = import_snapshot("indice.ragsnap")
+    assert live_index_path() == version
+    imported, original = open_store(version), open_store("fuente")
+    try:
+        chunks, _ = search_chunks(imported, [imported.embeddings.embed_query("otro")], k=1)
+        for partition in AUTHORS:
+            source = f"data/{partition}.pdf"
+            for i, text in enumerate(chunk_texts(partition, 20)):
+                position = chunks.position(f"{source}:{i}:0")
+                assert chunks.text(position) == text
+                assert chunks.records[position].metadata()["page"] == i
+        query = chunk_texts("levinas", 20)[7]
+        text, source, _ = found = search(imported, query)
+        assert (text, source) == (query, "data/levinas.pdf")
+        assert found == search(original, query)
+        bauman = {"partitions": ["bauman"]}
+        assert search(imported, query, bauman) == search(original, query, bauman)
+        assert search(imported, query, bauman)[1] == "data/bauman.pdf"
+    finally:
+        close_store(imported)
+        close_store(original)
+
+    # Exportar una versión importada copia el mismo archivo
+    assert export_snapshot(version, "copia.ragsnap")["checksum"] == manifest["checksum"]
+    assert open("copia.ragsnap", "rb").read() == open("indice.ragsnap", "rb").read()
+
+
+def test_corrupted_snapshot_is_rejected(make_index):
+    make_index("fuente")
+    export_snapshot("fuente", "indice.ragsnap")
+    data = bytearray(open("indice.ragsnap", "rb").read())
+    # Un byte del final (textos u offsets), dentro de las secciones
+    data[-10] ^= 0xFF
+    with open("dañado.ragsnap", "wb") as f:
+        f.write(data)
+
+    with pytest.raises(ValueError, match="Checksum"):
+        Snapshot("dañado.ragsnap")
+    with pytest.raises(ValueError, match="Checksum"):
+        import_snapshot("dañado.ragsnap")
+    # No quedó ninguna versión a medias ni publicada
+    assert not os.path.exists("chroma.current")
+    assert not [name for name in os.listdir(".") if name.startswith("chroma")]
+
+    with open("truncado.ragsnap", "wb") as f:
+        f.write(data[: len(data) // 2])
+    with pytest.raises(ValueError, match="truncado"):
+        Snapshot("truncado.ragsnap", verify=False)
+
+
+@pytest.mark.parametrize("distance", ["l2", "cosine", "ip"])
+def test_restore_keeps_distance(make_index, distance):
+    make_index("fuente", distance=distance)
+    manifest = export_snapshot("fuente", "indice.ragsnap")
+    assert manifest["distance"] == distance
+
+    restore_snapshot("indice.ragsnap", "restaurado")
+    store = open_store("restaurado")
+    try:
+        collections = store._client.list_collections()
+        # Colección principal y particiones
+        assert len(collections) == 3
+        for collection in collections:
+            assert (collection.metadata or {}).get("hnsw:space", "l2") == distance
+    finally:
+        close_store(store)
+
+
+def test_import_waits_for_ingest_lock(make_index):
+    make_index("fuente")
+    export_snapshot("fuente", "indice.ragsnap")
+
+    waited = threading.Event()
+    imported = []
+    with open(LOCK_PATH, "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        worker = threading.Thread(
+            target=lambda: imported.append(
+                import_snapshot("indice.ragsnap", on_wait=waited.set)
+            )
+        )
+        worker.start()
+        assert waited.wait(10)
+        time.sleep(0.2)
+        # Mientras otra ingesta tiene el lock no se publica nada
+        assert not os.path.exists("chroma.current")
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+    worker.join(30)
+    assert imported and live_index_path() == imported[0]
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))